@@ -0,0 +1,1012 @@
+"""Benchmarks de Arty contra un servidor local simulado (sin API keys ni internet).
+
+Uso:
+    python benchmarks.py carga --sesiones 200 --latencia 0.05
+    python benchmarks.py arranque --procesos 5 --limite-ms 1500
+    python benchmarks.py arranque-gemini --latencia 0.8
+    python benchmarks.py cache-gemini
+    python benchmarks.py stream-gemini
+    python benchmarks.py silabas --versos 5000
+    python benchmarks.py director --latencia 0.08
+    python benchmarks.py fusion --registros 10000
+    python benchmarks.py pib --repeticiones 50
+    python benchmarks.py vuelo-unico --sesiones 50
+    python benchmarks.py reruns --antes antes/streamlit_app.py
+    python benchmarks.py gemini --peticiones 120 --sesiones 30 --cuota 10 --ventana 2
+    python benchmarks.py proveedores --llamadas 200 --concurrencia 8 --errores 0.02 --metricas metricas.prom
+"""
+import argparse
+import asyncio
+import csv
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import streamlit_app as app
+from simulador import ModeloGeminiSimulado, ServidorSimulado
+
+
+# ==================== BENCHMARKS ====================
+def benchmark_carga(sesiones, latencia, hilos):
+    """Sesiones por segundo con la API síncrona (un hilo por sesión) vs. la asíncrona (un solo bucle)."""
+    servidor = ServidorSimulado(latencia).iniciar()
+    servidor.configurar(app)
+    # El límite por host del cliente marcaría el ritmo; aquí queremos medir el modelo de concurrencia
+    app.ClienteHTTP.LIMITE_POR_DEFECTO = sesiones
+    # Todas las sesiones piden lo mismo: sin esto la asíncrona haría una sola petición
+    app.vuelo_unico().activo = False
+
+    try:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            list(ejecutor.map(lambda _: app.MovieRecommender.buscar_por_tematica("vampiros"), range(sesiones)))
+        duracion_sync = time.perf_counter() - inicio
+
+        async def _async():
+            cliente = app.cliente_http()
+            try:
+                inicio = time.perf_counter()
+                await asyncio.gather(*(
+                    app.MovieRecommender.buscar_por_tematica_async("vampiros") for _ in range(sesiones)
+                ))
+                return time.perf_counter() - inicio
+            finally:
+                await cliente.cerrar()
+
+        duracion_async = asyncio.run(_async())
+    finally:
+        app.vuelo_unico().activo = True
+        servidor.detener()
+
+    print(f"Sesiones: {sesiones} | latencia simulada: {latencia * 1000:.0f} ms | hilos sync: {hilos}")
+    print(f"  sync  : {sesiones / duracion_sync:8.1f} sesiones/s ({duracion_sync:.2f} s)")
+    print(f"  async : {sesiones / duracion_async:8.1f} sesiones/s ({duracion_async:.2f} s, 1 hilo)")
+
+
+# Proceso hijo de `benchmark_arranque`: primer render de un script con AppTest, en frío
+_PRIMER_RENDER = """
+import sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+prueba = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+if prueba.exception:
+    raise SystemExit(prueba.exception[0].message)
+print(time.perf_counter() - inicio)
+"""
+
+
+def _importaciones_por_paquete(script, entorno):
+    """Milisegundos acumulados de cada paquete que importa `script` (según `python -X importtime`)."""
+
+    def importaciones(codigo):
+        salida = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', codigo],
+            env=entorno, capture_output=True, text=True, check=True
+        ).stderr
+        paquetes = defaultdict(float)
+        for linea in salida.splitlines():
+            if not linea.startswith('import time:') or 'cumulative' in linea:
+                continue
+            _, acumulado, nombre = linea[len('import time:'):].split('|')
+            # Solo las importaciones de primer nivel; las anidadas ya van en su acumulado
+            if len(nombre) - len(nombre.lstrip()) == 1:
+                paquetes[nombre.strip().split('.')[0]] += int(acumulado) / 1000
+        return paquetes
+
+    # Lo que importa el propio intérprete al arrancar (site, encodings...) no es del script
+    interprete = importaciones('pass')
+    paquetes = importaciones(
+        "import importlib.util; "
+        f"especificacion = importlib.util.spec_from_file_location('arty_perfil', {script!r}); "
+        "especificacion.loader.exec_module(importlib.util.module_from_spec(especificacion))"
+    )
+    return {paquete: ms for paquete, ms in paquetes.items() if paquete not in interprete and paquete != 'importlib'}
+
+
+def benchmark_arranque(procesos, antes=None, limite_ms=None):
+    """Tiempo hasta el primer render en un proceso nuevo y desglose de importaciones.
+
+    Cada medida es un intérprete nuevo (sin nada en memoria) que importa AppTest y
+    pinta la primera pantalla. Con `limite_ms` termina con error si la mediana de la
+    versión actual lo supera, para usarlo como prueba de regresión.
+    """
+    scripts = {'actual': os.path.abspath(app.__file__)}
+    if antes:
+        scripts = {'antes': os.path.abspath(antes), **scripts}
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        entorno = dict(os.environ, ARTY_CACHE_DIR=directorio, ARTY_IMAGENES_PROXY='0')
+        entorno['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(scripts['actual']), entorno.get('PYTHONPATH')]))
+        for nombre, script in scripts.items():
+            tiempos = [
+                float(subprocess.run(
+                    [sys.executable, '-c', _PRIMER_RENDER, script],
+                    env=entorno, capture_output=True, text=True, check=True
+                ).stdout.split()[-1])
+                for _ in range(procesos)
+            ]
+            resultados[nombre] = (tiempos, _importaciones_por_paquete(script, entorno))
+
+    print(f"Primer render en un proceso nuevo ({procesos} procesos por versión)")
+    for nombre, (tiempos, _) in resultados.items():
+        print(f"  {nombre:8} p50 {_percentil(tiempos, 50) * 1000:8.1f} ms   p95 {_percentil(tiempos, 95) * 1000:8.1f} ms")
+
+    print("Importaciones de primer nivel del script (ms acumulados)")
+    paquetes = sorted(
+        set().union(*(importaciones for _, importaciones in resultados.values())),
+        key=lambda paquete: -max(importaciones.get(paquete, 0) for _, importaciones in resultados.values())
+    )
+    print(f"  {'paquete':22}" + ''.join(f" {nombre:>10}" for nombre in resultados))
+    for paquete in paquetes[:15]:
+        print(f"  {paquete:22}" + ''.join(
+            f" {importaciones.get(paquete, 0):10.1f}" for _, importaciones in resultados.values()
+        ))
+
+    if limite_ms is not None:
+        mediana = _percentil(resultados['actual'][0], 50) * 1000
+        if mediana > limite_ms:
+            sys.exit(f"Regresión: primer render p50 {mediana:.1f} ms > límite {limite_ms:.1f} ms")
+
+
+def benchmark_arranque_gemini(latencia):
+    """Coste de resolver el modelo Gemini en frío (API), desde disco y ya en memoria."""
+
+    def list_models_simulado():
+        time.sleep(latencia)
+        return [
+            SimpleNamespace(name='models/gemini-pro', supported_generation_methods=['generateContent']),
+            SimpleNamespace(name='models/gemini-1.5-flash', supported_generation_methods=['generateContent']),
+        ]
+
+    app.GEMINI_API_KEY = 'clave-simulada'
+    app.genai.configure = lambda **kwargs: None
+    app.genai.list_models = list_models_simulado
+    app.genai.GenerativeModel = lambda nombre: SimpleNamespace(model_name=nombre)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        app.CACHE_DIR = directorio
+        app._GEMINI_MODELOS_ARCHIVO = os.path.join(directorio, 'gemini_modelos.json')
+
+        def medir():
+            inicio = time.perf_counter()
+            modelo = app._init_gemini_model()
+            return time.perf_counter() - inicio, modelo.model_name
+
+        app._init_gemini_model.clear()
+        frio, elegido = medir()
+        # Proceso nuevo: sin caché en memoria, pero con el archivo en disco
+        app._init_gemini_model.clear()
+        disco, _ = medir()
+        # Rerun de Streamlit dentro del mismo proceso
+        rerun, _ = medir()
+
+    print(f"Modelo elegido: {elegido} | latencia simulada de list_models: {latencia * 1000:.0f} ms")
+    print(f"  arranque en frío (API)   : {frio * 1000:8.2f} ms")
+    print(f"  arranque con disco       : {disco * 1000:8.2f} ms")
+    print(f"  rerun (ya en memoria)    : {rerun * 1000:8.2f} ms")
+
+
+def _comprobar(condicion, descripcion, fallos):
+    print(f"  {'ok   ' if condicion else 'FALLA'} {descripcion}")
+    if not condicion:
+        fallos.append(descripcion)
+
+
+def _usar_gemini_simulado(*modelos):
+    """Pone los modelos simulados detrás del planificador (sin cuota) y devuelve el planificador."""
+    planificador = app.PlanificadorGemini(list(modelos), rpm=60000)
+    app.planificador_gemini = lambda: planificador
+    return planificador
+
+
+def comprobar_cache_gemini():
+    """La caché de respuestas de Gemini contra un modelo simulado que cuenta sus llamadas.
+
+    Comprueba que una petición repetida (aunque cambien mayúsculas o espacios) no
+    llega al modelo, que otro modelo no aprovecha la respuesta del primero (tampoco
+    la que dio una alternativa cuando el preferido estaba sin cuota) y que las
+    entradas vencidas se vuelven a pedir. Termina con error si algo falla.
+    """
+    fallos = []
+    with tempfile.TemporaryDirectory() as directorio:
+        app.CACHE_DIR = directorio
+        app.PoetryAssistant._cache_respuestas.clear()
+        cache = app.PoetryAssistant._cache_respuestas()
+        flash = ModeloGeminiSimulado(texto="Ayuda de flash", latencia=0.05, fragmentos=1, model_name='models/gemini-flash')
+        _usar_gemini_simulado(flash)
+
+        def pedir(idea="La luna sobre el mar"):
+            inicio = time.perf_counter()
+            respuesta = app.PoetryAssistant.ayudar_con_poesia(idea, "Soneto")
+            return respuesta, (time.perf_counter() - inicio) * 1000
+
+        primera, fallo_ms = pedir()
+        segunda, acierto_ms = pedir("  la LUNA sobre el mar. ")
+        print(f"Caché de Gemini: fallo {fallo_ms:.1f} ms, acierto {acierto_ms:.2f} ms")
+        _comprobar(flash.llamadas == 1 and segunda == primera,
+                   "la misma idea (normalizada) no vuelve a llegar al modelo", fallos)
+
+        # Memoria vacía, como en un proceso nuevo: la respuesta sale del disco
+        cache.memoria.limpiar()
+        pedir()
+        _comprobar(flash.llamadas == 1, "tras reiniciar el proceso la respuesta sale del disco", fallos)
+
+        pro = ModeloGeminiSimulado(texto="Ayuda de pro", latencia=0.05, fragmentos=1, model_name='models/gemini-pro')
+        _usar_gemini_simulado(pro)
+        respuesta, _ = pedir()
+        _comprobar(pro.llamadas == 1 and respuesta == "Ayuda de pro",
+                   "otro modelo no reutiliza la respuesta del primero", fallos)
+
+        # El preferido sin cuota: contesta flash y la respuesta queda a su nombre
+        agotado = ModeloGeminiSimulado(texto="Ayuda de pro", cuota=0, ventana=60, model_name='models/gemini-pro')
+        _usar_gemini_simulado(agotado, flash)
+        respuesta, _ = pedir("El viento en los álamos")
+        _comprobar(respuesta == "Ayuda de flash" and flash.llamadas == 2,
+                   "si el preferido no tiene cuota contesta la alternativa", fallos)
+        _usar_gemini_simulado(pro)
+        respuesta, _ = pedir("El viento en los álamos")
+        _comprobar(pro.llamadas == 2 and respuesta == "Ayuda de pro",
+                   "la respuesta de la alternativa se guarda con el modelo que contestó", fallos)
+
+        _usar_gemini_simulado(flash)
+        cache.memoria.ttl = cache.disco.ttl = 0.05
+        time.sleep(0.1)
+        pedir()
+        _comprobar(flash.llamadas == 3, "una entrada vencida se vuelve a pedir al modelo", fallos)
+        app.PoetryAssistant._cache_respuestas.clear()
+
+    if fallos:
+        sys.exit(f"{len(fallos)} comprobación(es) fallida(s)")
+
+
+def comprobar_stream_gemini():
+    """El camino en streaming de la ayuda de poesía contra modelos simulados.
+
+    Comprueba que los fragmentos llegan en orden y forman la respuesta completa (y
+    que el primero llega antes que el final), que una respuesta en caché sale de
+    una vez y que, si el modelo no admite streaming, responde la llamada normal.
+    """
+    fallos = []
+    texto = "Primer verso de ejemplo, segundo verso con rima, consejos de métrica y un cierre para seguir."
+    with tempfile.TemporaryDirectory() as directorio:
+        app.CACHE_DIR = directorio
+        app.PoetryAssistant._cache_respuestas.clear()
+        modelo = ModeloGeminiSimulado(texto=texto, latencia=0.2, latencia_fragmento=0.1, fragmentos=6)
+        _usar_gemini_simulado(modelo)
+
+        inicio = time.perf_counter()
+        fragmentos = []
+        primero = None
+        for fragmento in app.PoetryAssistant.ayudar_con_poesia_stream("El otoño en la ciudad", "Soneto"):
+            primero = primero or time.perf_counter() - inicio
+            fragmentos.append(fragmento)
+        total = time.perf_counter() - inicio
+        print(f"Streaming: {len(fragmentos)} fragmentos, primero a {primero * 1000:.0f} ms, completo a {total * 1000:.0f} ms")
+        _comprobar(fragmentos == modelo._trozos() and ''.join(fragmentos) == texto,
+                   "los fragmentos llegan en orden y forman la respuesta completa", fallos)
+        _comprobar(primero < total / 2, "el primer fragmento llega antes de que termine la respuesta", fallos)
+
+        en_cache = list(app.PoetryAssistant.ayudar_con_poesia_stream("El otoño en la ciudad", "Soneto"))
+        _comprobar(en_cache == [texto] and modelo.llamadas == 1,
+                   "una respuesta en caché sale en un solo fragmento sin llamar al modelo", fallos)
+
+        sin_streaming = ModeloGeminiSimulado(texto=texto, latencia=0.05, fragmentos=1, streaming=False)
+        _usar_gemini_simulado(sin_streaming)
+        respaldo = list(app.PoetryAssistant.ayudar_con_poesia_stream("Una tarde de lluvia", "Soneto"))
+        _comprobar(respaldo == [texto] and sin_streaming.llamadas == 2,
+                   "si el streaming falla, responde la llamada normal", fallos)
+        app.PoetryAssistant._cache_respuestas.clear()
+
+    if fallos:
+        sys.exit(f"{len(fallos)} comprobación(es) fallida(s)")
+
+
+def _contar_silabas_ingenuo(verso):
+    """El contador anterior (grupos de vocales), como referencia de velocidad."""
+    vocales = "aeiouáéíóúAEIOUÁÉÍÓÚ"
+    silabas = 0
+    anterior_vocal = False
+    for char in verso:
+        if char in vocales:
+            if not anterior_vocal:
+                silabas += 1
+            anterior_vocal = True
+        else:
+            anterior_vocal = False
+    return silabas
+
+
+def benchmark_silabas(numero_versos):
+    """Escansión de un corpus sintético de versos: contador ingenuo vs. motor métrico."""
+    versos_base = [
+        "Cuando me paro a contemplar mi estado",
+        "En tanto que de rosa y azucena",
+        "Volverán las oscuras golondrinas",
+        "Yo soy un hombre sincero de donde crece la palma",
+        "Puedo escribir los versos más tristes esta noche",
+        "La princesa está triste qué tendrá la princesa",
+        "Verde embeleso de la vida humana",
+        "se zambulle una rana en el viejo estanque",
+    ]
+    palabras = ' '.join(versos_base).lower().split()
+    generador = random.Random(42)
+    corpus = [
+        ' '.join(generador.choice(palabras) for _ in range(generador.randint(5, 10)))
+        for _ in range(numero_versos)
+    ]
+
+    inicio = time.perf_counter()
+    for verso in corpus:
+        _contar_silabas_ingenuo(verso)
+    ingenuo = time.perf_counter() - inicio
+
+    for cache in (app.MetricaEspanola.silabas_verso, app.MetricaEspanola._escandir, app.MetricaEspanola.analizar_palabra):
+        cache.cache_clear()
+    inicio = time.perf_counter()
+    app.MetricaEspanola.silabas_versos(corpus)
+    frio = time.perf_counter() - inicio
+
+    # Versos nuevos con palabras ya vistas: lo habitual al escribir un poema
+    app.MetricaEspanola.silabas_verso.cache_clear()
+    inicio = time.perf_counter()
+    app.MetricaEspanola.silabas_versos(corpus)
+    palabras_vistas = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    app.MetricaEspanola.silabas_versos(corpus)
+    caliente = time.perf_counter() - inicio
+
+    print(f"Versos: {numero_versos}")
+    print(f"  contador ingenuo       : {ingenuo * 1000:8.1f} ms ({numero_versos / ingenuo:10.0f} versos/s)")
+    print(f"  motor métrico (frío)   : {frio * 1000:8.1f} ms ({numero_versos / frio:10.0f} versos/s)")
+    print(f"  motor (palabras vistas): {palabras_vistas * 1000:8.1f} ms ({numero_versos / palabras_vistas:10.0f} versos/s)")
+    print(f"  motor métrico (caché)  : {caliente * 1000:8.1f} ms ({numero_versos / caliente:10.0f} versos/s)")
+
+
+def benchmark_director(latencia, repeticiones):
+    """Round-trips y tiempo de la búsqueda de directores: flujo anterior vs. pipeline nuevo."""
+    servidor = ServidorSimulado(latencia).iniciar()
+    servidor.configurar(app)
+    url = app.MovieRecommender.BASE_URL
+
+    def buscar(direccion, params):
+        # Como el `requests.get` de antes: sin pool, una conexión nueva por petición
+        with urllib.request.urlopen(f"{direccion}?{urlencode(params)}", timeout=10) as respuesta:
+            return json.loads(respuesta.read())
+
+    def _flujo_anterior(nombre):
+        # Lo que hacía main(): TMDb (búsqueda, detalle, créditos) y luego Wikipedia
+        # (list=search y después prop=extracts), todo en serie
+        params = {'api_key': 'x', 'language': 'es-ES'}
+        persona = buscar(f"{url}/search/person", {**params, 'query': nombre})['results'][0]['id']
+        buscar(f"{url}/person/{persona}", params)
+        buscar(f"{url}/person/{persona}/movie_credits", params)
+        wikipedia = app.ArtistInfo.WIKIPEDIA_URL
+        busqueda = buscar(wikipedia, {'action': 'query', 'list': 'search', 'srsearch': nombre,
+                                      'format': 'json', 'srlimit': 1})
+        buscar(wikipedia, {'action': 'query', 'prop': 'extracts|pageimages', 'exintro': True,
+                           'explaintext': True, 'titles': busqueda['query']['search'][0]['title'],
+                           'format': 'json', 'piprop': 'original'})
+
+    async def flujo_anterior(nombre):
+        await asyncio.to_thread(_flujo_anterior, nombre)
+
+    async def medir(funcion):
+        servidor.reiniciar_contadores()
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            await funcion("Steven Spielberg")
+        return (time.perf_counter() - inicio) / repeticiones, servidor.peticiones / repeticiones
+
+    async def _todo():
+        try:
+            return await medir(flujo_anterior), await medir(app.ArtistInfo.buscar_director_async)
+        finally:
+            await app.cliente_http().cerrar()
+
+    try:
+        (t_antes, rt_antes), (t_ahora, rt_ahora) = asyncio.run(_todo())
+    finally:
+        servidor.detener()
+
+    print(f"Latencia simulada por petición: {latencia * 1000:.0f} ms | repeticiones: {repeticiones}")
+    print(f"  anterior (serie)  : {rt_antes:4.1f} round-trips, {t_antes * 1000:8.1f} ms")
+    print(f"  pipeline          : {rt_ahora:4.1f} round-trips, {t_ahora * 1000:8.1f} ms")
+
+
+def _obras_sinteticas(cantidad, semilla=7):
+    """Fichas de museo sintéticas con duplicados ruidosos; devuelve (obras, grupo real de cada una)."""
+    generador = random.Random(semilla)
+    nombres = ["Vincent", "Rembrandt", "Johannes", "Francisco", "Claude", "Diego", "Pieter", "Berthe", "Mary", "Jan"]
+    apellidos = ["van Gogh", "van Rijn", "Vermeer", "de Goya", "Monet", "Velázquez", "Bruegel", "Morisot", "Cassatt", "Steen"]
+    sustantivos = ["retrato", "paisaje", "naturaleza", "noche", "jardín", "puerto", "mujer", "campesinos", "río", "iglesia",
+                   "molino", "batalla", "bodegón", "familia", "tormenta", "mercado", "catedral", "lectora", "músico", "barca"]
+    adjetivos = ["estrellada", "dormida", "azul", "muerta", "nevado", "antiguo", "dorada", "sombrío", "alegre", "lejano"]
+    museos = ['Metropolitan Museum', 'Rijksmuseum', 'Harvard Art Museums']
+
+    def _ruido(titulo):
+        variante = generador.random()
+        if variante < 0.25:
+            return titulo.upper()
+        if variante < 0.5:
+            return "La " + titulo
+        if variante < 0.7:
+            return app.IndiceObras.normalizar(titulo)
+        if variante < 0.85 and len(titulo) > 6:
+            posicion = generador.randrange(1, len(titulo) - 1)
+            return titulo[:posicion] + titulo[posicion + 1:]
+        return titulo + "."
+
+    obras, grupos = [], []
+    grupo = 0
+    while len(obras) < cantidad:
+        nombre, apellido = generador.choice(nombres), generador.choice(apellidos)
+        titulo = f"{generador.choice(sustantivos)} {generador.choice(adjetivos)} {generador.randint(1, 400)}".capitalize()
+        año = generador.randint(1500, 1920)
+        copias = generador.choice([1, 1, 1, 2, 2, 3])
+        for copia in range(copias):
+            artista = f"{nombre} {apellido}" if generador.random() < 0.7 else f"{apellido}, {nombre}"
+            obras.append({
+                'titulo': titulo if copia == 0 else _ruido(titulo),
+                'artista': artista,
+                'año': str(año + generador.randint(-1, 1)),
+                'imagen': f"https://img/{grupo}/{copia}.jpg" if generador.random() < 0.8 else '',
+                'url_museo': f"https://museo/{grupo}/{copia}",
+                'fuente': museos[copia % len(museos)]
+            })
+            grupos.append(grupo)
+        grupo += 1
+    return obras[:cantidad], grupos[:cantidad]
+
+
+def benchmark_fusion(registros):
+    """Fusión de duplicados sobre miles de fichas sintéticas: tiempo, grupos y precisión."""
+    obras, reales = _obras_sinteticas(registros)
+
+    app.FusionObras.normalizar_titulo.cache_clear()
+    app.FusionObras.normalizar_artista.cache_clear()
+    inicio = time.perf_counter()
+    grupos = app.FusionObras.agrupar(obras)
+    agrupar = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    app.FusionObras.fusionar(obras, "retrato")
+    fusionar = time.perf_counter() - inicio
+
+    # Pares (i, j) que deberían estar juntos vs. los que se juntaron
+    def _pares(asignacion):
+        por_grupo = defaultdict(list)
+        for posicion, grupo in enumerate(asignacion):
+            por_grupo[grupo].append(posicion)
+        return {(a, b) for miembros in por_grupo.values() for i, a in enumerate(miembros) for b in miembros[i + 1:]}
+
+    asignacion = [0] * len(obras)
+    for numero, miembros in enumerate(grupos):
+        for posicion in miembros:
+            asignacion[posicion] = numero
+    esperados, obtenidos = _pares(reales), _pares(asignacion)
+    correctos = len(esperados & obtenidos)
+
+    print(f"Fichas: {len(obras)} | obras reales: {len(set(reales))} | grupos formados: {len(grupos)}")
+    print(f"  agrupar              : {agrupar * 1000:8.1f} ms")
+    print(f"  agrupar + puntuar    : {fusionar * 1000:8.1f} ms")
+    print(f"  precisión de pares   : {correctos / len(obtenidos) if obtenidos else 1.0:8.3f}")
+    print(f"  exhaustividad        : {correctos / len(esperados) if esperados else 1.0:8.3f}")
+    print(f"  tarjetas ahorradas   : {len(obras) - len(grupos)} ({1 - len(grupos) / len(obras):.0%})")
+
+
+def _leer_csv_ingenuo():
+    """Lo que haría cada rerun sin la tabla: DictReader y floats por celda."""
+    with open(app.TablaPIB.ARCHIVO, encoding='utf-8-sig', newline='') as archivo:
+        filas = list(csv.DictReader(archivo))
+    años = [columna for columna in filas[0] if columna.isdigit()]
+    return {
+        fila['Country Code']: (fila['Country Name'], [float(fila[año]) if fila[año] else None for año in años])
+        for fila in filas
+    }, [int(año) for año in años]
+
+
+def _ranking_ingenuo(año):
+    datos, años = _leer_csv_ingenuo()
+    columna = años.index(año)
+    candidatos = [
+        (serie[columna], codigo) for codigo, (_, serie) in datos.items()
+        if codigo not in app.TablaPIB.AGREGADOS and serie[columna] is not None
+    ]
+    return sorted(candidatos, reverse=True)[:10]
+
+
+def _crecimiento_ingenuo():
+    datos, _ = _leer_csv_ingenuo()
+    return {
+        codigo: [b / a - 1 if a and b is not None else None for a, b in zip(serie, serie[1:])]
+        for codigo, (_, serie) in datos.items()
+    }
+
+
+def _agregado_ingenuo(codigos):
+    datos, años = _leer_csv_ingenuo()
+    return [sum(datos[codigo][1][columna] or 0.0 for codigo in codigos) for columna in range(len(años))]
+
+
+def benchmark_pib(repeticiones):
+    """Carga y consultas de la tabla del PIB: CSV en cada consulta vs. columnas mapeadas."""
+    def _ms(funcion):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        return (time.perf_counter() - inicio) / repeticiones * 1000
+
+    with tempfile.TemporaryDirectory() as directorio:
+        inicio = time.perf_counter()
+        tabla = app.TablaPIB.cargar(directorio=directorio)
+        fria = (time.perf_counter() - inicio) * 1000
+        caliente = _ms(lambda: app.TablaPIB.cargar(directorio=directorio))
+        tabla = app.TablaPIB.cargar(directorio=directorio)
+
+        print(f"Tabla: {tabla.valores.shape[0]} filas × {tabla.valores.shape[1]} años | repeticiones: {repeticiones}")
+        print("  carga")
+        print(f"    CSV (DictReader)          : {_ms(_leer_csv_ingenuo):8.3f} ms")
+        print(f"    CSV (TablaPIB.leer_csv)   : {_ms(app.TablaPIB.leer_csv):8.3f} ms")
+        try:
+            import pandas as pd
+            print(f"    CSV (pandas.read_csv)     : {_ms(lambda: pd.read_csv(app.TablaPIB.ARCHIVO)):8.3f} ms")
+        except ImportError:
+            pass
+        print(f"    caché binaria, en frío    : {fria:8.3f} ms (parsea y escribe)")
+        print(f"    caché binaria, mapeada    : {caliente:8.3f} ms")
+
+        latam = ['MEX', 'ARG', 'COL', 'CHL', 'PER', 'BRA', 'URY', 'ECU', 'BOL', 'PRY', 'VEN']
+        consultas = {
+            'ranking 2022': (lambda: _ranking_ingenuo(2022), lambda: tabla.ranking(2022)),
+            'crecimiento anual': (_crecimiento_ingenuo, tabla.crecimiento),
+            'suma de 11 países': (lambda: _agregado_ingenuo(latam), lambda: tabla.agregar({'latam': latam})),
+            'puestos por año': (None, tabla.posiciones),
+            'interpolar huecos': (None, lambda: tabla.rellenar(tabla.valores)),
+        }
+        print(f"  {'consulta':24} {'CSV + bucles':>14} {'columnas':>10}")
+        for nombre, (ingenua, vectorizada) in consultas.items():
+            antes = f"{_ms(ingenua):11.3f} ms" if ingenua else f"{'—':>14}"
+            print(f"  {nombre:24} {antes} {_ms(vectorizada):7.3f} ms")
+
+
+def _percentil(valores, porcentaje):
+    ordenados = sorted(valores)
+    return ordenados[max(0, -(-len(ordenados) * porcentaje // 100) - 1)]
+
+
+def benchmark_vuelo_unico(sesiones, latencia):
+    """Muchas sesiones piden lo mismo a la vez: peticiones HTTP con y sin compartir las llamadas en curso.
+
+    Comprueba, para cada método, que compartir hace menos peticiones que no hacerlo,
+    que alguna llamada se colapsó y que todas las sesiones recibieron lo mismo.
+    Termina con error si algo falla.
+    """
+    fallos = []
+    servidor = ServidorSimulado(latencia, semilla=1).iniciar()
+    servidor.configurar(app)
+    consultas = {
+        # Variantes de escritura que se normalizan a la misma consulta
+        'identificar_pintura': lambda i: app.ArtIdentifier.identificar_pintura(
+            ("Mona Lisa", "mona  lisa", "MONA LISA")[i % 3], usar_indice=False
+        ),
+        'recomendar_por_genero': lambda i: app.MovieRecommender.recomendar_por_genero(("Acción", "accion")[i % 2], 20),
+        'buscar_director_tmdb': lambda i: app.ArtistInfo.buscar_director_tmdb("Steven Spielberg"),
+    }
+
+    def _vaciar_caches():
+        app.ArtIdentifier._met_cache().limpiar()
+        app.indice_obras().limpiar()
+        app.MovieRecommender._tabla_generos().limpiar()
+        app.ArtistInfo._titulos_wikipedia().limpiar()
+
+    print(f"Sesiones simultáneas: {sesiones} | latencia simulada: {latencia * 1000:.0f} ms")
+    print(f"  {'método':24} {'HTTP sin':>9} {'HTTP con':>9} {'colapsadas':>11} {'ms sin':>8} {'ms con':>8}  iguales")
+    filas = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        app.CACHE_DIR = directorio
+        try:
+            for nombre, consulta in consultas.items():
+                fila = []
+                for activo in (False, True):
+                    _vaciar_caches()
+                    app.vuelo_unico().activo = activo
+                    app.vuelo_unico().reiniciar()
+                    servidor.reiniciar_contadores()
+                    salida = threading.Barrier(sesiones)
+
+                    def _sesion(i):
+                        salida.wait()
+                        return consulta(i)
+
+                    inicio = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=sesiones) as ejecutor:
+                        resultados = list(ejecutor.map(_sesion, range(sesiones)))
+                    duracion = time.perf_counter() - inicio
+                    # El refresco de la tabla de géneros que dispara la primera consulta no cuenta
+                    while app.MovieRecommender._refrescando:
+                        time.sleep(0.01)
+                    colapsadas = sum(
+                        datos['colapsadas'] for operacion, datos in app.vuelo_unico().estadisticas().items()
+                        if not operacion.startswith('GET ')
+                    )
+                    iguales = all(resultado == resultados[0] for resultado in resultados)
+                    fila.append((servidor.peticiones, colapsadas, duracion, iguales))
+
+                (sin, _, duracion_sin, _), (con, colapsadas, duracion_con, iguales) = fila
+                print(f"  {nombre:24} {sin:9d} {con:9d} {colapsadas:11d} {duracion_sin * 1000:8.0f}"
+                      f" {duracion_con * 1000:8.0f}  {'sí' if iguales else 'NO'}")
+                filas[nombre] = (sin, con, colapsadas, iguales)
+        finally:
+            app.vuelo_unico().activo = True
+            app.ejecutar_sync(app.cliente_http().cerrar())
+            servidor.detener()
+
+    for nombre, (sin, con, colapsadas, iguales) in filas.items():
+        _comprobar(con < sin, f"{nombre}: compartiendo hay menos peticiones HTTP ({con} < {sin})", fallos)
+        _comprobar(colapsadas > 0, f"{nombre}: alguna llamada se colapsó ({colapsadas})", fallos)
+        _comprobar(iguales, f"{nombre}: todas las sesiones reciben el mismo resultado", fallos)
+    if fallos:
+        sys.exit(f"{len(fallos)} comprobación(es) fallida(s)")
+
+
+def _script_reruns():
+    # AppTest ejecuta esta función como script en cada rerun; el módulo ya está importado y configurado
+    import importlib
+    import os
+    importlib.import_module(os.environ['ARTY_RERUNS_MODULO']).main()
+
+
+def _recorrido_reruns(modulo, servidor):
+    """Recorre la interfaz con AppTest y devuelve [(paso, ms, peticiones HTTP, expanders)]."""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ['ARTY_RERUNS_MODULO'] = modulo.__name__
+    prueba = AppTest.from_function(_script_reruns, default_timeout=120)
+    boton = lambda etiqueta: next(b for b in prueba.button if b.label == etiqueta)
+    pasos = [
+        ("primer render", lambda: None),
+        ("abrir películas", lambda: prueba.sidebar.radio[0].set_value("🎬 Recomendaciones de Películas")),
+        ("recomendar (10)", lambda: boton("🎥 Recomendar").click()),
+        ("cantidad 5", lambda: prueba.slider[0].set_value(5)),
+        ("cantidad 8", lambda: prueba.slider[0].set_value(8)),
+        ("cantidad 40", lambda: prueba.slider[0].set_value(40)),
+        ("cantidad 10", lambda: prueba.slider[0].set_value(10)),
+        ("abrir artistas", lambda: prueba.sidebar.radio[0].set_value("👤 Info de Artistas/Directores")),
+        ("buscar director", lambda: (prueba.text_input[0].input("Steven Spielberg"), boton("🔍 Buscar Información").click())),
+        ("cambiar tipo", lambda: prueba.radio[0].set_value("🎨 Pintor/Escritor (General)")),
+        ("volver al tipo", lambda: prueba.radio[0].set_value("🎬 Director de Cine")),
+    ]
+    medidas = []
+    for paso, accion in pasos:
+        accion()
+        # Las tareas de fondo del rerun anterior (precargas, cachés) no cuentan para este
+        anteriores = -1
+        while anteriores != servidor.peticiones:
+            anteriores = servidor.peticiones
+            time.sleep(0.3)
+        servidor.reiniciar_contadores()
+        inicio = time.perf_counter()
+        prueba.run()
+        duracion = time.perf_counter() - inicio
+        if prueba.exception:
+            raise RuntimeError(f"{paso}: {prueba.exception[0].message}")
+        medidas.append((paso, duracion * 1000, servidor.peticiones, len(prueba.expander)))
+    return medidas
+
+
+def benchmark_reruns(latencia, antes=None):
+    """Duración de cada rerun de la interfaz (AppTest) y peticiones HTTP que provoca.
+
+    Con `antes` (ruta a otra versión de streamlit_app.py, p.ej. sacada con
+    `git show <commit>:streamlit_app.py`) se recorre también esa versión para comparar.
+    """
+    servidor = ServidorSimulado(latencia, semilla=1).iniciar()
+    versiones = [('actual', app)]
+    if antes:
+        especificacion = importlib.util.spec_from_file_location('streamlit_app_antes', antes)
+        anterior = importlib.util.module_from_spec(especificacion)
+        sys.modules['streamlit_app_antes'] = anterior
+        especificacion.loader.exec_module(anterior)
+        versiones.insert(0, ('antes', anterior))
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        try:
+            for nombre, modulo in versiones:
+                modulo.CACHE_DIR = os.path.join(directorio, nombre)
+                servidor.configurar(modulo)
+                resultados[nombre] = _recorrido_reruns(modulo, servidor)
+        finally:
+            servidor.detener()
+
+    print(f"Latencia simulada: {latencia * 1000:.0f} ms | ms / peticiones HTTP / expanders visibles por rerun")
+    print(f"  {'paso':18}" + ''.join(f" {nombre:>22}" for nombre in resultados))
+    for indice, (paso, *_) in enumerate(next(iter(resultados.values()))):
+        celdas = ''.join(
+            f" {medidas[indice][1]:9.0f} ms {medidas[indice][2]:4d} {medidas[indice][3]:4d}"
+            for medidas in resultados.values()
+        )
+        print(f"  {paso:18}{celdas}")
+
+
+def benchmark_gemini(peticiones, sesiones, cuota, ventana, modelos, latencia, tolerancia=None):
+    """Muchas sesiones piden ayuda a Gemini a la vez contra modelos simulados con cuota.
+
+    Compara llamar directamente al modelo preferido (lo de antes) con el planificador
+    del proceso, primero con un solo modelo y luego con las alternativas. `cuota` es lo
+    que acepta cada modelo en cada `ventana` de segundos; el planificador se configura
+    con esa misma cuota en peticiones por minuto.
+
+    Comprueba que con el planificador ningún 429 ni `GeminiOcupado` llega a quien
+    llama, que las alternativas dan más respuestas por segundo que un solo modelo y
+    que el error medio de la espera estimada no pasa de `tolerancia` segundos (por
+    defecto, una ventana). Termina con error si algo falla.
+    """
+    fallos = []
+    tolerancia = ventana if tolerancia is None else tolerancia
+    rpm = cuota * 60 / ventana
+
+    def crear_modelos():
+        return [
+            ModeloGeminiSimulado(
+                latencia=latencia, latencia_fragmento=0, fragmentos=1, cuota=cuota, ventana=ventana,
+                model_name=f"models/gemini-simulado-{numero}"
+            )
+            for numero in range(modelos)
+        ]
+
+    def medir(pedir):
+        resultados = []
+
+        def sesion(numero):
+            inicio = time.perf_counter()
+            try:
+                desfase = pedir(numero)
+                resultados.append(('ok', time.perf_counter() - inicio, desfase))
+            except app.GeminiOcupado:
+                resultados.append(('ocupado', time.perf_counter() - inicio, None))
+            except Exception:
+                resultados.append(('429', time.perf_counter() - inicio, None))
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sesiones) as ejecutor:
+            list(ejecutor.map(sesion, range(peticiones)))
+        return resultados, time.perf_counter() - inicio
+
+    def directo():
+        modelo = crear_modelos()[0]
+
+        def pedir(numero):
+            modelo.generate_content(f"idea {numero}")
+
+        return medir(pedir) + ([modelo], None)
+
+    def planificado(cuantos):
+        usados = crear_modelos()[:cuantos]
+        planificador = app.PlanificadorGemini(
+            usados, rpm=rpm, rafaga=max(1, cuota // 4), espera_max=peticiones * 60 / rpm
+        )
+
+        def pedir(numero):
+            # Desfase entre la espera estimada al llegar y la que hubo hasta tener modelo
+            estimada = planificador.estimar_espera()
+            inicio = time.perf_counter()
+            turno = []
+            planificador.ejecutar(lambda modelo: (turno.append(time.perf_counter()), modelo.generate_content(f"idea {numero}")))
+            return abs(turno[-1] - inicio - estimada)
+
+        return medir(pedir) + (usados, planificador)
+
+    escenarios = [
+        ("sin planificador", directo),
+        ("planificador, 1 modelo", lambda: planificado(1)),
+        (f"planificador, {modelos} modelos", lambda: planificado(modelos)),
+    ]
+    print(f"{peticiones} peticiones desde {sesiones} sesiones | cuota {cuota} cada {ventana:g} s por modelo "
+          f"({rpm:.0f} RPM) | latencia {latencia * 1000:.0f} ms")
+    print(f"  {'escenario':26} {'ok':>5} {'429':>5} {'ocup.':>5} {'ok/s':>7} {'p50 s':>7} {'p95 s':>7} "
+          f"{'429 API':>8} {'cola máx':>8} {'error estim.':>12}")
+    medidas = []
+    for nombre, escenario in escenarios:
+        resultados, duracion, usados, planificador = escenario()
+        cuentas = Counter(resultado for resultado, _, _ in resultados)
+        tiempos = [segundos for resultado, segundos, _ in resultados if resultado == 'ok']
+        desfases = [desfase for _, _, desfase in resultados if desfase is not None]
+        medidas.append((nombre, cuentas, cuentas['ok'] / duracion, desfases, planificador))
+        print(
+            f"  {nombre:26} {cuentas['ok']:5d} {cuentas['429']:5d} {cuentas['ocupado']:5d} "
+            f"{cuentas['ok'] / duracion:7.1f} "
+            f"{_percentil(tiempos, 50) if tiempos else 0:7.2f} {_percentil(tiempos, 95) if tiempos else 0:7.2f} "
+            f"{sum(modelo.rechazadas for modelo in usados):8d} "
+            f"{planificador.cola_maxima if planificador else '—':>8} "
+            f"{f'{sum(desfases) / len(desfases):.2f} s' if desfases else '—':>12}"
+        )
+
+    planificadas = [medida for medida in medidas if medida[4] is not None]
+    for nombre, cuentas, _, desfases, _ in planificadas:
+        _comprobar(cuentas['429'] == 0 and cuentas['ocupado'] == 0,
+                   f"{nombre}: ningún 429 ni GeminiOcupado llega a quien llama", fallos)
+        error = sum(desfases) / len(desfases) if desfases else 0.0
+        _comprobar(error <= tolerancia,
+                   f"{nombre}: error medio de la espera estimada {error:.2f} s ≤ {tolerancia:g} s", fallos)
+    if modelos > 1:
+        (_, _, uno, _, _), (_, _, varios, _, _) = planificadas
+        _comprobar(varios > uno, f"{modelos} modelos dan más ok/s que uno ({varios:.1f} > {uno:.1f})", fallos)
+    if fallos:
+        sys.exit(f"{len(fallos)} comprobación(es) fallida(s)")
+
+
+def benchmark_proveedores(llamadas, concurrencia, latencia, errores, lentas, latencia_gemini, metricas=None):
+    """p50/p95/p99 y rendimiento de cada método público contra el simulador de proveedores.
+
+    Con `metricas` se vuelca además la telemetría del proceso (JSON, o texto de
+    Prometheus si el archivo termina en .prom).
+    """
+    servidor = ServidorSimulado(latencia, errores=errores, lentas=lentas, semilla=1).iniciar()
+    gemini = ModeloGeminiSimulado(
+        texto=servidor.fixtures['gemini']['respuesta'], latencia=latencia_gemini, errores=errores, semilla=1
+    )
+    servidor.configurar(app, gemini)
+
+    pinturas = ["van gogh", "vermeer", "rembrandt", "monet", "goya", "velázquez", "el greco", "bruegel"]
+    generos = sorted(app.MovieRecommender.GENEROS.values())
+    tematicas = ["vampiros", "viajes en el tiempo", "segunda guerra mundial", "robots", "mafia"]
+    artistas = ["Frida Kahlo", "Diego Rivera", "Remedios Varo", "Joaquín Sorolla", "Francisco de Goya"]
+    metodos = {
+        'identificar_pintura': lambda i: app.ArtIdentifier.identificar_pintura(pinturas[i % len(pinturas)], usar_indice=False),
+        'recomendar_por_genero': lambda i: app.MovieRecommender.recomendar_por_genero(generos[i % len(generos)], 20),
+        'buscar_por_tematica': lambda i: app.MovieRecommender.buscar_por_tematica(tematicas[i % len(tematicas)], 20),
+        'buscar_director_tmdb': lambda i: app.ArtistInfo.buscar_director_tmdb("Steven Spielberg"),
+        'buscar_en_wikipedia': lambda i: app.ArtistInfo.buscar_en_wikipedia(artistas[i % len(artistas)]),
+        'ayudar_con_poesia': lambda i: app.PoetryAssistant.ayudar_con_poesia(f"idea {i}", "Soneto", usar_cache=False),
+    }
+
+    def _medir(metodo, i):
+        inicio = time.perf_counter()
+        try:
+            resultado = metodo(i)
+            fallo = not resultado or (isinstance(resultado, str) and resultado.startswith(('❌', '⚠️', '⏳')))
+        except Exception:
+            fallo = True
+        return time.perf_counter() - inicio, fallo
+
+    print(f"Llamadas por método: {llamadas} | concurrencia: {concurrencia} | latencia: {latencia * 1000:.0f} ms"
+          f" | errores: {errores:.0%} | lentas: {lentas:.0%} | Gemini: {latencia_gemini * 1000:.0f} ms")
+    print(f"  {'método':24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'llam/s':>8} {'fallos':>7} {'HTTP':>6}")
+    with tempfile.TemporaryDirectory() as directorio:
+        # Cachés en disco vacías: se mide el camino completo, no lo que quedó de otra ejecución
+        app.CACHE_DIR = directorio
+        try:
+            for nombre, metodo in metodos.items():
+                servidor.reiniciar_contadores()
+                inicio = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+                    medidas = list(ejecutor.map(lambda i: _medir(metodo, i), range(llamadas)))
+                duracion = time.perf_counter() - inicio
+
+                tiempos = [tiempo for tiempo, _ in medidas]
+                fallos = sum(1 for _, fallo in medidas if fallo)
+                print(f"  {nombre:24} {_percentil(tiempos, 50) * 1000:9.1f} {_percentil(tiempos, 95) * 1000:9.1f}"
+                      f" {_percentil(tiempos, 99) * 1000:9.1f} {llamadas / duracion:8.1f} {fallos:7d} {servidor.peticiones:6d}")
+
+            if metricas:
+                with open(metricas, 'w', encoding='utf-8') as salida:
+                    if metricas.endswith('.prom'):
+                        salida.write(app.telemetria().prometheus())
+                    else:
+                        json.dump(app.telemetria().instantanea(), salida, ensure_ascii=False, indent=2)
+                print(f"Métricas del proceso en {metricas}")
+        finally:
+            app.ejecutar_sync(app.cliente_http().cerrar())
+            servidor.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    carga = subcomandos.add_parser('carga', help="Sesiones/s de la API síncrona vs. asíncrona")
+    carga.add_argument('--sesiones', type=int, default=200)
+    carga.add_argument('--latencia', type=float, default=0.05, help="Segundos por respuesta simulada")
+    carga.add_argument('--hilos', type=int, default=16, help="Hilos para la versión síncrona")
+
+    primer_render = subcomandos.add_parser('arranque', help="Tiempo hasta el primer render en frío y desglose de importaciones")
+    primer_render.add_argument('--procesos', type=int, default=5, help="Procesos nuevos a medir por versión")
+    primer_render.add_argument('--antes', help="Otra versión de streamlit_app.py con la que comparar")
+    primer_render.add_argument('--limite-ms', type=float, help="Falla si la mediana del primer render lo supera")
+
+    arranque = subcomandos.add_parser('arranque-gemini', help="Coste de elegir el modelo Gemini en frío vs. en caliente")
+    arranque.add_argument('--latencia', type=float, default=0.8, help="Segundos que tarda list_models")
+
+    subcomandos.add_parser('cache-gemini', help="Comprueba la caché de respuestas de Gemini con un modelo simulado")
+
+    subcomandos.add_parser('stream-gemini', help="Comprueba la ayuda en streaming con modelos simulados")
+
+    silabas = subcomandos.add_parser('silabas', help="Velocidad de la escansión métrica sobre miles de versos")
+    silabas.add_argument('--versos', type=int, default=5000)
+
+    director = subcomandos.add_parser('director', help="Round-trips y tiempo de la búsqueda de directores")
+    director.add_argument('--latencia', type=float, default=0.08)
+    director.add_argument('--repeticiones', type=int, default=10)
+
+    fusion = subcomandos.add_parser('fusion', help="Fusión de duplicados entre museos sobre fichas sintéticas")
+    fusion.add_argument('--registros', type=int, default=10000)
+
+    pib = subcomandos.add_parser('pib', help="Carga y consultas de la tabla del PIB vs. releer el CSV")
+    pib.add_argument('--repeticiones', type=int, default=50)
+
+    vuelo = subcomandos.add_parser('vuelo-unico', help="Comprueba que las sesiones simultáneas con la misma consulta comparten las llamadas")
+    vuelo.add_argument('--sesiones', type=int, default=50)
+    vuelo.add_argument('--latencia', type=float, default=0.1, help="Segundos por respuesta simulada")
+
+    reruns = subcomandos.add_parser('reruns', help="Duración y peticiones HTTP de cada rerun de la interfaz")
+    reruns.add_argument('--latencia', type=float, default=0.05, help="Segundos por respuesta simulada")
+    reruns.add_argument('--antes', help="Otra versión de streamlit_app.py con la que comparar")
+
+    gemini = subcomandos.add_parser('gemini', help="Rendimiento con cuota: llamadas directas vs. planificador con alternativas")
+    gemini.add_argument('--peticiones', type=int, default=120)
+    gemini.add_argument('--sesiones', type=int, default=30, help="Peticiones simultáneas")
+    gemini.add_argument('--cuota', type=int, default=10, help="Llamadas que acepta cada modelo por ventana")
+    gemini.add_argument('--ventana', type=float, default=2.0, help="Segundos de la ventana de cuota (60 en la API real)")
+    gemini.add_argument('--modelos', type=int, default=3, help="Modelos disponibles, en orden de preferencia")
+    gemini.add_argument('--latencia', type=float, default=0.2, help="Segundos por respuesta simulada")
+    gemini.add_argument('--tolerancia', type=float, help="Error medio admitido en la espera estimada (por defecto, una ventana)")
+
+    proveedores = subcomandos.add_parser('proveedores', help="p50/p95/p99 y rendimiento de cada método público")
+    proveedores.add_argument('--llamadas', type=int, default=200)
+    proveedores.add_argument('--concurrencia', type=int, default=8, help="Sesiones simultáneas (hilos)")
+    proveedores.add_argument('--latencia', type=float, default=0.05, help="Segundos por respuesta simulada")
+    proveedores.add_argument('--errores', type=float, default=0.0, help="Probabilidad de 503 (y de fallo de Gemini)")
+    proveedores.add_argument('--lentas', type=float, default=0.0, help="Probabilidad de una respuesta 10 veces más lenta")
+    proveedores.add_argument('--latencia-gemini', type=float, default=0.8, help="Segundos hasta el primer fragmento")
+    proveedores.add_argument('--metricas', help="Volcar la telemetría a este archivo (.json o .prom)")
+
+    args = parser.parse_args()
+    if args.comando == 'carga':
+        benchmark_carga(args.sesiones, args.latencia, args.hilos)
+    elif args.comando == 'arranque':
+        benchmark_arranque(args.procesos, args.antes, args.limite_ms)
+    elif args.comando == 'arranque-gemini':
+        benchmark_arranque_gemini(args.latencia)
+    elif args.comando == 'cache-gemini':
+        comprobar_cache_gemini()
+    elif args.comando == 'stream-gemini':
+        comprobar_stream_gemini()
+    elif args.comando == 'silabas':
+        benchmark_silabas(args.versos)
+    elif args.comando == 'director':
+        benchmark_director(args.latencia, args.repeticiones)
+    elif args.comando == 'fusion':
+        benchmark_fusion(args.registros)
+    elif args.comando == 'pib':
+        benchmark_pib(args.repeticiones)
+    elif args.comando == 'vuelo-unico':
+        benchmark_vuelo_unico(args.sesiones, args.latencia)
+    elif args.comando == 'reruns':
+        benchmark_reruns(args.latencia, args.antes)
+    elif args.comando == 'gemini':
+        benchmark_gemini(
+            args.peticiones, args.sesiones, args.cuota, args.ventana, args.modelos, args.latencia, args.tolerancia
+        )
+    elif args.comando == 'proveedores':
+        benchmark_proveedores(
+            args.llamadas, args.concurrencia, args.latencia, args.errores, args.lentas, args.latencia_gemini,
+            args.metricas
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Tareas de mantenimiento de Arty (cachés e índices locales).
+
+Uso:
+    python herramientas.py precalentar-wikipedia artistas.txt
+    python herramientas.py importar-obras volcado.json
+    python herramientas.py refrescar-generos [--solo-vencidos]
+"""
+import argparse
+import json
+
+import streamlit_app as app
+
+
+def precalentar_wikipedia(ruta):
+    """Resuelve en lote los artistas de un archivo (uno por línea) y guarda sus títulos."""
+    with open(ruta, encoding='utf-8') as archivo:
+        nombres = [linea.strip() for linea in archivo if linea.strip() and not linea.startswith('#')]
+
+    resultados = app.ArtistInfo.buscar_en_wikipedia_lote(nombres)
+    encontrados = sum(1 for resultado in resultados.values() if resultado)
+    print(f"Wikipedia: {encontrados}/{len(nombres)} artistas resueltos")
+    for nombre, resultado in resultados.items():
+        if not resultado:
+            print(f"  sin página: {nombre}")
+
+
+def importar_obras(ruta):
+    """Siembra el índice local de obras desde un volcado JSON.
+
+    Acepta una lista de obras (con el formato de `ArtIdentifier`) o un objeto
+    consulta -> lista de obras; en ese caso las consultas quedan resueltas y
+    se contestan sin red mientras estén vigentes.
+    """
+    with open(ruta, encoding='utf-8') as archivo:
+        volcado = json.load(archivo)
+
+    indice = app.indice_obras()
+    if isinstance(volcado, dict):
+        total = sum(indice.agregar(obras, consulta=consulta) for consulta, obras in volcado.items())
+        print(f"Índice de obras: {total} obras importadas de {len(volcado)} consultas")
+    else:
+        total = indice.agregar(volcado)
+        print(f"Índice de obras: {total} obras importadas")
+    print(f"  total en el índice: {indice.estadisticas()['obras']}")
+
+
+def refrescar_generos(solo_vencidos):
+    """Descarga de nuevo el top de cada género de TMDb a la tabla local."""
+    actualizados = app.MovieRecommender.refrescar_tabla_generos(solo_vencidos=solo_vencidos)
+    print(f"Géneros actualizados: {actualizados}")
+    for genero_id, nombre in sorted(app.MovieRecommender.GENEROS.items(), key=lambda par: par[1]):
+        estado = app.MovieRecommender.estado_genero(genero_id)
+        if estado is None:
+            print(f"  {nombre:16} sin datos")
+        else:
+            marca = " (vencido)" if estado['vencido'] else ""
+            print(f"  {nombre:16} hace {estado['antiguedad'] / 3600:5.1f} h{marca}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    wikipedia = subcomandos.add_parser('precalentar-wikipedia', help="Resolver artistas en lote y llenar la caché de títulos")
+    wikipedia.add_argument('archivo', help="Archivo de texto con un nombre por línea")
+
+    obras = subcomandos.add_parser('importar-obras', help="Sembrar el índice local de obras desde un volcado JSON")
+    obras.add_argument('archivo', help="JSON con una lista de obras o un objeto consulta -> obras")
+
+    generos = subcomandos.add_parser('refrescar-generos', help="Recalcular la tabla local con el top de cada género")
+    generos.add_argument('--solo-vencidos', action='store_true', help="Refrescar solo los géneros con la tabla vencida")
+
+    args = parser.parse_args()
+    if args.comando == 'precalentar-wikipedia':
+        precalentar_wikipedia(args.archivo)
+    elif args.comando == 'importar-obras':
+        importar_obras(args.archivo)
+    elif args.comando == 'refrescar-generos':
+        refrescar_generos(args.solo_vencidos)
+
+
+if __name__ == "__main__":
+    main()
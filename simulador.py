@@ -0,0 +1,349 @@
+"""Servidor local que se hace pasar por los proveedores de Arty (sin API keys ni internet).
+
+Responde como el Met, el Rijksmuseum, Harvard, TMDb y Wikipedia a partir de las
+respuestas grabadas en data/fixtures/, con latencia configurable e inyección de
+errores, e incluye un modelo Gemini simulado. Lo usan benchmarks.py y cualquier
+prueba manual:
+
+    servidor = ServidorSimulado(latencia=0.05, errores=0.02).iniciar()
+    servidor.configurar(app)   # apunta las URLs de streamlit_app al servidor
+    ...
+    servidor.detener()
+
+Uso como programa (deja el servidor escuchando):
+    python simulador.py --puerto 8600 --latencia 0.1 --errores 0.05
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fixtures')
+
+# Las colecciones grabadas son pequeñas; se repiten (con título distinto) hasta este tamaño
+COPIAS = 5
+
+
+def cargar_fixtures(directorio=FIXTURES_DIR):
+    """Respuestas grabadas por nombre de archivo (sin .json)."""
+    fixtures = {}
+    for archivo in os.listdir(directorio):
+        if archivo.endswith('.json'):
+            with open(os.path.join(directorio, archivo), encoding='utf-8') as entrada:
+                fixtures[archivo[:-5]] = json.load(entrada)
+    return fixtures
+
+
+def _replica(registro, copia, campos_titulo=('title',), campos_url=()):
+    """Copia de un registro grabado que no se confunde con el original (otro título y otras URLs)."""
+    if copia == 0:
+        return registro
+    registro = copy.deepcopy(registro)
+    for campo in campos_titulo:
+        if registro.get(campo):
+            registro[campo] = f"{registro[campo]} (réplica {copia})"
+    for campo in campos_url:
+        if registro.get(campo):
+            registro[campo] = f"{registro[campo]}?replica={copia}"
+    return registro
+
+
+class ServidorSimulado:
+    """Servidor HTTP con las rutas de todos los proveedores bajo un prefijo cada uno.
+
+    - `latencia`: segundos por respuesta (±25 %), o un dict proveedor -> segundos.
+    - `errores`: probabilidad de responder 503 (el cliente HTTP reintenta).
+    - `lentas`: probabilidad de que una respuesta tarde 10 veces más (cola larga).
+
+    `peticiones` cuenta todas las peticiones y `por_proveedor` las reparte.
+    """
+
+    PROVEEDORES = ('met', 'rijks', 'harvard', 'tmdb', 'wikipedia')
+
+    def __init__(self, latencia=0.05, errores=0.0, lentas=0.0, semilla=None, fixtures=None):
+        self.latencia = latencia
+        self.errores = errores
+        self.lentas = lentas
+        self.fixtures = fixtures or cargar_fixtures()
+        self.peticiones = 0
+        self.por_proveedor = Counter()
+        self.url = None
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    # ---- Respuestas por proveedor ----
+    def _met(self, ruta, parametros):
+        objetos = self.fixtures['met_objetos']
+        if ruta.endswith('/search'):
+            ids = [objeto['objectID'] + 1_000_000 * copia for copia in range(COPIAS) for objeto in objetos]
+            return {'total': len(ids), 'objectIDs': ids}
+        object_id = int(ruta.rsplit('/', 1)[1])
+        base, copia = object_id % 1_000_000, object_id // 1_000_000
+        objeto = next((objeto for objeto in objetos if objeto['objectID'] == base), None)
+        if objeto is None:
+            return None
+        objeto = _replica(objeto, copia, campos_url=('primaryImage', 'objectURL'))
+        return dict(objeto, objectID=object_id)
+
+    def _paginar(self, registros, pagina, por_pagina, **replica):
+        total = len(registros) * COPIAS
+        inicio = (pagina - 1) * por_pagina
+        return [
+            _replica(registros[indice % len(registros)], indice // len(registros), **replica)
+            for indice in range(inicio, min(inicio + por_pagina, total))
+        ], total
+
+    def _rijks(self, ruta, parametros):
+        pagina, por_pagina = int(parametros.get('p', 1)), int(parametros.get('ps', 10))
+        obras, total = self._paginar(self.fixtures['rijksmuseum']['artObjects'], pagina, por_pagina)
+        return {'count': total, 'artObjects': obras}
+
+    def _harvard(self, ruta, parametros):
+        pagina, por_pagina = int(parametros.get('page', 1)), int(parametros.get('size', 10))
+        obras, total = self._paginar(
+            self.fixtures['harvard']['records'], pagina, por_pagina, campos_url=('primaryimageurl', 'url')
+        )
+        return {'info': {'totalrecords': total, 'pages': -(-total // por_pagina)}, 'records': obras}
+
+    def _tmdb(self, ruta, parametros):
+        persona = self.fixtures['tmdb_persona']
+        if ruta.startswith('/search/person'):
+            return persona['search']
+        if ruta.startswith('/person/'):
+            if ruta.endswith('/movie_credits'):
+                return persona['movie_credits']
+            detalle = dict(persona['person'])
+            if 'movie_credits' in parametros.get('append_to_response', ''):
+                detalle['movie_credits'] = persona['movie_credits']
+            return detalle
+
+        # Listados (discover/search): 20 por página, ids únicos en todas las páginas
+        listado = self.fixtures['tmdb_peliculas']
+        peliculas = listado['results']
+        pagina = int(parametros.get('page', 1))
+        resultados = []
+        for indice in range((pagina - 1) * 20, pagina * 20):
+            pelicula = _replica(peliculas[indice % len(peliculas)], indice // len(peliculas))
+            if indice >= len(peliculas):
+                pelicula = dict(pelicula, id=pelicula['id'] * 1000 + indice)
+            resultados.append(pelicula)
+        return {'page': pagina, 'total_pages': listado['total_pages'], 'results': resultados}
+
+    def _wikipedia(self, ruta, parametros):
+        if parametros.get('list') == 'search':
+            # La búsqueda que hacía la versión anterior antes de pedir el extracto
+            pagina = next(iter(self.fixtures['wikipedia']['query']['pages'].values()))
+            return {'query': {'search': [{'ns': 0, 'title': parametros.get('srsearch') or pagina['title'],
+                                          'pageid': pagina['pageid']}]}}
+        respuesta = copy.deepcopy(self.fixtures['wikipedia'])
+        # La página grabada toma el título pedido (o buscado) para que la respuesta cuadre
+        titulo = parametros.get('titles') or parametros.get('gsrsearch')
+        if titulo:
+            for pagina in respuesta['query']['pages'].values():
+                pagina['title'] = titulo.split('|')[0]
+        return respuesta
+
+    def responder(self, ruta_completa):
+        """(proveedor, estado, cuerpo) para una ruta; también la usa el manejador HTTP."""
+        partes = urlsplit(ruta_completa)
+        parametros = {clave: valores[0] for clave, valores in parse_qs(partes.query).items()}
+        proveedor, _, ruta = partes.path.lstrip('/').partition('/')
+        ruta = '/' + ruta
+        if proveedor == 'w':
+            proveedor = 'wikipedia'
+        if proveedor not in self.PROVEEDORES:
+            return proveedor, 404, {'error': 'ruta desconocida'}
+
+        cuerpo = getattr(self, f"_{proveedor}")(ruta, parametros)
+        if cuerpo is None:
+            return proveedor, 404, {'message': 'Not a valid object'}
+        return proveedor, 200, cuerpo
+
+    def _espera(self, proveedor):
+        latencia = self.latencia.get(proveedor, 0.05) if isinstance(self.latencia, dict) else self.latencia
+        with self._lock:
+            espera = latencia * self._azar.uniform(0.75, 1.25)
+            if self._azar.random() < self.lentas:
+                espera *= 10
+            fallar = self._azar.random() < self.errores
+        return espera, fallar
+
+    # ---- Ciclo de vida ----
+    def iniciar(self, host='127.0.0.1', puerto=0):
+        simulador = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                proveedor, estado, cuerpo = simulador.responder(self.path)
+                with simulador._lock:
+                    simulador.peticiones += 1
+                    simulador.por_proveedor[proveedor] += 1
+                espera, fallar = simulador._espera(proveedor)
+                time.sleep(espera)
+                if fallar:
+                    estado, cuerpo = 503, {'error': 'fallo inyectado'}
+
+                datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+                self.send_response(estado)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+        class Servidor(ThreadingHTTPServer):
+            request_queue_size = 1024
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # Clientes que cancelan a medias (p.ej. Wikipedia cuando ya no hace falta)
+                pass
+
+        self._servidor = Servidor((host, puerto), Manejador)
+        threading.Thread(target=self._servidor.serve_forever, name="arty-simulador", daemon=True).start()
+        self.url = f"http://{host}:{self._servidor.server_port}"
+        return self
+
+    def detener(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def reiniciar_contadores(self):
+        with self._lock:
+            self.peticiones = 0
+            self.por_proveedor.clear()
+
+    def configurar(self, app, gemini=None, rpm_gemini=60000):
+        """Apunta los proveedores de `streamlit_app` a este servidor (y Gemini al modelo simulado).
+
+        `gemini` puede ser un modelo o una lista (en orden de preferencia); `rpm_gemini` es
+        la cuota por minuto que aplica el planificador a cada uno (por defecto, sin freno).
+        """
+        app.ArtIdentifier.MET_URL = f"{self.url}/met"
+        app.ArtIdentifier.RIJKS_URL = f"{self.url}/rijks"
+        app.ArtIdentifier.HARVARD_URL = f"{self.url}/harvard"
+        app.MovieRecommender.BASE_URL = f"{self.url}/tmdb"
+        app.MovieRecommender.TMDB_API_KEY = 'clave-simulada'
+        app.ArtistInfo.WIKIPEDIA_URL = f"{self.url}/w/api.php"
+        # Todos los proveedores comparten aquí un mismo host: sumar sus límites de concurrencia
+        app.ClienteHTTP.LIMITES_POR_HOST = dict(
+            app.ClienteHTTP.LIMITES_POR_HOST,
+            **{urlsplit(self.url).netloc: sum(app.ClienteHTTP.LIMITES_POR_HOST.values())}
+        )
+        os.environ['HARVARD_API_KEY'] = 'clave-simulada'
+        modelos = gemini or ModeloGeminiSimulado(texto=self.fixtures['gemini']['respuesta'])
+        planificador = app.PlanificadorGemini(modelos if isinstance(modelos, list) else [modelos], rpm=rpm_gemini)
+        app.planificador_gemini = lambda: planificador
+        return app
+
+
+class CuotaAgotada(Exception):
+    """Lo que lanza la API de Gemini al pasarse de cuota (ResourceExhausted, HTTP 429)."""
+
+    code = 429
+
+
+class ModeloGeminiSimulado:
+    """Se comporta como `genai.GenerativeModel` para `generate_content` (normal y en streaming).
+
+    `latencia` es lo que tarda el primer fragmento y `latencia_fragmento` cada uno de
+    los siguientes; con probabilidad `errores` lanza una excepción como la API real.
+    Con `cuota` acepta como mucho ese número de llamadas en cada `ventana` de segundos
+    (deslizante) y responde 429 al resto, indicando cuándo reintentar. Con
+    `streaming=False` falla al pedirle `stream=True`, como un modelo que no lo admite.
+    """
+
+    def __init__(self, texto="Respuesta simulada.", latencia=0.8, latencia_fragmento=0.05,
+                 fragmentos=8, errores=0.0, model_name='models/gemini-simulado', semilla=None,
+                 cuota=None, ventana=60.0, streaming=True):
+        self.texto = texto
+        self.latencia = latencia
+        self.latencia_fragmento = latencia_fragmento
+        self.fragmentos = fragmentos
+        self.errores = errores
+        self.model_name = model_name
+        self.cuota = cuota
+        self.ventana = ventana
+        self.streaming = streaming
+        self.llamadas = 0
+        self.rechazadas = 0
+        self._aceptadas = deque()
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def _trozos(self):
+        palabras = re.split(r'(?<=\s)', self.texto)
+        tamaño = max(1, -(-len(palabras) // self.fragmentos))
+        return [''.join(palabras[i:i + tamaño]) for i in range(0, len(palabras), tamaño)]
+
+    def _comprobar(self):
+        with self._lock:
+            self.llamadas += 1
+            if self.cuota is not None:
+                ahora = time.monotonic()
+                while self._aceptadas and self._aceptadas[0] <= ahora - self.ventana:
+                    self._aceptadas.popleft()
+                if len(self._aceptadas) >= self.cuota:
+                    self.rechazadas += 1
+                    reintento = self._aceptadas[0] + self.ventana - ahora if self._aceptadas else self.ventana
+                    raise CuotaAgotada(
+                        f"429 Resource has been exhausted (e.g. check quota). Please retry in {reintento:.2f}s."
+                    )
+                self._aceptadas.append(ahora)
+            fallar = self._azar.random() < self.errores
+        if fallar:
+            raise RuntimeError("503 The model is overloaded. Please try again later.")
+
+    def _stream(self):
+        time.sleep(self.latencia)
+        for numero, trozo in enumerate(self._trozos()):
+            if numero:
+                time.sleep(self.latencia_fragmento)
+            yield SimpleNamespace(text=trozo)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self._comprobar()
+        if stream:
+            if not self.streaming:
+                raise RuntimeError("400 This model does not support streaming.")
+            return self._stream()
+        time.sleep(self.latencia + self.latencia_fragmento * (self.fragmentos - 1))
+        return SimpleNamespace(text=self.texto)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--puerto', type=int, default=8600)
+    parser.add_argument('--latencia', type=float, default=0.05, help="Segundos por respuesta")
+    parser.add_argument('--errores', type=float, default=0.0, help="Probabilidad de responder 503")
+    parser.add_argument('--lentas', type=float, default=0.0, help="Probabilidad de una respuesta 10 veces más lenta")
+    args = parser.parse_args()
+
+    servidor = ServidorSimulado(args.latencia, args.errores, args.lentas).iniciar(puerto=args.puerto)
+    print(f"Simulador escuchando en {servidor.url}")
+    print(f"  Met: {servidor.url}/met | Rijksmuseum: {servidor.url}/rijks | Harvard: {servidor.url}/harvard")
+    print(f"  TMDb: {servidor.url}/tmdb | Wikipedia: {servidor.url}/w/api.php")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.detener()
+
+
+if __name__ == "__main__":
+    main()
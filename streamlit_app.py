@@ -1,55 +1,2164 @@
+import time
+# Referencia para el perfil de arranque (ARTY_PERFIL_ARRANQUE=1): todo lo que sigue cuenta
+_INICIO_SCRIPT = time.perf_counter()
+
 import streamlit as st
-import requests
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import copy
+import csv
+import difflib
+import functools
+import hashlib
+import heapq
+import inspect
+import io
+import queue
 import random
+import re
+import importlib
+import json
+import sys
+import sqlite3
+import threading
+import unicodedata
+import weakref
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+
+# ==================== ARRANQUE ====================
+class PerfilArranque:
+    """Tiempos de la primera ejecución del script en el proceso.
+
+    Cada etapa mide desde la marca anterior (la primera, desde el inicio del script);
+    las dependencias diferidas se anotan aparte, con lo que costó importarlas la
+    primera vez que un módulo de la interfaz las usó.
+    """
+    
+    def __init__(self):
+        self.etapas = []
+        self.diferidas = {}
+        self.completo = False
+        self._ultima = None
+        self._candado = threading.Lock()
+    
+    def marcar(self, etapa, desde=None):
+        """Cierra la etapa `etapa` (solo cuenta la primera ejecución del script)."""
+        ahora = time.perf_counter()
+        with self._candado:
+            if self.completo:
+                return
+            inicio = self._ultima if self._ultima is not None else desde
+            self.etapas.append((etapa, ahora - (inicio if inicio is not None else ahora)))
+            self._ultima = ahora
+    
+    def terminar(self):
+        with self._candado:
+            self.completo = True
+    
+    def anotar_importacion(self, modulo, segundos):
+        with self._candado:
+            self.diferidas.setdefault(modulo, segundos)
+    
+    def total(self):
+        return sum(segundos for _, segundos in self.etapas)
+    
+    def informe(self):
+        lineas = ["Arranque de Arty (primera ejecución del script en este proceso)"]
+        lineas += [f"  {etapa:24} {segundos * 1000:9.1f} ms" for etapa, segundos in self.etapas]
+        lineas.append(f"  {'total':24} {self.total() * 1000:9.1f} ms")
+        if self.diferidas:
+            lineas.append("  importadas al primer uso:")
+            lineas += [f"    {modulo:22} {segundos * 1000:9.1f} ms" for modulo, segundos in self.diferidas.items()]
+        return "\n".join(lineas)
+
+
+@st.cache_resource(show_spinner=False)
+def perfil_arranque():
+    return PerfilArranque()
+
+
+class ImportacionDiferida:
+    """Módulo que solo se importa cuando se usa por primera vez uno de sus atributos.
+
+    Las dependencias pesadas (Gemini, NumPy, Pillow, aiohttp) no hacen falta para
+    pintar la primera pantalla; así solo las paga la sesión que abre el módulo que
+    las necesita, y una sola vez por proceso.
+    """
+    
+    def __init__(self, nombre):
+        object.__setattr__(self, '_nombre', nombre)
+    
+    def _modulo(self):
+        modulo = sys.modules.get(self._nombre)
+        if modulo is None:
+            inicio = time.perf_counter()
+            modulo = importlib.import_module(self._nombre)
+            perfil_arranque().anotar_importacion(self._nombre, time.perf_counter() - inicio)
+        return modulo
+    
+    def __getattr__(self, atributo):
+        return getattr(self._modulo(), atributo)
+    
+    def __setattr__(self, atributo, valor):
+        setattr(self._modulo(), atributo, valor)
+    
+    def __repr__(self):
+        return f"<importación diferida de {self._nombre!r}>"
+
+
+genai = ImportacionDiferida('google.generativeai')
+np = ImportacionDiferida('numpy')
+Image = ImportacionDiferida('PIL.Image')
+aiohttp = ImportacionDiferida('aiohttp')
+
+perfil_arranque().marcar('importaciones', desde=_INICIO_SCRIPT)
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Carpeta para los datos locales (cachés, índices); se puede cambiar con ARTY_CACHE_DIR
+CACHE_DIR = os.getenv('ARTY_CACHE_DIR', '.cache')
+
 # Configurar Gemini AI: elección dinámica de modelo disponible
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# La lista de modelos se guarda en disco y se revalida en segundo plano pasado este tiempo
+GEMINI_MODELOS_TTL = 24 * 3600
+_GEMINI_MODELOS_ARCHIVO = os.path.join(CACHE_DIR, 'gemini_modelos.json')
+
+
+def _descubrir_modelos_gemini():
+    """Pregunta a la API qué modelos admiten generateContent, en orden de preferencia."""
+    # Filtrar modelos disponibles, excluyendo experimentales
+    todos = [m.name for m in genai.list_models() if 'generateContent' in getattr(m, 'supported_generation_methods', [])]
+    # Excluir modelos experimentales (-exp) que tienen límites muy bajos
+    modelos = [nombre for nombre in todos if '-exp' not in nombre.lower()]
+    # Si no hay modelos estables, usar los experimentales como fallback
+    if not modelos:
+        modelos = todos
+    # Priorizar modelos flash (más rápidos y mejor cuota gratuita)
+    return sorted(modelos, key=lambda nombre: 'flash' not in nombre.lower())
 
+
+def _guardar_modelos_gemini(modelos):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temporal = f"{_GEMINI_MODELOS_ARCHIVO}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump({'guardado': time.time(), 'modelos': modelos}, archivo)
+    os.replace(temporal, _GEMINI_MODELOS_ARCHIVO)
+
+
+def _refrescar_modelos_gemini(anteriores):
+    """Revalida la lista de modelos en segundo plano (no bloquea el render)."""
+    try:
+        modelos = _descubrir_modelos_gemini()
+    except Exception:
+        return
+    if modelos:
+        _guardar_modelos_gemini(modelos)
+        # Si cambió el modelo preferido, el próximo rerun creará el nuevo
+        if modelos[:1] != anteriores[:1]:
+            _init_gemini_model.clear()
+            planificador_gemini.clear()
+
+
+def _modelos_gemini():
+    """Lista de modelos Gemini disponibles, leída de disco si es posible.
+
+    Solo la primera vez (sin archivo) se consulta la API en línea; si el archivo está
+    vencido se usa igual y se refresca en segundo plano.
+    """
+    try:
+        with open(_GEMINI_MODELOS_ARCHIVO, encoding='utf-8') as archivo:
+            guardado = json.load(archivo)
+    except (OSError, ValueError):
+        guardado = None
+    
+    if guardado and guardado.get('modelos'):
+        if time.time() - guardado.get('guardado', 0) > GEMINI_MODELOS_TTL:
+            threading.Thread(
+                target=_refrescar_modelos_gemini, args=(guardado['modelos'],),
+                name="arty-gemini-modelos", daemon=True
+            ).start()
+        return guardado['modelos']
+    
+    modelos = _descubrir_modelos_gemini()
+    if modelos:
+        _guardar_modelos_gemini(modelos)
+    return modelos
+
+
+@st.cache_resource(show_spinner=False)
 def _init_gemini_model():
+    """Crea el modelo Gemini una sola vez por proceso (no en cada rerun de Streamlit)."""
     if not GEMINI_API_KEY:
         return None
     try:
         genai.configure(api_key=GEMINI_API_KEY)
-        modelos = []
         try:
-            # Filtrar modelos disponibles, excluyendo experimentales
-            todos = [m for m in genai.list_models() if 'generateContent' in getattr(m, 'supported_generation_methods', [])]
-            # Excluir modelos experimentales (-exp) que tienen límites muy bajos
-            modelos = [m for m in todos if '-exp' not in m.name.lower()]
-            # Si no hay modelos estables, usar los experimentales como fallback
-            if not modelos:
-                modelos = todos
+            modelos = _modelos_gemini()
         except Exception as e:
             st.warning(f"No se pudieron listar modelos de Gemini: {e}")
             modelos = []
 
-        if modelos:
-            # Priorizar modelos flash (más rápidos y mejor cuota gratuita)
-            elegido = next((m for m in modelos if 'flash' in m.name.lower()), modelos[0])
-            return genai.GenerativeModel(elegido.name)
+        if modelos:
+            return genai.GenerativeModel(modelos[0])
+        else:
+            st.warning("No hay modelos Gemini disponibles para generateContent en tu cuenta/API key.")
+    except Exception as e:
+        st.warning(f"Error configurando Gemini: {e}")
+    return None
+
+
+# Configuración de la página
+st.set_page_config(
+    page_title="Arty - Tu Asistente de Arte IA",
+    page_icon="🎨",
+    layout="wide"
+)
+perfil_arranque().marcar('configuración')
+
+# ==================== UTILIDADES DE CONCURRENCIA ====================
+# Los proveedores son asíncronos; las versiones síncronas corren sus corrutinas en
+# un único bucle de eventos en segundo plano, compartido por todas las sesiones.
+_AVISOS = contextvars.ContextVar('avisos', default=None)
+# Errores de proveedores ya pintados por cada hilo de script (ver `errores_mostrados`)
+_ERRORES_MOSTRADOS = threading.local()
+
+
+@st.cache_resource(show_spinner=False)
+def _bucle_de_fondo():
+    """Bucle de eventos que vive en su propio hilo (sobrevive a los reruns de Streamlit)."""
+    bucle = asyncio.new_event_loop()
+    threading.Thread(target=bucle.run_forever, name="arty-async", daemon=True).start()
+    return bucle
+
+
+def ejecutar_sync(corrutina):
+    """Ejecuta una corrutina en el bucle de fondo y espera su resultado.
+
+    Los errores que los proveedores quieren mostrar (`avisar_error`) se guardan mientras
+    la corrutina corre en el otro hilo y se pintan aquí, en el hilo del script.
+    """
+    bucle = _bucle_de_fondo()
+    try:
+        en_bucle_de_fondo = asyncio.get_running_loop() is bucle
+    except RuntimeError:
+        en_bucle_de_fondo = False
+    if en_bucle_de_fondo:
+        corrutina.close()
+        raise RuntimeError("Usa la versión async: este código ya corre dentro del bucle de fondo")
+    
+    avisos = []
+    
+    async def _con_avisos():
+        _AVISOS.set(avisos)
+        return await corrutina
+    
+    resultado = asyncio.run_coroutine_threadsafe(_con_avisos(), bucle).result()
+    for mensaje in avisos:
+        _mostrar_error(mensaje)
+    return resultado
+
+
+def avisar_error(mensaje):
+    """Muestra un error de un proveedor, o lo guarda si estamos fuera del hilo del script.
+
+    Las llamadas trazadas en curso (ver `trazar`) quedan marcadas como 'error'.
+    """
+    for traza in _TRAZAS.get():
+        traza['resultado'] = 'error'
+    avisos = _AVISOS.get()
+    if avisos is None:
+        _mostrar_error(mensaje)
+    else:
+        avisos.append(mensaje)
+
+
+def _mostrar_error(mensaje):
+    st.error(mensaje)
+    _ERRORES_MOSTRADOS.total = errores_mostrados() + 1
+
+
+def errores_mostrados():
+    """Cuántos errores de proveedores ha pintado el hilo actual; sirve para saber si una llamada falló."""
+    return getattr(_ERRORES_MOSTRADOS, 'total', 0)
+
+
+def version_sincrona(metodo_async):
+    """Crea la versión síncrona (bloqueante) de un método estático `async`."""
+    funcion = getattr(metodo_async, '__func__', metodo_async)
+    
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        return ejecutar_sync(funcion(*args, **kwargs))
+    
+    envoltura.__name__ = funcion.__name__.removesuffix('_async')
+    envoltura.__qualname__ = funcion.__qualname__.removesuffix('_async')
+    return staticmethod(envoltura)
+
+
+def version_iterable(generador_async):
+    """Crea la versión síncrona de un generador `async` estático: se itera desde el hilo del script."""
+    funcion = getattr(generador_async, '__func__', generador_async)
+    
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        return iterar_sync(funcion(*args, **kwargs))
+    
+    envoltura.__name__ = funcion.__name__.removesuffix('_async')
+    envoltura.__qualname__ = funcion.__qualname__.removesuffix('_async')
+    return staticmethod(envoltura)
+
+
+class LimitadorTasa:
+    """Cubeta de fichas: como mucho `tasa` operaciones por segundo, con ráfagas de hasta `rafaga`.
+
+    Es seguro entre hilos y entre bucles de eventos: cada llamada reserva su ficha al
+    momento y solo después espera lo que le toque. `pausar` frena a todos los que
+    vengan detrás (p. ej. tras un 429 con Retry-After).
+    """
+
+    def __init__(self, tasa, rafaga=None):
+        self.tasa = tasa
+        self.rafaga = rafaga or tasa
+        self.esperas = 0
+        self._fichas = float(self.rafaga)
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def reservar(self, fichas=1):
+        """Reserva `fichas` y devuelve cuántos segundos hay que esperar antes de usarlas."""
+        with self._lock:
+            ahora = time.monotonic()
+            self._fichas = min(self.rafaga, self._fichas + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            self._fichas -= fichas
+            espera = max(0.0, -self._fichas / self.tasa, self._pausa_hasta - ahora)
+            if espera:
+                self.esperas += 1
+            return espera
+
+    def espera(self, fichas=1):
+        """Lo que esperaría `reservar(fichas)` en este momento, sin reservar nada."""
+        with self._lock:
+            ahora = time.monotonic()
+            disponibles = min(self.rafaga, self._fichas + (ahora - self._ultimo) * self.tasa)
+            return max(0.0, (fichas - disponibles) / self.tasa, self._pausa_hasta - ahora)
+
+    def fichas_en(self, segundos):
+        """Fichas que se podrán haber usado dentro de `segundos` si nadie más reserva."""
+        with self._lock:
+            ahora = time.monotonic()
+            if ahora + segundos < self._pausa_hasta:
+                return 0.0
+            disponibles = min(self.rafaga, self._fichas + (ahora - self._ultimo) * self.tasa)
+            return max(0.0, disponibles + segundos * self.tasa)
+
+    async def adquirir(self, fichas=1):
+        espera = self.reservar(fichas)
+        if espera:
+            await asyncio.sleep(espera)
+
+    def pausar(self, segundos):
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+
+
+def iterar_sync(generador):
+    """Recorre un generador asíncrono desde el hilo del script, elemento a elemento.
+
+    El generador corre en el bucle de fondo y cada elemento se entrega en cuanto
+    llega, así que la interfaz puede ir pintando sin esperar al último. Si se deja
+    de iterar antes de tiempo, el generador se cancela.
+    """
+    bucle = _bucle_de_fondo()
+    cola = queue.Queue()
+    fin = object()
+    avisos = []
+
+    async def _bombear():
+        _AVISOS.set(avisos)
+        try:
+            async for elemento in generador:
+                cola.put(elemento)
+        finally:
+            cola.put(fin)
+
+    futuro = asyncio.run_coroutine_threadsafe(_bombear(), bucle)
+    try:
+        while (elemento := cola.get()) is not fin:
+            yield elemento
+        futuro.result()
+    finally:
+        futuro.cancel()
+        for mensaje in avisos:
+            _mostrar_error(mensaje)
+
+
+async def intercalar(generadores, plazo_total=None):
+    """Mezcla varios generadores asíncronos: entrega cada elemento según llega, venga de donde venga.
+
+    Un generador que falla simplemente deja de aportar; con `plazo_total` se deja de
+    esperar a los que sigan sin terminar.
+    """
+    cola = asyncio.Queue()
+    fin = object()
+
+    async def _consumir(generador):
+        try:
+            async for elemento in generador:
+                await cola.put(elemento)
+        except Exception:
+            pass
+        finally:
+            await cola.put(fin)
+
+    tareas = [asyncio.ensure_future(_consumir(generador)) for generador in generadores]
+    limite = None if plazo_total is None else asyncio.get_running_loop().time() + plazo_total
+    activos = len(tareas)
+    try:
+        while activos:
+            espera = None if limite is None else limite - asyncio.get_running_loop().time()
+            if espera is not None and espera <= 0:
+                break
+            try:
+                elemento = await asyncio.wait_for(cola.get(), espera)
+            except asyncio.TimeoutError:
+                break
+            if elemento is fin:
+                activos -= 1
+            else:
+                yield elemento
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+
+
+async def consultar_en_paralelo(tareas, timeout_por_tarea=10, plazo_total=12):
+    """Ejecuta varias corrutinas a la vez y devuelve las que terminaron a tiempo.
+
+    `tareas` es un dict nombre -> corrutina. Cada tarea tiene su propio límite
+    (`timeout_por_tarea`) y ninguna puede pasar del plazo global (`plazo_total`).
+    Las tareas que fallan o se pasan del tiempo simplemente no aparecen en el resultado.
+    """
+    # Todas arrancan a la vez, así que el límite efectivo de cada una es el menor de los dos
+    limite = min(timeout_por_tarea, plazo_total)
+    nombres = list(tareas)
+    respuestas = await asyncio.gather(
+        *(asyncio.wait_for(tareas[nombre], limite) for nombre in nombres),
+        return_exceptions=True
+    )
+    return {
+        nombre: respuesta
+        for nombre, respuesta in zip(nombres, respuestas)
+        if not isinstance(respuesta, BaseException)
+    }
+
+
+class VueloUnico:
+    """Comparte entre sesiones las llamadas idénticas que están en curso (single-flight).
+
+    Si diez sesiones piden a la vez lo mismo, solo la primera sale a la red; las demás
+    esperan esa misma tarea y reciben su resultado (o su excepción). La tarea queda
+    protegida con `asyncio.shield`: si quien la lanzó se cancela, las demás siguen
+    esperándola; solo cuando se cancela la última que la esperaba se cancela también
+    la tarea, para no dejar peticiones que ya no quiere nadie. Los avisos (`avisar_error`) de la tarea se guardan con ella y se
+    repiten en el contexto de cada llamada, así que todas las sesiones los ven.
+    Cuenta, por operación, cuántas llamadas hubo y cuántas se ahorraron.
+    """
+
+    def __init__(self):
+        self.activo = True
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        self._contadores = defaultdict(lambda: {'llamadas': 0, 'colapsadas': 0})
+
+    def _soltar(self, clave, tarea):
+        with self._lock:
+            if self._en_vuelo.get(clave, {}).get('tarea') is tarea:
+                del self._en_vuelo[clave]
+        if not tarea.cancelled():
+            # Marca la excepción como recogida aunque ya nadie espere la tarea
+            tarea.exception()
+
+    async def ejecutar(self, operacion, clave, fabrica, copiar=False):
+        """Resultado de `fabrica()` (una corrutina nueva), compartido con las llamadas iguales en curso.
+
+        Con `copiar=True` quienes se suman a una llamada ajena reciben una copia
+        profunda del resultado, para que nadie modifique el de otra sesión.
+        """
+        if not self.activo:
+            with self._lock:
+                self._contadores[operacion]['llamadas'] += 1
+            return await fabrica()
+
+        bucle = asyncio.get_running_loop()
+        clave = (bucle, operacion, clave)
+        with self._lock:
+            vuelo = self._en_vuelo.get(clave)
+            colapsada = vuelo is not None
+            if not colapsada:
+                avisos = []
+                tarea = bucle.create_task(self._con_avisos(fabrica, avisos))
+                vuelo = self._en_vuelo[clave] = {'tarea': tarea, 'avisos': avisos, 'esperando': 0}
+                tarea.add_done_callback(functools.partial(self._soltar, clave))
+            vuelo['esperando'] += 1
+            self._contadores[operacion]['llamadas'] += 1
+            self._contadores[operacion]['colapsadas'] += colapsada
+
+        tarea = vuelo['tarea']
+        cancelada = False
+        try:
+            resultado = await asyncio.shield(tarea)
+        except asyncio.CancelledError:
+            cancelada = not tarea.done()
+            raise
+        finally:
+            self._dejar_de_esperar(clave, vuelo, cancelada)
+            if tarea.done():
+                for mensaje in vuelo['avisos']:
+                    avisar_error(mensaje)
+        return copy.deepcopy(resultado) if colapsada and copiar else resultado
+
+    def _dejar_de_esperar(self, clave, vuelo, cancelada):
+        """Una espera menos; si era la última y se canceló, cancela también la tarea."""
+        with self._lock:
+            vuelo['esperando'] -= 1
+            if not cancelada or vuelo['esperando']:
+                return
+            # Fuera del registro ya: quien llegue ahora debe lanzar una tarea nueva
+            if self._en_vuelo.get(clave) is vuelo:
+                del self._en_vuelo[clave]
+        vuelo['tarea'].cancel()
+
+    @staticmethod
+    async def _con_avisos(fabrica, avisos):
+        # La tarea copia el contexto de quien la lanzó: sus avisos irían solo a esa sesión
+        _AVISOS.set(avisos)
+        return await fabrica()
+
+    def estadisticas(self):
+        """Llamadas, colapsadas (no salieron a la red) y en curso, por operación."""
+        with self._lock:
+            en_vuelo = defaultdict(int)
+            for _, operacion, _ in self._en_vuelo:
+                en_vuelo[operacion] += 1
+            return {
+                operacion: dict(datos, en_vuelo=en_vuelo[operacion])
+                for operacion, datos in sorted(self._contadores.items())
+            }
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+
+
+@st.cache_resource(show_spinner=False)
+def vuelo_unico():
+    """Registro de llamadas en curso compartido por todas las sesiones."""
+    return VueloUnico()
+
+
+def compartir_en_vuelo(normalizar=None):
+    """Decorador: las llamadas concurrentes con los mismos argumentos comparten una sola ejecución.
+
+    La clave es el nombre del método y sus argumentos (con los valores por defecto);
+    `normalizar` recibe el dict de argumentos y devuelve otro para que, por ejemplo,
+    "Mona Lisa" y "mona  lisa" cuenten como la misma consulta.
+    """
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+        operacion = funcion.__name__.removesuffix('_async')
+
+        @functools.wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            argumentos = firma.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            valores = dict(argumentos.arguments)
+            if normalizar:
+                valores = normalizar(valores)
+            clave = json.dumps(valores, sort_keys=True, default=str, ensure_ascii=False)
+            return await vuelo_unico().ejecutar(
+                operacion, clave, lambda: funcion(*args, **kwargs), copiar=True
+            )
+
+        return envoltura
+    return decorador
+
+
+# ==================== MÉTRICAS Y TRAZAS ====================
+# Los proveedores se tragan sus errores y devuelven [] o None, pero los avisan con
+# `avisar_error`; estas métricas permiten distinguir un museo lento de uno que falla o
+# de uno que simplemente no encontró nada.
+_OPERACION = contextvars.ContextVar('operacion', default='')
+# Trazas de las llamadas en curso (de la más externa a la más interna)
+_TRAZAS = contextvars.ContextVar('trazas', default=())
+
+
+class Histograma:
+    """Histograma acumulado de duraciones (en segundos), al estilo de Prometheus."""
+
+    LIMITES = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.cubetas = [0] * (len(self.LIMITES) + 1)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, segundos):
+        self.cubetas[bisect.bisect_left(self.LIMITES, segundos)] += 1
+        self.suma += segundos
+        self.cuenta += 1
+
+    def percentil(self, p):
+        """Estimación del percentil `p` (0-100) interpolando dentro de su cubeta."""
+        if not self.cuenta:
+            return None
+        objetivo = self.cuenta * p / 100
+        acumulado = 0
+        for indice, cantidad in enumerate(self.cubetas):
+            if cantidad and acumulado + cantidad >= objetivo:
+                inferior = self.LIMITES[indice - 1] if indice else 0.0
+                if indice == len(self.LIMITES):
+                    return inferior
+                return inferior + (self.LIMITES[indice] - inferior) * (objetivo - acumulado) / cantidad
+            acumulado += cantidad
+        return self.LIMITES[-1]
+
+
+class Telemetria:
+    """Métricas del proceso: operaciones de los proveedores, peticiones HTTP y cachés.
+
+    - Operaciones (`medir`/`trazar`): duración y resultado (ok, vacio, error, timeout,
+      cancelado) de cada método de proveedor, por (proveedor, operación).
+    - HTTP (`registrar_http`): duración, código de estado, timeouts y bytes de cada
+      intento del cliente compartido, por (host, operación que lo pidió).
+    - Cachés: las cachés con nombre se registran solas y se leen al exportar.
+    - Conexiones: nuevas vs. reutilizadas por host, leídas de `ClienteHTTP.metricas`.
+
+    Se exporta como texto de Prometheus (`prometheus`) o como dict (`instantanea`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operaciones = defaultdict(
+            lambda: {'histograma': Histograma(), 'resultados': defaultdict(int), 'bytes': 0}
+        )
+        self._http = defaultdict(lambda: {'histograma': Histograma(), 'estados': defaultdict(int), 'bytes': 0})
+        self._caches = weakref.WeakValueDictionary()
+        self.inicio = time.time()
+
+    def registrar_operacion(self, proveedor, operacion, segundos, resultado, bytes_recibidos=0):
+        with self._lock:
+            datos = self._operaciones[(proveedor, operacion)]
+            datos['histograma'].observar(segundos)
+            datos['resultados'][resultado] += 1
+            datos['bytes'] += bytes_recibidos
+
+    def registrar_http(self, host, segundos, estado, bytes_recibidos=0):
+        """Un intento HTTP; `estado` es el código de respuesta, 'timeout' o 'error'."""
+        with self._lock:
+            datos = self._http[(host, _OPERACION.get())]
+            datos['histograma'].observar(segundos)
+            datos['estados'][str(estado)] += 1
+            datos['bytes'] += bytes_recibidos
+
+    def registrar_cache(self, nombre, cache):
+        self._caches[nombre] = cache
+
+    @contextlib.contextmanager
+    def medir(self, proveedor, operacion):
+        """Mide un bloque; quien lo usa puede marcar `traza['resultado']` (por defecto 'ok')
+        y `traza['bytes']` si la llamada no pasa por el cliente HTTP (p.ej. Gemini).
+        """
+        traza = {'resultado': 'ok', 'bytes': 0}
+        inicio = time.perf_counter()
+        registrar = True
+        try:
+            yield traza
+        except asyncio.TimeoutError:
+            traza['resultado'] = 'timeout'
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # Plazo global vencido o resultado que ya no hacía falta
+            traza['resultado'] = 'cancelado'
+            raise
+        except Exception:
+            traza['resultado'] = 'error'
+            raise
+        except BaseException:
+            # Control de flujo de Streamlit (rerun, st.stop) o salida del proceso: no es un fallo
+            registrar = False
+            raise
+        finally:
+            if registrar:
+                self.registrar_operacion(
+                    proveedor, operacion, time.perf_counter() - inicio, traza['resultado'], traza['bytes']
+                )
+
+    def instantanea(self):
+        """Todas las métricas en un dict serializable a JSON."""
+        with self._lock:
+            operaciones = [
+                {
+                    'proveedor': proveedor, 'operacion': operacion,
+                    'llamadas': datos['histograma'].cuenta,
+                    'segundos_total': round(datos['histograma'].suma, 4),
+                    'p50': _redondear(datos['histograma'].percentil(50)),
+                    'p95': _redondear(datos['histograma'].percentil(95)),
+                    'resultados': dict(datos['resultados']),
+                    'bytes': datos['bytes'],
+                }
+                for (proveedor, operacion), datos in sorted(self._operaciones.items())
+            ]
+            http = [
+                {
+                    'host': host, 'operacion': operacion,
+                    'peticiones': datos['histograma'].cuenta,
+                    'segundos_total': round(datos['histograma'].suma, 4),
+                    'p50': _redondear(datos['histograma'].percentil(50)),
+                    'p95': _redondear(datos['histograma'].percentil(95)),
+                    'estados': dict(datos['estados']),
+                    'bytes': datos['bytes'],
+                }
+                for (host, operacion), datos in sorted(self._http.items())
+            ]
+            caches = dict(self._caches)
+        return {
+            'desde': self.inicio,
+            'operaciones': operaciones,
+            'http': http,
+            'caches': {nombre: cache.estadisticas() for nombre, cache in sorted(caches.items())},
+            'vuelo_unico': vuelo_unico().estadisticas(),
+            'conexiones': dict(sorted(cliente_http().metricas().items())),
+        }
+
+    @staticmethod
+    def _etiquetas(**etiquetas):
+        return ','.join(
+            f'{clave}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+            for clave, valor in etiquetas.items()
+        )
+
+    @staticmethod
+    def _histograma_prometheus(nombre, histograma, etiquetas):
+        lineas = []
+        acumulado = 0
+        for limite, cantidad in zip(Histograma.LIMITES + ('+Inf',), histograma.cubetas):
+            acumulado += cantidad
+            lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+        lineas.append(f'{nombre}_sum{{{etiquetas}}} {histograma.suma:.6f}')
+        lineas.append(f'{nombre}_count{{{etiquetas}}} {histograma.cuenta}')
+        return lineas
+
+    def prometheus(self):
+        """Métricas en el formato de texto de Prometheus (version 0.0.4)."""
+        e = self._etiquetas
+        lineas = [
+            '# HELP arty_operacion_segundos Duración de los métodos de los proveedores.',
+            '# TYPE arty_operacion_segundos histogram',
+        ]
+        with self._lock:
+            operaciones = sorted(
+                (clave, copy.deepcopy(datos)) for clave, datos in self._operaciones.items()
+            )
+            http = sorted((clave, copy.deepcopy(datos)) for clave, datos in self._http.items())
+            caches = dict(self._caches)
+
+        for (proveedor, operacion), datos in operaciones:
+            lineas += self._histograma_prometheus(
+                'arty_operacion_segundos', datos['histograma'], e(proveedor=proveedor, operacion=operacion)
+            )
+        lineas += [
+            '# HELP arty_operacion_total Llamadas a los proveedores por resultado (ok, vacio, error, timeout, cancelado).',
+            '# TYPE arty_operacion_total counter',
+        ]
+        for (proveedor, operacion), datos in operaciones:
+            for resultado, cantidad in sorted(datos['resultados'].items()):
+                lineas.append(
+                    f'arty_operacion_total{{{e(proveedor=proveedor, operacion=operacion, resultado=resultado)}}} {cantidad}'
+                )
+
+        lineas += [
+            '# HELP arty_operacion_bytes_total Bytes recibidos fuera del cliente HTTP (p.ej. Gemini).',
+            '# TYPE arty_operacion_bytes_total counter',
+        ]
+        for (proveedor, operacion), datos in operaciones:
+            if datos['bytes']:
+                lineas.append(f'arty_operacion_bytes_total{{{e(proveedor=proveedor, operacion=operacion)}}} {datos["bytes"]}')
+
+        lineas += [
+            '# HELP arty_http_segundos Duración de cada intento HTTP.',
+            '# TYPE arty_http_segundos histogram',
+        ]
+        for (host, operacion), datos in http:
+            lineas += self._histograma_prometheus('arty_http_segundos', datos['histograma'], e(host=host, operacion=operacion))
+        lineas += [
+            '# HELP arty_http_respuestas_total Intentos HTTP por código de estado (o timeout/error).',
+            '# TYPE arty_http_respuestas_total counter',
+        ]
+        for (host, operacion), datos in http:
+            for estado, cantidad in sorted(datos['estados'].items()):
+                lineas.append(f'arty_http_respuestas_total{{{e(host=host, operacion=operacion, estado=estado)}}} {cantidad}')
+        lineas += [
+            '# HELP arty_http_bytes_total Bytes recibidos.',
+            '# TYPE arty_http_bytes_total counter',
+        ]
+        for (host, operacion), datos in http:
+            lineas.append(f'arty_http_bytes_total{{{e(host=host, operacion=operacion)}}} {datos["bytes"]}')
+
+        lineas += [
+            '# HELP arty_cache_consultas_total Consultas a las cachés por resultado.',
+            '# TYPE arty_cache_consultas_total counter',
+        ]
+        estadisticas = {nombre: cache.estadisticas() for nombre, cache in sorted(caches.items())}
+        for nombre, datos in estadisticas.items():
+            for resultado in ('aciertos', 'fallos', 'expirados'):
+                lineas.append(f'arty_cache_consultas_total{{{e(cache=nombre, resultado=resultado)}}} {datos[resultado]}')
+        lineas += ['# HELP arty_cache_entradas Entradas guardadas.', '# TYPE arty_cache_entradas gauge']
+        for nombre, datos in estadisticas.items():
+            lineas.append(f'arty_cache_entradas{{{e(cache=nombre)}}} {datos["entradas"]}')
+
+        lineas += [
+            '# HELP arty_vuelo_unico_total Llamadas por operación, y cuántas compartieron una ya en curso.',
+            '# TYPE arty_vuelo_unico_total counter',
+        ]
+        for operacion, datos in vuelo_unico().estadisticas().items():
+            lineas.append(f'arty_vuelo_unico_total{{{e(operacion=operacion, tipo="llamadas")}}} {datos["llamadas"]}')
+            lineas.append(f'arty_vuelo_unico_total{{{e(operacion=operacion, tipo="colapsadas")}}} {datos["colapsadas"]}')
+
+        lineas += [
+            '# HELP arty_http_conexiones_total Conexiones abiertas nuevas frente a reutilizadas (keep-alive).',
+            '# TYPE arty_http_conexiones_total counter',
+        ]
+        for host, datos in sorted(cliente_http().metricas().items()):
+            lineas.append(f'arty_http_conexiones_total{{{e(host=host, tipo="nuevas")}}} {datos["conexiones_nuevas"]}')
+            lineas.append(f'arty_http_conexiones_total{{{e(host=host, tipo="reutilizadas")}}} {datos["reutilizadas"]}')
+        return '\n'.join(lineas) + '\n'
+
+    def reiniciar(self):
+        with self._lock:
+            self._operaciones.clear()
+            self._http.clear()
+            self.inicio = time.time()
+
+
+def _redondear(segundos):
+    return None if segundos is None else round(segundos, 4)
+
+
+@st.cache_resource(show_spinner=False)
+def telemetria():
+    """Métricas compartidas por todas las sesiones."""
+    return Telemetria()
+
+
+@st.cache_resource(show_spinner=False)
+def exportador_metricas():
+    """Servidor HTTP propio de las métricas del proceso; devuelve su URL, o None si no arrancó.
+
+    Publica `/metricas` (texto de Prometheus) y `/metricas.json` en
+    ARTY_METRICAS_HOST:ARTY_METRICAS_PUERTO (127.0.0.1:8598 por defecto), aparte del
+    proxy de imágenes. Solo arranca con ARTY_METRICAS=1; ARTY_METRICAS_URL cambia la
+    dirección que se enlaza desde el panel de depuración.
+    """
+    if os.getenv('ARTY_METRICAS', '0') != '1':
+        return None
+
+    class _Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ruta = urlsplit(self.path).path
+            if ruta == '/metricas.json':
+                contenido = json.dumps(telemetria().instantanea(), ensure_ascii=False).encode('utf-8')
+                tipo = 'application/json'
+            elif ruta == '/metricas':
+                contenido = telemetria().prometheus().encode('utf-8')
+                tipo = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(contenido)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(contenido)
+
+        def log_message(self, formato, *args):
+            pass
+
+    host = os.getenv('ARTY_METRICAS_HOST', '127.0.0.1')
+    try:
+        servidor = ThreadingHTTPServer((host, int(os.getenv('ARTY_METRICAS_PUERTO', '8598'))), _Manejador)
+    except OSError:
+        return None
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="arty-metricas", daemon=True).start()
+    return (os.getenv('ARTY_METRICAS_URL') or f"http://{host}:{servidor.server_address[1]}").rstrip('/')
+
+
+def es_vacio(resultado):
+    """Si un resultado de proveedor no trae nada (None, colección vacía o dict sin valores)."""
+    if isinstance(resultado, dict):
+        return not any(resultado.values())
+    return resultado is None or (isinstance(resultado, (list, tuple, str)) and not resultado)
+
+
+def trazar(proveedor):
+    """Decorador para los métodos `async` de los proveedores.
+
+    Mide cada llamada, la clasifica como ok / vacio / error / timeout / cancelado y deja la
+    operación en contexto para que las peticiones HTTP que haga queden asociadas a ella.
+    Una llamada que avisa de un error (`avisar_error`) cuenta como 'error' aunque
+    devuelva un resultado de respaldo, y también las trazadas que la contienen.
+    """
+    def decorador(funcion):
+        operacion = funcion.__name__.removesuffix('_async')
+
+        @functools.wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            marca = _OPERACION.set(operacion)
+            try:
+                with telemetria().medir(proveedor, operacion) as traza:
+                    marca_trazas = _TRAZAS.set(_TRAZAS.get() + (traza,))
+                    try:
+                        resultado = await funcion(*args, **kwargs)
+                    finally:
+                        _TRAZAS.reset(marca_trazas)
+                    if traza['resultado'] == 'ok' and es_vacio(resultado):
+                        traza['resultado'] = 'vacio'
+                    return resultado
+            finally:
+                _OPERACION.reset(marca)
+
+        return envoltura
+    return decorador
+
+
+# ==================== UTILIDADES DE CACHÉ ====================
+class CachePersistente:
+    """Caché clave -> JSON en SQLite con expiración (TTL), tope de tamaño (LRU) y contadores.
+
+    Está pensada para respuestas de APIs que casi nunca cambian: sobrevive a los
+    reruns de Streamlit y a reinicios del proceso. Un acierto no escribe en disco: el
+    último acceso (que solo sirve para elegir qué desalojar) se apunta en memoria y
+    se vuelca por lotes. Desde código `async` hay que usar `obtener_async` y
+    `guardar_async`, que hacen el trabajo de SQLite fuera del bucle de eventos.
+    """
+    
+    # Volcar los últimos accesos al acumular tantos o cada tantos segundos
+    ACCESOS_POR_LOTE = 200
+    ACCESOS_CADA = 30
+    
+    def __init__(self, nombre, ttl=7 * 24 * 3600, max_entradas=5000, directorio=None):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.ruta = os.path.join(directorio or CACHE_DIR, f"{nombre}.sqlite")
+        self.aciertos = 0
+        self.fallos = 0
+        self.expirados = 0
+        self.desalojos = 0
+        self._lock = threading.Lock()
+        self._accesos = {}
+        self._ultimo_volcado = time.monotonic()
+        
+        os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS entradas ("
+            "clave TEXT PRIMARY KEY, valor TEXT NOT NULL, "
+            "guardado REAL NOT NULL, ultimo_acceso REAL NOT NULL)"
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_acceso ON entradas(ultimo_acceso)")
+        self._conexion.commit()
+        self._total = self._conexion.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+        telemetria().registrar_cache(nombre, self)
+    
+    def obtener(self, clave, incluir_expirados=False):
+        """Devuelve el valor guardado, o None si no existe o ya expiró.
+        
+        Con `incluir_expirados=True` también devuelve entradas vencidas, útil como
+        respaldo cuando la API no responde.
+        """
+        ahora = time.time()
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT valor, guardado FROM entradas WHERE clave = ?", (str(clave),)
+            ).fetchone()
+            if fila is None:
+                self.fallos += 1
+                return None
+            
+            valor, guardado = fila
+            if ahora - guardado > self.ttl and not incluir_expirados:
+                self.expirados += 1
+                return None
+            
+            self.aciertos += 1
+            self._accesos[str(clave)] = ahora
+            if (len(self._accesos) >= self.ACCESOS_POR_LOTE
+                    or time.monotonic() - self._ultimo_volcado > self.ACCESOS_CADA):
+                self._volcar_accesos()
+                self._conexion.commit()
+        return json.loads(valor)
+    
+    def guardar(self, clave, valor):
+        """Guarda (o revalida) una entrada y desaloja las menos usadas si se pasa del tope."""
+        ahora = time.time()
+        fila = (json.dumps(valor, ensure_ascii=False), ahora, ahora, str(clave))
+        with self._lock:
+            self._accesos.pop(str(clave), None)
+            cursor = self._conexion.execute(
+                "UPDATE entradas SET valor = ?, guardado = ?, ultimo_acceso = ? WHERE clave = ?", fila
+            )
+            if cursor.rowcount == 0:
+                self._conexion.execute(
+                    "INSERT INTO entradas (valor, guardado, ultimo_acceso, clave) VALUES (?, ?, ?, ?)", fila
+                )
+                self._total += 1
+            sobrantes = self._total - self.max_entradas
+            if sobrantes > 0:
+                # Con los accesos al día, para no desalojar algo que se acaba de leer
+                self._volcar_accesos()
+                cursor = self._conexion.execute(
+                    "DELETE FROM entradas WHERE clave IN "
+                    "(SELECT clave FROM entradas ORDER BY ultimo_acceso LIMIT ?)",
+                    (sobrantes,)
+                )
+                self._total -= cursor.rowcount
+                self.desalojos += cursor.rowcount
+            self._conexion.commit()
+    
+    def _volcar_accesos(self):
+        """Escribe los últimos accesos pendientes (con el lock tomado; sin commit)."""
+        if self._accesos:
+            self._conexion.executemany(
+                "UPDATE entradas SET ultimo_acceso = ? WHERE clave = ?",
+                [(ahora, clave) for clave, ahora in self._accesos.items()]
+            )
+            self._accesos.clear()
+        self._ultimo_volcado = time.monotonic()
+    
+    async def obtener_async(self, clave, incluir_expirados=False):
+        """`obtener` en un hilo, para no parar el bucle de eventos con el disco."""
+        return await asyncio.to_thread(self.obtener, clave, incluir_expirados)
+    
+    async def guardar_async(self, clave, valor):
+        """`guardar` en un hilo, para no parar el bucle de eventos con el disco."""
+        await asyncio.to_thread(self.guardar, clave, valor)
+    
+    def limpiar(self):
+        """Borra todas las entradas y reinicia los contadores."""
+        with self._lock:
+            self._conexion.execute("DELETE FROM entradas")
+            self._conexion.commit()
+            self._accesos.clear()
+            self._total = 0
+            self.aciertos = self.fallos = self.expirados = self.desalojos = 0
+    
+    def estadisticas(self):
+        """Contadores de uso de la caché."""
+        total = self._total
+        consultas = self.aciertos + self.fallos + self.expirados
+        return {
+            'entradas': total,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'expirados': self.expirados,
+            'desalojos': self.desalojos,
+            'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else 0.0
+        }
+
+
+class CacheMemoria:
+    """Caché LRU en memoria con expiración; misma interfaz que `CachePersistente`.
+
+    Si se le da un `nombre`, sus contadores aparecen en las métricas del proceso.
+    """
+    
+    def __init__(self, ttl=3600, max_entradas=256, nombre=None):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self.expirados = 0
+        self.desalojos = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        if nombre:
+            telemetria().registrar_cache(nombre, self)
+    
+    def obtener(self, clave, incluir_expirados=False):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            
+            valor, guardado = entrada
+            if time.time() - guardado > self.ttl and not incluir_expirados:
+                self.expirados += 1
+                return None
+            
+            self.aciertos += 1
+            self._entradas.move_to_end(clave)
+            return valor
+    
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = (valor, time.time())
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+    
+    def descartar(self, clave):
+        with self._lock:
+            self._entradas.pop(clave, None)
+    
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = self.fallos = self.expirados = self.desalojos = 0
+    
+    def estadisticas(self):
+        with self._lock:
+            total = len(self._entradas)
+        consultas = self.aciertos + self.fallos + self.expirados
+        return {
+            'entradas': total,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'expirados': self.expirados,
+            'desalojos': self.desalojos,
+            'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else 0.0
+        }
+
+
+class CacheEnNiveles:
+    """Combina una caché en memoria (rápida) con una en disco (persistente).
+
+    Lo que se encuentra en disco se sube a memoria para las siguientes consultas.
+    """
+    
+    def __init__(self, memoria, disco):
+        self.memoria = memoria
+        self.disco = disco
+    
+    def obtener(self, clave):
+        valor = self.memoria.obtener(clave)
+        if valor is None:
+            valor = self.disco.obtener(clave)
+            if valor is not None:
+                self.memoria.guardar(clave, valor)
+        return valor
+    
+    def guardar(self, clave, valor):
+        self.memoria.guardar(clave, valor)
+        self.disco.guardar(clave, valor)
+    
+    def limpiar(self):
+        self.memoria.limpiar()
+        self.disco.limpiar()
+    
+    def estadisticas(self):
+        return {'memoria': self.memoria.estadisticas(), 'disco': self.disco.estadisticas()}
+
+
+# ==================== CLIENTE HTTP COMPARTIDO ====================
+class RespuestaHTTP:
+    """Respuesta ya descargada, con la misma interfaz básica que `requests.Response`."""
+    
+    def __init__(self, status_code, contenido, url):
+        self.status_code = status_code
+        self.contenido = contenido
+        self.url = url
+    
+    def json(self):
+        return json.loads(self.contenido)
+
+
+class ClienteHTTP:
+    """Cliente HTTP asíncrono único para todos los proveedores.
+
+    Reutiliza conexiones (keep-alive) con un pool por host, limita cuántas peticiones
+    simultáneas van a cada host, reintenta con backoff ante 429/5xx y lleva métricas
+    de uso para saber cuántas conexiones se reutilizan. Cada bucle de eventos tiene su
+    propia sesión de aiohttp (no se pueden compartir entre bucles).
+    """
+    
+    # Peticiones simultáneas permitidas por host (el resto esperan su turno)
+    LIMITES_POR_HOST = {
+        'collectionapi.metmuseum.org': 8,
+        'www.rijksmuseum.nl': 4,
+        'api.harvardartmuseums.org': 4,
+        'api.themoviedb.org': 10,
+        'es.wikipedia.org': 4,
+    }
+    LIMITE_POR_DEFECTO = 6
+    # Peticiones por segundo permitidas por host (TMDb corta hacia ~50/s por IP)
+    TASAS_POR_HOST = {
+        'api.themoviedb.org': 40,
+    }
+    ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+    
+    def __init__(self, reintentos=3, backoff=0.3):
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._sesiones = weakref.WeakKeyDictionary()
+        self._limitadores = {
+            host: LimitadorTasa(tasa) for host, tasa in self.TASAS_POR_HOST.items()
+        }
+        self._metricas = defaultdict(lambda: {
+            'peticiones': 0, 'reintentos': 0, 'errores': 0, 'conexiones_nuevas': 0, 'reutilizadas': 0
+        })
+    
+    def _sumar(self, host, campo, cantidad=1):
+        with self._lock:
+            self._metricas[host][campo] += cantidad
+    
+    async def _al_crear_conexion(self, sesion, contexto, params):
+        self._sumar(contexto.trace_request_ctx['host'], 'conexiones_nuevas')
+    
+    async def _al_reutilizar_conexion(self, sesion, contexto, params):
+        self._sumar(contexto.trace_request_ctx['host'], 'reutilizadas')
+    
+    def _estado_del_bucle(self):
+        """Sesión de aiohttp y semáforos por host del bucle de eventos actual."""
+        bucle = asyncio.get_running_loop()
+        estado = self._sesiones.get(bucle)
+        if estado is None:
+            traza = aiohttp.TraceConfig()
+            traza.on_connection_create_end.append(self._al_crear_conexion)
+            traza.on_connection_reuseconn.append(self._al_reutilizar_conexion)
+            limite_host = max(max(self.LIMITES_POR_HOST.values()), self.LIMITE_POR_DEFECTO)
+            sesion = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=100, limit_per_host=limite_host),
+                headers={'User-Agent': 'Arty/1.0 (asistente de arte; streamlit)'},
+                trace_configs=[traza]
+            )
+            estado = (sesion, {})
+            self._sesiones[bucle] = estado
+        return estado
+    
+    def _semaforo(self, semaforos, host):
+        if host not in semaforos:
+            semaforos[host] = asyncio.Semaphore(self.LIMITES_POR_HOST.get(host, self.LIMITE_POR_DEFECTO))
+        return semaforos[host]
+    
+    async def get(self, url, params=None, timeout=10):
+        """GET con límite por host y reintentos; devuelve una `RespuestaHTTP`.
+        
+        Los GET idénticos (misma URL y parámetros) que coinciden en el tiempo, sean de
+        esta sesión o de otra, salen a la red una sola vez (ver `VueloUnico`).
+        """
+        if params:
+            # Igual que requests: se omiten los None y el resto se envía como texto
+            params = {clave: str(valor) for clave, valor in params.items() if valor is not None}
+        clave = json.dumps([url, params or {}], sort_keys=True)
+        return await vuelo_unico().ejecutar(
+            f"GET {urlsplit(url).netloc}", clave, lambda: self._get(url, params, timeout)
+        )
+    
+    async def _get(self, url, params, timeout):
+        sesion, semaforos = self._estado_del_bucle()
+        host = urlsplit(url).netloc
+        limitador = self._limitadores.get(host)
+        async with self._semaforo(semaforos, host):
+            for intento in range(self.reintentos + 1):
+                ultimo = intento == self.reintentos
+                if limitador:
+                    await limitador.adquirir()
+                inicio = time.perf_counter()
+                try:
+                    async with sesion.get(
+                        url, params=params,
+                        timeout=aiohttp.ClientTimeout(total=timeout),
+                        trace_request_ctx={'host': host}
+                    ) as respuesta:
+                        contenido = await respuesta.read()
+                        estado = respuesta.status
+                        espera_servidor = respuesta.headers.get('Retry-After')
+                except aiohttp.ClientConnectionError as error:
+                    telemetria().registrar_http(
+                        host, time.perf_counter() - inicio,
+                        'timeout' if isinstance(error, asyncio.TimeoutError) else 'error'
+                    )
+                    if ultimo:
+                        self._sumar(host, 'peticiones')
+                        self._sumar(host, 'errores')
+                        raise
+                    espera_servidor = None
+                except Exception as error:
+                    telemetria().registrar_http(
+                        host, time.perf_counter() - inicio,
+                        'timeout' if isinstance(error, asyncio.TimeoutError) else 'error'
+                    )
+                    self._sumar(host, 'peticiones')
+                    self._sumar(host, 'errores')
+                    raise
+                else:
+                    telemetria().registrar_http(host, time.perf_counter() - inicio, estado, len(contenido))
+                    if estado not in self.ESTADOS_REINTENTABLES or ultimo:
+                        self._sumar(host, 'peticiones')
+                        return RespuestaHTTP(estado, contenido, url)
+                
+                self._sumar(host, 'reintentos')
+                espera = self.backoff * (2 ** intento)
+                if espera_servidor and espera_servidor.isdigit():
+                    espera = max(espera, int(espera_servidor))
+                    if limitador:
+                        # El servidor pide calma: frenar también al resto de peticiones a este host
+                        limitador.pausar(espera)
+                await asyncio.sleep(espera)
+    
+    async def cerrar(self):
+        """Cierra la sesión del bucle actual (útil en scripts que crean su propio bucle)."""
+        estado = self._sesiones.pop(asyncio.get_running_loop(), None)
+        if estado:
+            await estado[0].close()
+    
+    def metricas(self):
+        """Peticiones, reintentos, errores y conexiones nuevas vs. reutilizadas, por host."""
+        with self._lock:
+            return {host: dict(datos) for host, datos in self._metricas.items()}
+
+
+@st.cache_resource(show_spinner=False)
+def cliente_http():
+    """Cliente HTTP compartido por todas las sesiones de Streamlit."""
+    return ClienteHTTP()
+
+
+# ==================== PROXY DE IMÁGENES ====================
+class ProxyImagenes:
+    """Proxy local de imágenes: descarga cada original una vez y sirve miniaturas desde disco.
+
+    Los museos y TMDb entregan originales de varios MB que la página muestra a 300px.
+    Aquí se reducen a JPEG del ancho pedido, se guardan en `directorio` (desalojando
+    las menos usadas al pasar de `max_bytes`) y se sirven con ETag y
+    `Cache-Control: immutable`, así que cada navegador las pide una sola vez.
+
+    El servidor HTTP solo sirve si el navegador lo alcanza en `url_publica`; si no,
+    `imagen` entrega los bytes de la miniatura para `st.image` (Streamlit los sirve
+    por su propio puerto) y, mientras se generan, la URL original.
+    """
+
+    # Solo se hace de proxy para estos dominios (y sus subdominios)
+    HOSTS_PERMITIDOS = ('metmuseum.org', 'googleusercontent.com', 'harvard.edu', 'tmdb.org', 'wikimedia.org')
+    ANCHOS = (160, 300, 500, 800)
+    CALIDAD_JPEG = 82
+    CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+    def __init__(self, directorio=None, max_bytes=200 * 1024 * 1024, url_publica=None):
+        self.directorio = os.path.join(directorio or CACHE_DIR, 'miniaturas')
+        self.max_bytes = max_bytes
+        self.url_publica = url_publica
+        self.aciertos = 0
+        self.descargas = 0
+        self.errores = 0
+        self.desalojos = 0
+        self.bytes_originales = 0
+        self.bytes_miniaturas = 0
+        self._lock = threading.Lock()
+        # etag -> [candado, hilos que lo usan]; la entrada se borra al terminar la descarga
+        self._descargando = {}
+        self._pendientes = set()
+        self._generador = None
+        self._servidor = None
+
+        os.makedirs(self.directorio, exist_ok=True)
+        self._ocupado = sum(entrada.stat().st_size for entrada in os.scandir(self.directorio) if entrada.is_file())
+        self._desalojar()
+
+    @staticmethod
+    def permitido(url):
+        partes = urlsplit(url or '')
+        host = (partes.hostname or '').lower()
+        return partes.scheme in ('http', 'https') and any(
+            host == dominio or host.endswith('.' + dominio) for dominio in ProxyImagenes.HOSTS_PERMITIDOS
+        )
+
+    @staticmethod
+    def ancho_valido(ancho):
+        """El menor ancho estándar que cubre `ancho` (limita cuántas variantes se guardan)."""
+        return next((estandar for estandar in ProxyImagenes.ANCHOS if estandar >= ancho), ProxyImagenes.ANCHOS[-1])
+
+    @staticmethod
+    def etag(original, ancho):
+        return hashlib.sha256(f"{ancho}|{original}".encode('utf-8')).hexdigest()[:32]
+
+    def url(self, original, ancho=300):
+        """URL de la miniatura en el proxy; la original si el proxy no está activo o no la cubre."""
+        if not original or not self.url_publica or not self.permitido(original):
+            return original
+        consulta = urlencode({'url': original, 'ancho': self.ancho_valido(ancho)})
+        return f"{self.url_publica}/miniatura?{consulta}"
+
+    def imagen(self, original, ancho=300):
+        """Lo que se le pasa a `st.image`: URL del proxy, bytes de la miniatura o la URL original."""
+        if not original or not self.permitido(original):
+            return original
+        ancho = self.ancho_valido(ancho)
+        if self.url_publica:
+            return self.url(original, ancho)
+        contenido = self._leer(os.path.join(self.directorio, f"{self.etag(original, ancho)}.jpg"))
+        if contenido is not None:
+            return contenido
+        # La miniatura se genera fuera del script; hasta el próximo rerun se ve la original
+        with self._lock:
+            if (original, ancho) in self._pendientes:
+                return original
+            self._pendientes.add((original, ancho))
+            if self._generador is None:
+                self._generador = ThreadPoolExecutor(max_workers=4, thread_name_prefix="arty-miniaturas")
+        self._generador.submit(self._generar, original, ancho)
+        return original
+
+    def _generar(self, original, ancho):
+        try:
+            self.miniatura(original, ancho)
+        finally:
+            with self._lock:
+                self._pendientes.discard((original, ancho))
+
+    def _reducir(self, contenido, ancho):
+        imagen = Image.open(io.BytesIO(contenido))
+        # En JPEG, `draft` decodifica ya a escala reducida (mucho más rápido con originales enormes)
+        imagen.draft('RGB', (ancho, ancho * 4))
+        imagen = imagen.convert('RGB')
+        imagen.thumbnail((ancho, ancho * 4))
+        salida = io.BytesIO()
+        imagen.save(salida, 'JPEG', quality=self.CALIDAD_JPEG, optimize=True, progressive=True)
+        return salida.getvalue()
+
+    def _desalojar(self):
+        """Borra las miniaturas menos usadas hasta quedar por debajo del 90% del tope."""
+        if self._ocupado <= self.max_bytes:
+            return
+        entradas = sorted(
+            (entrada for entrada in os.scandir(self.directorio) if entrada.is_file()),
+            key=lambda entrada: entrada.stat().st_mtime
+        )
+        for entrada in entradas:
+            if self._ocupado <= self.max_bytes * 0.9:
+                break
+            tamaño = entrada.stat().st_size
+            try:
+                os.remove(entrada.path)
+            except OSError:
+                continue
+            self._ocupado -= tamaño
+            self.desalojos += 1
+
+    def _leer(self, ruta):
+        """La miniatura guardada en `ruta` (marcándola como usada), o None si no está."""
+        try:
+            with open(ruta, 'rb') as archivo:
+                contenido = archivo.read()
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.aciertos += 1
+        return contenido
+
+    @contextlib.contextmanager
+    def _turno_descarga(self, etag):
+        """Un solo hilo descarga cada imagen; los demás esperan y la leen de disco."""
+        with self._lock:
+            entrada = self._descargando.setdefault(etag, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if not entrada[1]:
+                    del self._descargando[etag]
+
+    def miniatura(self, original, ancho=300):
+        """Bytes JPEG de la miniatura (de disco o recién generada), o None si no se pudo obtener."""
+        ancho = self.ancho_valido(ancho)
+        etag = self.etag(original, ancho)
+        ruta = os.path.join(self.directorio, f"{etag}.jpg")
+
+        with self._turno_descarga(etag):
+            contenido = self._leer(ruta)
+            if contenido is not None:
+                return contenido
+
+            try:
+                respuesta = ejecutar_sync(cliente_http().get(original, timeout=15))
+                if respuesta.status_code != 200:
+                    raise ValueError(f"HTTP {respuesta.status_code}")
+                contenido = self._reducir(respuesta.contenido, ancho)
+            except Exception:
+                with self._lock:
+                    self.errores += 1
+                return None
+
+            temporal = f"{ruta}.{threading.get_ident()}.tmp"
+            with open(temporal, 'wb') as archivo:
+                archivo.write(contenido)
+            os.replace(temporal, ruta)
+
+        with self._lock:
+            self.descargas += 1
+            self.bytes_originales += len(respuesta.contenido)
+            self.bytes_miniaturas += len(contenido)
+            self._ocupado += len(contenido)
+            self._desalojar()
+        return contenido
+
+    def iniciar(self, host='127.0.0.1', puerto=0):
+        """Arranca el servidor HTTP en un hilo; devuelve el puerto en el que escucha."""
+        proxy = self
+
+        class _Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                partes = urlsplit(self.path)
+                parametros = parse_qs(partes.query)
+                original = parametros.get('url', [''])[0]
+                if partes.path != '/miniatura' or not proxy.permitido(original):
+                    self.send_error(404)
+                    return
+                try:
+                    ancho = proxy.ancho_valido(int(parametros.get('ancho', ['300'])[0]))
+                except ValueError:
+                    self.send_error(400)
+                    return
+
+                etag = f'"{proxy.etag(original, ancho)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', proxy.CACHE_CONTROL)
+                    self.end_headers()
+                    return
+
+                contenido = proxy.miniatura(original, ancho)
+                if contenido is None:
+                    # Sin miniatura: que el navegador vaya a por la original
+                    self.send_response(302)
+                    self.send_header('Location', original)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(contenido)))
+                self.send_header('Cache-Control', proxy.CACHE_CONTROL)
+                self.send_header('ETag', etag)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(contenido)
+
+            def log_message(self, formato, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name="arty-imagenes", daemon=True).start()
+        return self._servidor.server_address[1]
+
+    def detener(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def estadisticas(self):
+        """Aciertos de disco, descargas, errores, desalojos y bytes ahorrados."""
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'descargas': self.descargas,
+                'errores': self.errores,
+                'desalojos': self.desalojos,
+                'bytes_en_disco': self._ocupado,
+                'bytes_originales': self.bytes_originales,
+                'bytes_miniaturas': self.bytes_miniaturas,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def proxy_imagenes():
+    """Miniaturas del proceso; el servidor HTTP propio es opcional.
+
+    Solo arranca (en ARTY_IMAGENES_PUERTO) si ARTY_IMAGENES_URL dice en qué dirección
+    pública lo alcanza el navegador: en Streamlit Cloud o Codespaces solo se publica
+    el puerto de Streamlit, así que por defecto las miniaturas van por `st.image`.
+    ARTY_IMAGENES_PROXY=0 lo desactiva aunque haya URL.
+    """
+    proxy = ProxyImagenes(max_bytes=int(os.getenv('ARTY_IMAGENES_MB', '200')) * 1024 * 1024)
+    url_publica = os.getenv('ARTY_IMAGENES_URL')
+    if not url_publica or os.getenv('ARTY_IMAGENES_PROXY', '1') == '0':
+        return proxy
+    try:
+        proxy.iniciar(
+            host=os.getenv('ARTY_IMAGENES_HOST', '127.0.0.1'),
+            puerto=int(os.getenv('ARTY_IMAGENES_PUERTO', '8599'))
+        )
+    except OSError:
+        return proxy
+    proxy.url_publica = url_publica.rstrip('/')
+    return proxy
+
+
+# ==================== PLANIFICADOR DE GEMINI ====================
+# Cuota de cada modelo en peticiones por minuto (la gratuita de los flash es de 15)
+GEMINI_RPM = float(os.getenv('ARTY_GEMINI_RPM', '15'))
+# Modelos de la lista descubierta, además del preferido, a los que se puede pasar
+GEMINI_ALTERNATIVAS = int(os.getenv('ARTY_GEMINI_ALTERNATIVAS', '3'))
+# Tope de peticiones esperando turno y espera máxima que se acepta antes de rechazar
+GEMINI_COLA_MAX = int(os.getenv('ARTY_GEMINI_COLA', '64'))
+GEMINI_ESPERA_MAX = float(os.getenv('ARTY_GEMINI_ESPERA_MAX', '90'))
+
+
+class GeminiOcupado(RuntimeError):
+    """La petición no cabe en la cola de Gemini (o tendría que esperar demasiado)."""
+
+    def __init__(self, mensaje, espera=None):
+        super().__init__(mensaje)
+        self.espera = espera
+
+
+def _es_sobrecarga(error):
+    codigo = getattr(error, 'code', None)
+    texto = str(error)
+    return codigo == 503 or texto.startswith('503') or 'overloaded' in texto.lower()
+
+
+def _pausa_por_cuota(error):
+    """Segundos que hay que apartar un modelo tras `error`; None si el error no es de cuota ni de sobrecarga."""
+    codigo = getattr(error, 'code', None)
+    texto = str(error)
+    if codigo == 429 or texto.startswith('429') or 'quota' in texto.lower():
+        reintento = re.search(r'retry(?:_delay| in)\D*(\d+(?:\.\d+)?)', texto, re.IGNORECASE)
+        return float(reintento.group(1)) if reintento else 60.0
+    if _es_sobrecarga(error):
+        return 2.0
+    return None
+
+
+class PlanificadorGemini:
+    """Turnos para todas las llamadas a Gemini del proceso.
+
+    Cada modelo tiene su cubeta de fichas (`LimitadorTasa`) con la cuota por minuto.
+    Las peticiones esperan en una cola con prioridad y con tope; solo la primera toma
+    ficha, del primer modelo de la lista que la tenga libre, así que se gasta la cuota
+    del preferido antes de pasar a los demás. Si un modelo responde 429 (o está
+    sobrecargado) se aparta el tiempo que pida y la petición se repite con otro; un
+    503 suelto no lo aparta: antes se repite una vez con el mismo modelo.
+    """
+
+    INTERACTIVA = 0
+    NUEVA = 1  # otra respuesta para algo que ya estaba contestado
+    FONDO = 2
+
+    def __init__(self, modelos, rpm=GEMINI_RPM, rafaga=None, max_cola=GEMINI_COLA_MAX, espera_max=GEMINI_ESPERA_MAX):
+        self.modelos = list(modelos)
+        # Ráfaga corta: la cuota de Gemini es por minuto y una cubeta llena de golpe la pasaría
+        self.limitadores = {
+            self.nombre(modelo): LimitadorTasa(rpm / 60, rafaga or max(1, int(rpm // 4)))
+            for modelo in self.modelos
+        }
+        self.max_cola = max_cola
+        self.espera_max = espera_max
+        self.cola_maxima = 0
+        self.contadores = defaultdict(int)
+        self._cola = []
+        self._turnos = 0
+        self._condicion = threading.Condition()
+    
+    @staticmethod
+    def nombre(modelo):
+        return getattr(modelo, 'model_name', type(modelo).__name__)
+    
+    @property
+    def preferido(self):
+        return self.nombre(self.modelos[0])
+    
+    def en_cola(self, prioridad=INTERACTIVA):
+        """Peticiones esperando que pasarían antes que una nueva con `prioridad`."""
+        with self._condicion:
+            return sum(1 for entrada in self._cola if entrada[0] <= prioridad)
+    
+    def estimar_espera(self, prioridad=INTERACTIVA):
+        """Segundos aproximados hasta que una petición nueva con `prioridad` tenga turno.
+
+        Busca cuándo habrá, entre todos los modelos, fichas para ella y para las que
+        tiene delante; no cuenta lo que tarde luego Gemini en responder.
+        """
+        necesarias = self.en_cola(prioridad) + 1
+        fichas = lambda segundos: sum(limitador.fichas_en(segundos) for limitador in self.limitadores.values())
+        if fichas(0) >= necesarias:
+            return 0.0
+        minimo, maximo = 0.0, self.espera_max * 2
+        if fichas(maximo) < necesarias:
+            return maximo
+        while maximo - minimo > 0.1:
+            medio = (minimo + maximo) / 2
+            minimo, maximo = (minimo, medio) if fichas(medio) >= necesarias else (medio, maximo)
+        return maximo
+    
+    def _turno(self, entrada, descartados, reintento=False):
+        """Espera a ser la primera de la cola y a que haya ficha libre; devuelve el modelo.
+
+        `entrada` es (prioridad, orden de llegada): un reintento vuelve con la suya, así
+        que no pasa detrás de las que llegaron después ni choca con el tope de la cola.
+        """
+        with self._condicion:
+            if not reintento and len(self._cola) >= self.max_cola:
+                raise GeminiOcupado(f"Hay {len(self._cola)} peticiones esperando a Gemini")
+            heapq.heappush(self._cola, entrada)
+            self.cola_maxima = max(self.cola_maxima, len(self._cola))
+            # Una petición más prioritaria puede pasar a ser la primera
+            self._condicion.notify_all()
+            limite = time.monotonic() + self.espera_max
+            try:
+                while True:
+                    espera = None
+                    if self._cola[0] == entrada:
+                        candidatos = [
+                            (self.limitadores[self.nombre(modelo)].espera(), orden, modelo)
+                            for orden, modelo in enumerate(self.modelos)
+                            if self.nombre(modelo) not in descartados
+                        ]
+                        espera, _, modelo = min(candidatos, key=lambda candidato: candidato[:2])
+                        if espera <= 0:
+                            self.limitadores[self.nombre(modelo)].reservar()
+                            return modelo
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise GeminiOcupado("Gemini no ha tenido turno libre a tiempo", espera)
+                    self._condicion.wait(restante if espera is None else min(espera, restante))
+            finally:
+                self._cola.remove(entrada)
+                heapq.heapify(self._cola)
+                self._condicion.notify_all()
+    
+    def _contar(self, clave):
+        with self._condicion:
+            self.contadores[clave] += 1
+    
+    def ejecutar(self, llamada, prioridad=INTERACTIVA):
+        """Ejecuta `llamada(modelo)` con el modelo al que le toque y devuelve (nombre del modelo, resultado).
+
+        Si un modelo se queda sin cuota se repite con otro, conservando el puesto en la cola.
+        """
+        espera = self.estimar_espera(prioridad)
+        if espera > self.espera_max:
+            self._contar('rechazadas')
+            raise GeminiOcupado(f"Gemini está saturado: la espera sería de unos {espera:.0f} s", espera)
+        
+        with self._condicion:
+            self._turnos += 1
+            entrada = (prioridad, self._turnos)
+        descartados = set()
+        sobrecargados = set()
+        limite = time.monotonic() + self.espera_max
+        reintento = False
+        while True:
+            inicio = time.perf_counter()
+            try:
+                modelo = self._turno(entrada, descartados, reintento)
+            except GeminiOcupado:
+                self._contar('rechazadas')
+                telemetria().registrar_operacion('gemini', 'turno', time.perf_counter() - inicio, 'rechazada')
+                raise
+            telemetria().registrar_operacion('gemini', 'turno', time.perf_counter() - inicio, 'ok')
+            nombre = self.nombre(modelo)
+            try:
+                resultado = llamada(modelo)
+            except Exception as error:
+                pausa = _pausa_por_cuota(error)
+                if pausa is None:
+                    raise
+                if _es_sobrecarga(error) and nombre not in sobrecargados:
+                    # Un 503 suele ser pasajero: apartar al único modelo pararía toda la cola
+                    sobrecargados.add(nombre)
+                    self._contar(f"reintentos: {nombre}")
+                    reintento = True
+                    continue
+                self.limitadores[nombre].pausar(pausa)
+                self._contar(f"sin cuota: {nombre}")
+                descartados.add(nombre)
+                if len(descartados) == len(self.modelos):
+                    # Todos pausados: otra vuelta si alguno recupera la cuota a tiempo
+                    if time.monotonic() + min(limitador.espera() for limitador in self.limitadores.values()) > limite:
+                        raise GeminiOcupado(
+                            f"Todos los modelos de Gemini están sin cuota; prueba en unos {pausa:.0f} s", pausa
+                        ) from error
+                    descartados.clear()
+                else:
+                    self._contar('cambios de modelo')
+                reintento = True
+                continue
+            self._contar(nombre)
+            return nombre, resultado
+    
+    def estado(self):
+        """Cola, cuota libre de cada modelo y contadores, para el panel de depuración."""
+        return {
+            'en_cola': self.en_cola(self.FONDO),
+            'cola_maxima': self.cola_maxima,
+            'modelos': {nombre: round(limitador.espera(), 1) for nombre, limitador in self.limitadores.items()},
+            'contadores': dict(self.contadores),
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def planificador_gemini():
+    """Planificador del proceso con el modelo preferido y sus alternativas; None sin Gemini."""
+    preferido = _init_gemini_model()
+    if preferido is None:
+        return None
+    try:
+        alternativas = [nombre for nombre in _modelos_gemini() if nombre != preferido.model_name]
+    except Exception:
+        alternativas = []
+    return PlanificadorGemini(
+        [preferido] + [genai.GenerativeModel(nombre) for nombre in alternativas[:GEMINI_ALTERNATIVAS]]
+    )
+
+
+# ==================== MÓDULO 1: POESÍA ====================
+class MetricaEspanola:
+    """Escansión métrica de versos en español.
+
+    Cuenta sílabas métricas teniendo en cuenta diptongos, hiatos, sinalefas entre
+    palabras (también la triple a través de una vocal suelta) y el acento de la
+    última palabra (aguda +1, esdrújula -1). Cada palabra y cada verso se analizan
+    una sola vez y el resultado queda en caché, así que volver a validar un poema
+    en cada rerun o escandir miles de versos es barato.
+    """
+    
+    # Clase de cada letra: F = vocal fuerte (o débil con tilde), D = vocal débil, C = consonante
+    _CLASES = str.maketrans(
+        'aeoáéóàèòíúiuüyñbcdfghjklmnpqrstvwxz',
+        'FFFFFFFFFFFDDDCCCCCCCCCCCCCCCCCCCCCC'
+    )
+    _TILDES = set('áéíóú')
+    _SIN_TILDES = str.maketrans('áéíóúüàèòv', 'aeiouuaeob')
+    _PALABRAS = re.compile(r"[a-záéíóúüñàèò]+")
+    _U_MUDA = re.compile(r"(?<=[qg])u(?=[eiéí])")
+    _Y_VOCAL = re.compile(r"(?<=[aeiouáéíóú])y$|^y$")
+    _NUCLEOS = re.compile(r"[FD]+")
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=50000)
+    def _silabear(palabra):
+        """Núcleos vocálicos de una palabra: (palabra normalizada, clases, sílabas, tónica desde el final).
+        
+        Cada sílaba es una tupla con las posiciones de sus vocales en la palabra normalizada.
+        """
+        # 'u' muda en que/qui/gue/gui y 'y' final tras vocal ("rey", "muy") o sola ("y")
+        palabra = MetricaEspanola._U_MUDA.sub('q', palabra)
+        palabra = MetricaEspanola._Y_VOCAL.sub('i', palabra)
+        clases = palabra.translate(MetricaEspanola._CLASES)
+        
+        silabas = []
+        for nucleo in MetricaEspanola._NUCLEOS.finditer(clases):
+            inicio, fin = nucleo.span()
+            silabas.append([inicio])
+            for posicion in range(inicio + 1, fin):
+                # Hiato: dos vocales fuertes seguidas, o una débil con tilde junto a otra vocal
+                if (clases[posicion - 1] == 'F' and clases[posicion] == 'F') or \
+                        palabra[posicion] in 'íú' or palabra[posicion - 1] in 'íú':
+                    silabas.append([posicion])
+                else:
+                    silabas[-1].append(posicion)
+        
+        tonica = None
+        for indice, posiciones in enumerate(silabas):
+            if any(palabra[posicion] in MetricaEspanola._TILDES for posicion in posiciones):
+                tonica = len(silabas) - 1 - indice
+        if tonica is None:
+            # Sin tilde: llana si termina en vocal, n o s; aguda en otro caso
+            tonica = 1 if silabas and palabra[-1] in 'aeiouns' and len(silabas) > 1 else 0
+        
+        return palabra, clases, tuple(tuple(posiciones) for posiciones in silabas), tonica
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=50000)
+    def analizar_palabra(palabra):
+        """Devuelve (sílabas, sílaba tónica contada desde el final, empieza en vocal, termina en vocal).
+        
+        La sílaba tónica desde el final vale 0 en agudas, 1 en llanas y 2 o más en esdrújulas.
+        """
+        normalizada, clases, silabas, tonica = MetricaEspanola._silabear(palabra)
+        if not silabas:
+            return 0, 0, False, False
+        
+        empieza_vocal = clases[0] in 'FD' or (normalizada[0] == 'h' and len(clases) > 1 and clases[1] in 'FD')
+        # "hie-", "hue-" suenan consonánticas y no hacen sinalefa
+        if normalizada[:3] in ('hie', 'hue'):
+            empieza_vocal = False
+        # Una 'y' final ante vocal suena consonántica ("soy un" = so-yun): no hace sinalefa
+        y_final = len(palabra) > 1 and palabra.endswith('y')
+        return len(silabas), tonica, empieza_vocal, clases[-1] in 'FD' and not y_final
+    
+    @staticmethod
+    def _vocal_principal(palabra, posiciones):
+        """Vocal que suena en un núcleo: la tildada, la fuerte del diptongo o la última débil."""
+        for posicion in posiciones:
+            if palabra[posicion] in MetricaEspanola._TILDES:
+                return posicion
+        for posicion in posiciones:
+            if palabra[posicion] in 'aeoàèò':
+                return posicion
+        return posiciones[-1]
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=50000)
+    def claves_rima(palabra):
+        """(clave consonante, clave asonante) de una palabra, desde su vocal tónica.
+        
+        Consonante: todos los sonidos desde la vocal tónica ("canción" -> "on").
+        Asonante: solo las vocales que suenan; en esdrújulas se salta la vocal de en medio
+        ("pálido" -> "ao").
+        """
+        palabra = palabra.lower()
+        normalizada, _, silabas, tonica = MetricaEspanola._silabear(palabra)
+        if not silabas:
+            return '', ''
+        
+        indice_tonica = len(silabas) - 1 - tonica
+        inicio = MetricaEspanola._vocal_principal(normalizada, silabas[indice_tonica])
+        consonante = normalizada[inicio:].translate(MetricaEspanola._SIN_TILDES)
+        
+        vocales = [normalizada[inicio]]
+        if indice_tonica < len(silabas) - 1:
+            vocales.append(normalizada[MetricaEspanola._vocal_principal(normalizada, silabas[-1])])
+        asonante = ''.join(vocales).translate(MetricaEspanola._SIN_TILDES)
+        return consonante, asonante
+    
+    @staticmethod
+    def tipo_rima(palabra1, palabra2):
+        """'consonante', 'asonante' o None según cómo riman dos palabras."""
+        consonante1, asonante1 = MetricaEspanola.claves_rima(palabra1)
+        consonante2, asonante2 = MetricaEspanola.claves_rima(palabra2)
+        if consonante1 and consonante1 == consonante2:
+            return 'consonante'
+        if asonante1 and asonante1 == asonante2:
+            return 'asonante'
+        return None
+    
+    @staticmethod
+    def analizar_rima(versos, esquema, tipo_requerido='consonante'):
+        """Compara la rima de cada verso con la que pide el esquema (p.ej. "ABBA ABBA CDC DCD").
+        
+        Las letras se comparan sin distinguir mayúsculas (en la Lira la minúscula solo
+        indica verso corto). Devuelve, por verso, la letra esperada, el tipo de rima con el
+        primer verso de su grupo y si cumple; además del esquema que realmente tiene el poema.
+        """
+        letras = [letra.upper() for letra in esquema if letra.isalpha()]
+        finales = [(MetricaEspanola.palabras(verso) or [''])[-1] for verso in versos]
+        
+        primeros = {}
+        detalle = []
+        for indice, final in enumerate(finales):
+            letra = letras[indice] if indice < len(letras) else None
+            if letra is None:
+                detalle.append({'letra': None, 'rima': None, 'ok': False})
+                continue
+            if letra not in primeros:
+                primeros[letra] = final
+                detalle.append({'letra': letra, 'rima': None, 'ok': True})
+                continue
+            tipo = MetricaEspanola.tipo_rima(primeros[letra], final)
+            ok = tipo == 'consonante' or (tipo_requerido == 'asonante' and tipo is not None)
+            detalle.append({'letra': letra, 'rima': tipo, 'ok': ok})
+        
+        # Esquema real: misma letra para versos con la misma rima consonante
+        claves = {}
+        detectado = []
+        for final in finales:
+            clave = MetricaEspanola.claves_rima(final)[0]
+            if clave not in claves:
+                claves[clave] = chr(ord('A') + len(claves) % 26)
+            detectado.append(claves[clave])
+        
+        return {'detalle': detalle, 'esquema_detectado': ''.join(detectado)}
+    
+    @staticmethod
+    def palabras(verso):
+        return MetricaEspanola._PALABRAS.findall(verso.lower())
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=50000)
+    def _escandir(fragmento):
+        """Palabras de un fragmento del verso (sin espacios, quizá con puntuación) listas para escandir.
+        
+        Cada una es (sílabas, ajuste si cierra el verso, empieza en vocal, termina en vocal,
+        es una letra suelta, es una vocal suelta que admite sinalefa triple, es aguda,
+        lleva el acento en la primera sílaba). Trocear con `split` y cachear por fragmento
+        evita pasar la expresión regular por cada verso entero.
+        """
+        escandidas = []
+        for palabra in MetricaEspanola._PALABRAS.findall(fragmento):
+            silabas, tonica, empieza_vocal, termina_vocal = MetricaEspanola.analizar_palabra(palabra)
+            # Acento final: aguda +1, esdrújula (o sobresdrújula) -1
+            ajuste = 1 if tonica == 0 else -1 if tonica >= 2 else 0
+            escandidas.append((
+                silabas, ajuste, empieza_vocal, termina_vocal, len(palabra) == 1,
+                palabra in ('a', 'e', 'o', 'u'), tonica == 0 and silabas > 1, tonica == silabas - 1
+            ))
+        return tuple(escandidas)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=20000)
+    def silabas_verso(verso):
+        """Número de sílabas métricas de un verso (los versos repetidos salen de la caché)."""
+        escandir = MetricaEspanola._escandir
+        analizadas = [analizada for fragmento in verso.lower().split() for analizada in escandir(fragmento)]
+        if not analizadas:
+            return 0
+        
+        total = 0
+        anterior_termina_vocal = False
+        anterior_aguda = False
+        siguientes_empiezan_vocal = [analizada[2] for analizada in analizadas[1:]] + [False]
+        for (silabas, ajuste, empieza_vocal, termina_vocal, suelta, puente, aguda, tonica_inicial), siguiente_vocal in zip(
+                analizadas, siguientes_empiezan_vocal):
+            total += silabas
+            # Sinalefa: final vocálico + inicio vocálico se cuentan como una sílaba, salvo
+            # dos vocales tónicas seguidas ("está hecho")
+            if anterior_termina_vocal and empieza_vocal and not (anterior_aguda and tonica_inicial):
+                if not (suelta and siguiente_vocal):
+                    total -= 1
+                    anterior_termina_vocal = termina_vocal and not suelta
+                elif puente:
+                    # Vocal suelta entre vocales: sinalefa triple ("hombre a una" = brea-u)
+                    total -= 1
+                    anterior_termina_vocal = termina_vocal
+                else:
+                    # La "y" entre vocales suena consonántica y se une solo a la siguiente
+                    # ("rosa y azucena" = sa-ya)
+                    anterior_termina_vocal = termina_vocal
+            else:
+                anterior_termina_vocal = termina_vocal
+            anterior_aguda = aguda
+        
+        # El acento de la última palabra decide el ajuste final
+        return total + ajuste
+    
+    @staticmethod
+    def silabas_versos(versos):
+        """Escande muchos versos de una vez (palabras y versos repetidos salen de la caché)."""
+        return [MetricaEspanola.silabas_verso(verso) for verso in versos]
+    
+    @staticmethod
+    def silabas_esperadas(estructura, numero_versos):
+        """Sílabas admitidas por verso según `PoetryAssistant.ESTRUCTURAS`, o None si es libre."""
+        silabas = PoetryAssistant.ESTRUCTURAS[estructura]['silabas']
+        if isinstance(silabas, int):
+            return [{silabas}] * numero_versos
+        if isinstance(silabas, list):
+            versos = PoetryAssistant.ESTRUCTURAS[estructura]['versos']
+            if isinstance(versos, int) and len(silabas) == versos:
+                # Un valor por verso (Haiku, Lira)
+                return [{s} for s in silabas] + [set()] * max(numero_versos - versos, 0)
+            # Cualquiera de los valores en cada verso (Silva)
+            return [set(silabas)] * numero_versos
+        return None
+    
+    @staticmethod
+    def validar_poema(poema, estructura):
+        """Comprueba un poema entero contra los versos y sílabas de la estructura elegida."""
+        versos = [verso.strip() for verso in poema.splitlines() if verso.strip()]
+        esperados = PoetryAssistant.ESTRUCTURAS[estructura]['versos']
+        conteos = MetricaEspanola.silabas_versos(versos)
+        objetivos = MetricaEspanola.silabas_esperadas(estructura, len(versos))
+        
+        detalle = []
+        for indice, (verso, silabas) in enumerate(zip(versos, conteos)):
+            admitidas = objetivos[indice] if objetivos is not None else None
+            detalle.append({
+                'verso': verso,
+                'silabas': silabas,
+                'esperadas': sorted(admitidas) if admitidas else None,
+                'ok': admitidas is None or silabas in admitidas
+            })
+        
+        # Rima, si la estructura tiene esquema
+        esquema = PoetryAssistant.ESTRUCTURAS[estructura]['esquema']
+        esquema_detectado = None
+        if esquema != 'Libre':
+            rima = MetricaEspanola.analizar_rima(versos, esquema)
+            esquema_detectado = rima['esquema_detectado']
+            for linea, rima_verso in zip(detalle, rima['detalle']):
+                linea.update({'letra': rima_verso['letra'], 'rima': rima_verso['rima'], 'rima_ok': rima_verso['ok']})
+        
+        numero_ok = not isinstance(esperados, int) or len(versos) == esperados
+        return {
+            'estructura': estructura,
+            'versos_esperados': esperados,
+            'versos_encontrados': len(versos),
+            'numero_versos_ok': numero_ok,
+            'esquema': esquema,
+            'esquema_detectado': esquema_detectado,
+            'ok': numero_ok and all(linea['ok'] and linea.get('rima_ok', True) for linea in detalle),
+            'detalle': detalle
+        }
+
+
+class IndiceRimas:
+    """Índice precalculado clave de rima -> palabras, para sugerir rimas sin red."""
+    
+    def __init__(self, palabras=()):
+        self.consonantes = defaultdict(set)
+        self.asonantes = defaultdict(set)
+        for palabra in palabras:
+            self.agregar(palabra)
+    
+    def agregar(self, palabra):
+        palabra = palabra.strip().lower()
+        if not palabra or palabra.startswith('#'):
+            return
+        consonante, asonante = MetricaEspanola.claves_rima(palabra)
+        if consonante:
+            self.consonantes[consonante].add(palabra)
+            self.asonantes[asonante].add(palabra)
+    
+    def sugerir(self, palabra, tipo='consonante', limite=12):
+        """Palabras del índice que riman con `palabra` (consonante o asonante)."""
+        palabra = palabra.strip().lower()
+        consonante, asonante = MetricaEspanola.claves_rima(palabra)
+        if tipo == 'consonante':
+            candidatas = self.consonantes.get(consonante, set())
         else:
-            st.warning("No hay modelos Gemini disponibles para generateContent en tu cuenta/API key.")
-    except Exception as e:
-        st.warning(f"Error configurando Gemini: {e}")
-    return None
+            # Asonantes "puras": misma vocal pero distinta rima consonante
+            candidatas = self.asonantes.get(asonante, set()) - self.consonantes.get(consonante, set())
+        return sorted(candidatas - {palabra})[:limite]
 
-model = _init_gemini_model()
 
-# Configuración de la página
-st.set_page_config(
-    page_title="Arty - Tu Asistente de Arte IA",
-    page_icon="🎨",
-    layout="wide"
-)
+@st.cache_resource(show_spinner=False)
+def indice_rimas():
+    """Índice de rimas construido una vez por proceso desde data/vocabulario_rimas.txt."""
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'vocabulario_rimas.txt')
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return IndiceRimas(archivo)
+    except OSError:
+        return IndiceRimas()
+
 
-# ==================== MÓDULO 1: POESÍA ====================
 class PoetryAssistant:
     """Asistente para redacción de poesía con diferentes estructuras."""
     
@@ -117,14 +2226,28 @@ class PoetryAssistant:
     }
     
     @staticmethod
-    def ayudar_con_poesia(idea_usuario, estructura_elegida):
-        """Ayuda al usuario a redactar su idea en la estructura poética elegida."""
-        if not model:
-            return "⚠️ Por favor configura la API key de Gemini para usar esta función."
-        
+    @st.cache_resource(show_spinner=False)
+    def _cache_respuestas():
+        """Caché de respuestas de Gemini: memoria (por proceso) + disco (entre reinicios)."""
+        return CacheEnNiveles(
+            CacheMemoria(ttl=24 * 3600, max_entradas=256, nombre='gemini_poesia_memoria'),
+            CachePersistente('gemini_poesia', ttl=30 * 24 * 3600, max_entradas=2000)
+        )
+    
+    @staticmethod
+    def _clave_cache(idea_usuario, estructura_elegida, nombre_modelo):
+        """Clave estable para la caché: la idea normalizada, la estructura y el modelo."""
+        idea = unicodedata.normalize('NFC', idea_usuario).lower()
+        idea = ' '.join(idea.split()).strip(' .,;:!?¡¿"\'')
+        datos = json.dumps([idea, estructura_elegida, nombre_modelo], ensure_ascii=False)
+        return hashlib.sha256(datos.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _construir_prompt(idea_usuario, estructura_elegida):
+        """Prompt para Gemini con la idea del usuario y las reglas de la estructura."""
         estructura_info = PoetryAssistant.ESTRUCTURAS.get(estructura_elegida)
         
-        prompt = f"""Eres un asistente literario experto en poesía. El usuario tiene una idea y quiere que lo ayudes a redactarla (NO escribirla completamente por él) en formato de {estructura_elegida}.
+        return f"""Eres un asistente literario experto en poesía. El usuario tiene una idea y quiere que lo ayudes a redactarla (NO escribirla completamente por él) en formato de {estructura_elegida}.
 
 Estructura {estructura_elegida}:
 - Descripción: {estructura_info['descripcion']}
@@ -143,89 +2266,575 @@ Tu trabajo:
 6. Deja que el usuario complete el resto con tu guía
 
 NO escribas el poema completo. Ayuda al usuario a que lo escriba él mismo."""
+    
+    @staticmethod
+    def _prioridad(usar_cache, prioridad):
+        if prioridad is not None:
+            return prioridad
+        return PlanificadorGemini.INTERACTIVA if usar_cache else PlanificadorGemini.NUEVA
+    
+    @staticmethod
+    def ayudar_con_poesia(idea_usuario, estructura_elegida, usar_cache=True, prioridad=None):
+        """Ayuda al usuario a redactar su idea en la estructura poética elegida.
+        
+        Las respuestas se guardan en caché por (idea normalizada, estructura, modelo);
+        con `usar_cache=False` se pide siempre una respuesta nueva a Gemini. La llamada
+        espera su turno en el planificador del proceso (`prioridad` por defecto:
+        interactiva, o algo menor si se pide una respuesta nueva).
+        """
+        planificador = planificador_gemini()
+        if not planificador:
+            return "⚠️ Por favor configura la API key de Gemini para usar esta función."
+        
+        cache = PoetryAssistant._cache_respuestas()
+        clave = PoetryAssistant._clave_cache(idea_usuario, estructura_elegida, planificador.preferido)
+        if usar_cache:
+            guardada = cache.obtener(clave)
+            if guardada is not None:
+                return guardada
+        
+        prompt = PoetryAssistant._construir_prompt(idea_usuario, estructura_elegida)
 
         try:
-            if model is None:
-                return "❌ Gemini no está disponible. Verifica tu `GEMINI_API_KEY` y que tu cuenta tenga acceso a modelos (p.ej. gemini-1.5-flash)."
-            response = model.generate_content(prompt)
+            with telemetria().medir('gemini', 'ayudar_con_poesia') as traza:
+                nombre_modelo, response = planificador.ejecutar(
+                    lambda modelo: modelo.generate_content(prompt),
+                    PoetryAssistant._prioridad(usar_cache, prioridad)
+                )
+                traza['bytes'] = len(response.text.encode('utf-8'))
+                if not response.text:
+                    traza['resultado'] = 'vacio'
+            # Solo se guardan las respuestas buenas, nunca los mensajes de error, y con
+            # el modelo que contestó de verdad (puede ser una alternativa al preferido)
+            cache.guardar(PoetryAssistant._clave_cache(idea_usuario, estructura_elegida, nombre_modelo), response.text)
             return response.text
+        except GeminiOcupado as e:
+            return f"⏳ {e}. Vuelve a intentarlo en un momento."
         except Exception as e:
             return f"❌ Error al generar ayuda: {str(e)}"
     
     @staticmethod
-    def contar_silabas(verso):
-        """Contador aproximado de sílabas en español."""
-        # Simplificado - en producción usar librería especializada
-        vocales = "aeiouáéíóúAEIOUÁÉÍÓÚ"
-        silabas = 0
-        anterior_vocal = False
-        
-        for char in verso:
-            if char in vocales:
-                if not anterior_vocal:
-                    silabas += 1
-                anterior_vocal = True
+    def ayudar_con_poesia_stream(idea_usuario, estructura_elegida, usar_cache=True, prioridad=None):
+        """Igual que `ayudar_con_poesia`, pero va entregando el texto por fragmentos.
+        
+        Es un generador: cada fragmento se puede pintar en cuanto llega, sin esperar
+        a que Gemini termine. Si el modelo no admite streaming (o falla antes del primer
+        fragmento) se usa la llamada normal y se entrega la respuesta completa de una vez.
+        """
+        planificador = planificador_gemini()
+        if not planificador:
+            yield "⚠️ Por favor configura la API key de Gemini para usar esta función."
+            return
+        
+        cache = PoetryAssistant._cache_respuestas()
+        clave = PoetryAssistant._clave_cache(idea_usuario, estructura_elegida, planificador.preferido)
+        if usar_cache:
+            guardada = cache.obtener(clave)
+            if guardada is not None:
+                yield guardada
+                return
+        
+        prompt = PoetryAssistant._construir_prompt(idea_usuario, estructura_elegida)
+        prioridad = PoetryAssistant._prioridad(usar_cache, prioridad)
+        fragmentos = []
+        try:
+            with telemetria().medir('gemini', 'ayudar_con_poesia_stream') as traza:
+                nombre_modelo, respuesta = planificador.ejecutar(
+                    lambda modelo: modelo.generate_content(prompt, stream=True), prioridad
+                )
+                for chunk in respuesta:
+                    try:
+                        texto = chunk.text
+                    except ValueError:
+                        # Fragmentos sin texto (p.ej. bloqueados por seguridad)
+                        continue
+                    if texto:
+                        fragmentos.append(texto)
+                        traza['bytes'] += len(texto.encode('utf-8'))
+                        yield texto
+                if not fragmentos:
+                    traza['resultado'] = 'vacio'
+        except GeminiOcupado as e:
+            # Ya esperó su turno: la llamada normal no tendría más suerte
+            yield f"⏳ {e}. Vuelve a intentarlo en un momento."
+            return
+        except Exception as e:
+            if not fragmentos:
+                # Sin streaming: volver al camino bloqueante
+                yield PoetryAssistant.ayudar_con_poesia(idea_usuario, estructura_elegida, usar_cache=False, prioridad=prioridad)
             else:
-                anterior_vocal = False
+                yield f"\n\n❌ Error al generar ayuda: {str(e)}"
+            return
         
-        return silabas
+        if fragmentos:
+            cache.guardar(PoetryAssistant._clave_cache(idea_usuario, estructura_elegida, nombre_modelo), ''.join(fragmentos))
+    
+    @staticmethod
+    def contar_silabas(verso):
+        """Sílabas métricas de un verso (con sinalefas y acento final)."""
+        return MetricaEspanola.silabas_verso(verso)
+    
+    @staticmethod
+    def validar_poema(poema, estructura_elegida):
+        """Valida un poema completo contra las sílabas, versos y rima de la estructura."""
+        return MetricaEspanola.validar_poema(poema, estructura_elegida)
+    
+    @staticmethod
+    def sugerir_rimas(palabra, tipo='consonante', limite=12):
+        """Palabras que riman con `palabra`, sacadas del índice local (sin red)."""
+        return indice_rimas().sugerir(palabra, tipo, limite)
 
 
 # ==================== MÓDULO 2: IDENTIFICACIÓN DE PINTURAS ====================
+class IndiceObras:
+    """Índice local de texto completo (SQLite FTS5) con las obras que devuelven los museos.
+
+    Cada obra se guarda tal cual junto a su texto indexable (título, artista,
+    cultura, medio...), plegado sin acentos ni mayúsculas. Además se recuerda qué
+    consultas ya se resolvieron por red, con sus resultados y su fecha, para
+    poder contestarlas de nuevo sin salir a internet.
+    """
+
+    # Pesos bm25 de las columnas: título, artista, resto de datos
+    PESOS = (10.0, 5.0, 1.0)
+
+    def __init__(self, nombre='obras', ttl=7 * 24 * 3600, directorio=None):
+        self.ttl = ttl
+        self.ruta = os.path.join(directorio or CACHE_DIR, f"{nombre}.sqlite")
+        self.aciertos = 0
+        self.fallos = 0
+        self.expirados = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS obras ("
+            "id INTEGER PRIMARY KEY, clave TEXT UNIQUE NOT NULL, "
+            "datos TEXT NOT NULL, actualizado REAL NOT NULL)"
+        )
+        self._conexion.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS obras_texto USING fts5("
+            "titulo, artista, detalles, tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS consultas ("
+            "consulta TEXT PRIMARY KEY, claves TEXT NOT NULL, actualizado REAL NOT NULL)"
+        )
+        self._conexion.commit()
+
+    @staticmethod
+    def normalizar(texto):
+        """Minúsculas, sin acentos y con los espacios colapsados."""
+        texto = unicodedata.normalize('NFKD', str(texto).lower())
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+        return ' '.join(texto.split())
+
+    @staticmethod
+    def _clave(obra):
+        """Identidad estable de una obra dentro de su museo."""
+        referencia = obra.get('url_museo') or f"{obra.get('imagen')}|{obra.get('titulo')}|{obra.get('artista')}"
+        return f"{obra.get('fuente', '')}|{referencia}"
+
+    @staticmethod
+    def _expresion(consulta):
+        """Convierte la búsqueda en una expresión FTS5: todas las palabras, como prefijo."""
+        palabras = re.findall(r'\w+', IndiceObras.normalizar(consulta))
+        return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+    def agregar(self, obras, consulta=None):
+        """Indexa (o actualiza) obras; con `consulta` también recuerda que las devolvió."""
+        ahora = time.time()
+        claves = []
+        with self._lock:
+            for obra in obras:
+                if not isinstance(obra, dict) or not obra.get('titulo'):
+                    continue
+                clave = self._clave(obra)
+                claves.append(clave)
+                self._conexion.execute(
+                    "INSERT INTO obras (clave, datos, actualizado) VALUES (?, ?, ?) "
+                    "ON CONFLICT(clave) DO UPDATE SET datos = excluded.datos, actualizado = excluded.actualizado",
+                    (clave, json.dumps(obra, ensure_ascii=False), ahora)
+                )
+                rowid = self._conexion.execute("SELECT id FROM obras WHERE clave = ?", (clave,)).fetchone()[0]
+                detalles = ' '.join(
+                    str(obra[campo]) for campo in ('año', 'cultura', 'medio', 'departamento', 'fuente')
+                    if obra.get(campo) and obra.get(campo) not in ('N/A', 'Desconocido')
+                )
+                self._conexion.execute("DELETE FROM obras_texto WHERE rowid = ?", (rowid,))
+                self._conexion.execute(
+                    "INSERT INTO obras_texto (rowid, titulo, artista, detalles) VALUES (?, ?, ?, ?)",
+                    (rowid, obra.get('titulo', ''), obra.get('artista', ''), detalles)
+                )
+            if consulta is not None and claves:
+                self._conexion.execute(
+                    "INSERT OR REPLACE INTO consultas (consulta, claves, actualizado) VALUES (?, ?, ?)",
+                    (self.normalizar(consulta), json.dumps(claves, ensure_ascii=False), ahora)
+                )
+            self._conexion.commit()
+        return len(claves)
+
+    def resultados_de_consulta(self, consulta, incluir_expirados=False):
+        """Obras que devolvieron los museos para esta misma consulta, en su orden, o None."""
+        ahora = time.time()
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT claves, actualizado FROM consultas WHERE consulta = ?", (self.normalizar(consulta),)
+            ).fetchone()
+            if fila is None:
+                self.fallos += 1
+                return None
+
+            claves, actualizado = fila
+            if ahora - actualizado > self.ttl and not incluir_expirados:
+                self.expirados += 1
+                return None
+
+            claves = json.loads(claves)
+            marcadores = ','.join('?' * len(claves))
+            datos = dict(self._conexion.execute(
+                f"SELECT clave, datos FROM obras WHERE clave IN ({marcadores})", claves
+            ).fetchall())
+            self.aciertos += 1
+        return [json.loads(datos[clave]) for clave in claves if clave in datos]
+
+    def buscar(self, consulta, limite=20, incluir_expirados=False):
+        """Obras del índice que contienen todas las palabras, ordenadas por relevancia (bm25)."""
+        expresion = self._expresion(consulta)
+        if not expresion:
+            return []
+
+        desde = 0 if incluir_expirados else time.time() - self.ttl
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT obras.datos FROM obras_texto JOIN obras ON obras.id = obras_texto.rowid "
+                "WHERE obras_texto MATCH ? AND obras.actualizado >= ? "
+                "ORDER BY bm25(obras_texto, ?, ?, ?) LIMIT ?",
+                (expresion, desde, *self.PESOS, limite)
+            ).fetchall()
+        return [json.loads(datos) for (datos,) in filas]
+
+    def limpiar(self):
+        """Vacía el índice y reinicia los contadores."""
+        with self._lock:
+            for tabla in ('obras', 'obras_texto', 'consultas'):
+                self._conexion.execute(f"DELETE FROM {tabla}")
+            self._conexion.commit()
+            self.aciertos = self.fallos = self.expirados = 0
+
+    def estadisticas(self):
+        """Tamaño del índice y contadores de consultas resueltas sin red."""
+        with self._lock:
+            obras = self._conexion.execute("SELECT COUNT(*) FROM obras").fetchone()[0]
+            consultas = self._conexion.execute("SELECT COUNT(*) FROM consultas").fetchone()[0]
+        total = self.aciertos + self.fallos + self.expirados
+        return {
+            'obras': obras,
+            'consultas': consultas,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'expirados': self.expirados,
+            'tasa_aciertos': round(self.aciertos / total, 3) if total else 0.0
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def indice_obras():
+    """Índice de obras compartido por todas las sesiones del proceso."""
+    return IndiceObras()
+
+
+class FusionObras:
+    """Fusión de resultados de varios museos: agrupa duplicados y ordena por puntuación.
+
+    Los títulos y artistas se normalizan (sin acentos, artículos ni puntuación) y
+    cada obra solo se compara con los representantes de los grupos que comparten
+    con ella una palabra del artista y la primera o la última del título, así que
+    el coste crece casi lineal.
+    """
+
+    UMBRAL_TITULO = 0.88
+    UMBRAL_ARTISTA = 0.5
+    MAX_DIFERENCIA_AÑOS = 5
+    CAMPOS = ('titulo', 'artista', 'año', 'cultura', 'medio', 'dimensiones', 'departamento', 'imagen', 'url_museo')
+    _VACIOS = frozenset({'', 'n/a', 'desconocido', 'unknown'})
+    _ARTICULOS = frozenset('el la los las lo un una de del y the a an of and le les du des der die das'.split())
+    _ANONIMOS = frozenset({'desconocido', 'anonimo', 'anonymous', 'unknown', 'unidentified artist', 'n/a'})
+
+    @staticmethod
+    def _vacio(valor):
+        return valor is None or str(valor).strip().lower() in FusionObras._VACIOS
+
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def normalizar_titulo(titulo):
+        """Palabras significativas del título, plegadas y sin artículos."""
+        palabras = re.findall(r'\w+', IndiceObras.normalizar(titulo or ''))
+        return ' '.join(p for p in palabras if p not in FusionObras._ARTICULOS) or ' '.join(palabras)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def normalizar_artista(artista):
+        """Conjunto de palabras del artista ("Gogh, Vincent van" == "Vincent van Gogh"); vacío si es anónimo."""
+        plano = IndiceObras.normalizar(artista or '')
+        if plano in FusionObras._ANONIMOS:
+            return frozenset()
+        return frozenset(re.findall(r'\w+', plano))
+
+    @staticmethod
+    def _año(obra):
+        encontrado = re.search(r'\d{4}', str(obra.get('año') or ''))
+        return int(encontrado.group()) if encontrado else None
+
+    @staticmethod
+    def _parecidos(a, b, umbral):
+        """Similitud de cadenas con los descartes baratos de difflib por delante."""
+        if a == b:
+            return True
+        comparador = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        return (
+            comparador.real_quick_ratio() >= umbral
+            and comparador.quick_ratio() >= umbral
+            and comparador.ratio() >= umbral
+        )
+
+    @staticmethod
+    def misma_obra(a, b):
+        """`a` y `b` son tuplas (título normalizado, artista, año, números del título) de dos obras."""
+        titulo_a, artista_a, año_a, numeros_a = a
+        titulo_b, artista_b, año_b, numeros_b = b
+        # "Composición n.º 8" y "Composición n.º 9" son obras distintas
+        if numeros_a != numeros_b:
+            return False
+        if artista_a or artista_b:
+            comunes = len(artista_a & artista_b) / len(artista_a | artista_b)
+            if comunes < FusionObras.UMBRAL_ARTISTA:
+                return False
+        elif not (año_a and año_b):
+            # Dos anónimos con el mismo título solo se fusionan si además cuadra la fecha
+            return False
+        if año_a and año_b and abs(año_a - año_b) > FusionObras.MAX_DIFERENCIA_AÑOS:
+            return False
+        return FusionObras._parecidos(titulo_a, titulo_b, FusionObras.UMBRAL_TITULO)
+
+    @staticmethod
+    def firma(obra):
+        """Lo que se compara de cada obra: título normalizado, artista, año y números del título."""
+        titulo = FusionObras.normalizar_titulo(obra.get('titulo'))
+        return titulo, FusionObras.normalizar_artista(obra.get('artista')), FusionObras._año(obra), re.findall(r'\d+', titulo)
+
+    @staticmethod
+    def agrupar(obras):
+        """Agrupa las obras duplicadas; devuelve listas de índices en orden de aparición."""
+        grupos = []
+        firmas = []
+        bloques = defaultdict(list)
+        for posicion, obra in enumerate(obras):
+            firma = FusionObras.firma(obra)
+            palabras = firma[0].split() or ['']
+            claves = {(palabra, autor) for palabra in {palabras[0], palabras[-1]} for autor in firma[1] or ('',)}
+
+            candidatos = {grupo for clave in claves for grupo in bloques[clave]}
+            destino = next(
+                (grupo for grupo in sorted(candidatos) if FusionObras.misma_obra(firmas[grupo], firma)),
+                None
+            )
+            if destino is None:
+                destino = len(grupos)
+                grupos.append([])
+                firmas.append(firma)
+                for clave in claves:
+                    bloques[clave].append(destino)
+            grupos[destino].append(posicion)
+        return grupos
+
+    @staticmethod
+    def _completitud(obra):
+        return sum(1 for campo in FusionObras.CAMPOS if not FusionObras._vacio(obra.get(campo)))
+
+    @staticmethod
+    def combinar(grupo):
+        """Una sola obra a partir de sus duplicados: la más completa, rellenada con las demás."""
+        base = max(grupo, key=lambda obra: (bool(obra.get('imagen')), FusionObras._completitud(obra)))
+        combinada = dict(base)
+        for obra in grupo:
+            for campo, valor in obra.items():
+                if FusionObras._vacio(combinada.get(campo)) and not FusionObras._vacio(valor):
+                    combinada[campo] = valor
+        fuentes = []
+        for obra in [base] + grupo:
+            for fuente in obra.get('fuentes') or [obra.get('fuente')]:
+                if fuente and fuente not in fuentes:
+                    fuentes.append(fuente)
+        combinada['fuentes'] = fuentes
+        return combinada
+
+    @staticmethod
+    def puntuar(obra, consulta=''):
+        """Relevancia para la consulta + completitud de la ficha + imagen + museos que coinciden."""
+        palabras = set(FusionObras.normalizar_titulo(consulta).split())
+        puntuacion = 0.0
+        if palabras:
+            titulo = set(FusionObras.normalizar_titulo(obra.get('titulo')).split())
+            artista = FusionObras.normalizar_artista(obra.get('artista'))
+            puntuacion += 3 * len(palabras & titulo) / len(palabras)
+            puntuacion += 2 * len(palabras & artista) / len(palabras)
+        puntuacion += FusionObras._completitud(obra) / len(FusionObras.CAMPOS)
+        puntuacion += 1 if obra.get('imagen') else 0
+        puntuacion += 0.5 * (len(obra.get('fuentes') or [obra.get('fuente')]) - 1)
+        return puntuacion
+
+    @staticmethod
+    def fusionar(obras, consulta=''):
+        """Agrupa duplicados, combina cada grupo y ordena por `puntuar` (estable ante empates)."""
+        combinadas = [FusionObras.combinar([obras[i] for i in grupo]) for grupo in FusionObras.agrupar(obras)]
+        return sorted(combinadas, key=lambda obra: -FusionObras.puntuar(obra, consulta))
+
+
 class ArtIdentifier:
     """Identificador de pinturas usando múltiples APIs de museos."""
     
+    MET_URL = "https://collectionapi.metmuseum.org/public/collection/v1"
+    RIJKS_URL = "https://www.rijksmuseum.nl/api/en/collection"
+    HARVARD_URL = "https://api.harvardartmuseums.org/object"
+    
+    # Hidratación de objetos del Met: cuántos IDs revisar y cuántos en paralelo
+    MET_MAX_IDS = 40
+    MET_WORKERS = 8
+
+    # Índice local: obras vigentes necesarias para no salir a la red, y cuántas mostrar
+    INDICE_MINIMO = 5
+    INDICE_LIMITE = 20
+
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def _met_cache():
+        """Caché en disco de los objetos del Met por objectID (casi nunca cambian)."""
+        return CachePersistente('met_objetos', ttl=30 * 24 * 3600, max_entradas=20000)
+    
+    @staticmethod
+    async def _descargar_objeto_met(object_id):
+        """Devuelve el JSON de un objeto del Met, usando la caché en disco cuando es posible."""
+        cache = ArtIdentifier._met_cache()
+        artwork = await cache.obtener_async(object_id)
+        if artwork is not None:
+            return artwork
+        
+        try:
+            object_response = await cliente_http().get(f"{ArtIdentifier.MET_URL}/objects/{object_id}", timeout=5)
+        except Exception:
+            # Sin red: mejor una copia vencida que nada
+            return await cache.obtener_async(object_id, incluir_expirados=True)
+        
+        if object_response.status_code != 200:
+            return await cache.obtener_async(object_id, incluir_expirados=True)
+        
+        artwork = object_response.json()
+        await cache.guardar_async(object_id, artwork)
+        return artwork
+    
+    @staticmethod
+    async def _obtener_objeto_met(object_id, semaforo):
+        """Obtiene el detalle de un objeto del Met y lo convierte en resultado (o None si no tiene imagen)."""
+        async with semaforo:
+            artwork = await ArtIdentifier._descargar_objeto_met(object_id)
+        
+        # Solo agregar si tiene imagen
+        if not artwork or not artwork.get('primaryImage'):
+            return None
+        
+        return {
+            'titulo': artwork.get('title', 'Desconocido'),
+            'artista': artwork.get('artistDisplayName', 'Desconocido'),
+            'año': artwork.get('objectDate', 'Desconocido'),
+            'cultura': artwork.get('culture', 'N/A'),
+            'medio': artwork.get('medium', 'N/A'),
+            'dimensiones': artwork.get('dimensions', 'N/A'),
+            'departamento': artwork.get('department', 'N/A'),
+            'imagen': artwork.get('primaryImage', ''),
+            'url_museo': artwork.get('objectURL', ''),
+            'fuente': 'Metropolitan Museum'
+        }
+    
     @staticmethod
-    def buscar_en_met_museum(query):
-        """Busca en The Metropolitan Museum API."""
+    @trazar('met')
+    async def buscar_en_met_museum_async(query, max_resultados=10, max_ids=None):
+        """Busca en The Metropolitan Museum API.
+        
+        Los detalles de los objetos se piden en paralelo (hasta `MET_WORKERS` a la vez)
+        sobre los primeros `max_ids` IDs, y se deja de pedir en cuanto hay
+        `max_resultados` obras con imagen.
+        """
+        if max_ids is None:
+            max_ids = ArtIdentifier.MET_MAX_IDS
+        
         try:
             # Búsqueda
-            search_url = f"https://collectionapi.metmuseum.org/public/collection/v1/search?q={query}&hasImages=true"
-            search_response = requests.get(search_url, timeout=10)
+            search_url = f"{ArtIdentifier.MET_URL}/search?q={query}&hasImages=true"
+            search_response = await cliente_http().get(search_url, timeout=10)
             
             if search_response.status_code != 200:
+                avisar_error(f"Error en el Met Museum: HTTP {search_response.status_code}")
                 return []
             
             data = search_response.json()
             if not data.get('objectIDs'):
                 return []
             
-            # Obtener detalles de múltiples resultados (hasta 10)
-            resultados = []
-            for object_id in data['objectIDs'][:10]:
-                try:
-                    object_url = f"https://collectionapi.metmuseum.org/public/collection/v1/objects/{object_id}"
-                    object_response = requests.get(object_url, timeout=5)
-                    
-                    if object_response.status_code == 200:
-                        artwork = object_response.json()
-                        # Solo agregar si tiene imagen
-                        if artwork.get('primaryImage'):
-                            resultados.append({
-                                'titulo': artwork.get('title', 'Desconocido'),
-                                'artista': artwork.get('artistDisplayName', 'Desconocido'),
-                                'año': artwork.get('objectDate', 'Desconocido'),
-                                'cultura': artwork.get('culture', 'N/A'),
-                                'medio': artwork.get('medium', 'N/A'),
-                                'dimensiones': artwork.get('dimensions', 'N/A'),
-                                'departamento': artwork.get('department', 'N/A'),
-                                'imagen': artwork.get('primaryImage', ''),
-                                'url_museo': artwork.get('objectURL', ''),
-                                'fuente': 'Metropolitan Museum'
-                            })
-                except:
-                    continue
+            # Obtener detalles en paralelo (como mucho MET_WORKERS a la vez)
+            semaforo = asyncio.Semaphore(ArtIdentifier.MET_WORKERS)
             
-            return resultados
+            async def _con_posicion(posicion, object_id):
+                return posicion, await ArtIdentifier._obtener_objeto_met(object_id, semaforo)
+            
+            tareas = [
+                asyncio.ensure_future(_con_posicion(posicion, object_id))
+                for posicion, object_id in enumerate(data['objectIDs'][:max_ids])
+            ]
+            encontrados = {}
+            try:
+                for siguiente in asyncio.as_completed(tareas):
+                    try:
+                        posicion, resultado = await siguiente
+                    except Exception:
+                        continue
+                    if resultado:
+                        encontrados[posicion] = resultado
+                        if len(encontrados) >= max_resultados:
+                            break
+            finally:
+                # Cancelar lo que aún no ha terminado si ya tenemos suficientes
+                for tarea in tareas:
+                    tarea.cancel()
+            
+            # Conservar el orden de relevancia del Met
+            return [encontrados[posicion] for posicion in sorted(encontrados)][:max_resultados]
         except Exception as e:
+            avisar_error(f"Error en el Met Museum: {str(e)}")
             return []
     
+    buscar_en_met_museum = version_sincrona(buscar_en_met_museum_async)
+    
+    @staticmethod
+    def _obra_rijks(art):
+        return {
+            'titulo': art.get('title', 'Desconocido'),
+            'artista': art.get('principalOrFirstMaker', 'Desconocido'),
+            'año': art.get('dating', {}).get('presentingDate', 'Desconocido'),
+            'imagen': art.get('webImage', {}).get('url', ''),
+            'url_museo': art.get('links', {}).get('web', ''),
+            'fuente': 'Rijksmuseum'
+        }
+    
     @staticmethod
-    def buscar_en_rijksmuseum(query):
+    @trazar('rijksmuseum')
+    async def buscar_en_rijksmuseum_async(query):
         """Busca en Rijksmuseum API."""
         try:
-            url = f"https://www.rijksmuseum.nl/api/en/collection?key=0fiuZFh4&q={query}&ps=10&imgonly=True"
-            response = requests.get(url, timeout=10)
+            url = f"{ArtIdentifier.RIJKS_URL}?key=0fiuZFh4&q={query}&ps=10&imgonly=True"
+            response = await cliente_http().get(url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -233,64 +2842,319 @@ class ArtIdentifier:
                 if data.get('artObjects'):
                     for art in data['artObjects']:
                         if art.get('webImage'):
-                            resultados.append({
-                                'titulo': art.get('title', 'Desconocido'),
-                                'artista': art.get('principalOrFirstMaker', 'Desconocido'),
-                                'año': art.get('dating', {}).get('presentingDate', 'Desconocido'),
-                                'imagen': art.get('webImage', {}).get('url', ''),
-                                'url_museo': art.get('links', {}).get('web', ''),
-                                'fuente': 'Rijksmuseum'
-                            })
+                            resultados.append(ArtIdentifier._obra_rijks(art))
                 return resultados
+            avisar_error(f"Error en el Rijksmuseum: HTTP {response.status_code}")
+            return []
         except Exception as e:
+            avisar_error(f"Error en el Rijksmuseum: {str(e)}")
             return []
     
+    buscar_en_rijksmuseum = version_sincrona(buscar_en_rijksmuseum_async)
+    
     @staticmethod
-    def buscar_en_harvard(query):
-        """Busca en Harvard Art Museums API."""
+    def _clave_harvard():
         api_key = os.getenv('HARVARD_API_KEY')
         if not api_key or api_key == 'your_harvard_key_here' or not api_key.strip():
             return None
+        return api_key
+    
+    @staticmethod
+    def _obra_harvard(art):
+        return {
+            'titulo': art.get('title', 'Desconocido'),
+            'artista': art.get('people', [{}])[0].get('name', 'Desconocido') if art.get('people') else 'Desconocido',
+            'año': art.get('dated', 'Desconocido'),
+            'cultura': art.get('culture', 'N/A'),
+            'imagen': art.get('primaryimageurl', ''),
+            'url_museo': art.get('url', ''),
+            'fuente': 'Harvard Art Museums'
+        }
+    
+    @staticmethod
+    @trazar('harvard')
+    async def buscar_en_harvard_async(query):
+        """Busca en Harvard Art Museums API."""
+        api_key = ArtIdentifier._clave_harvard()
+        if not api_key:
+            return None
         
         try:
-            url = f"https://api.harvardartmuseums.org/object?apikey={api_key}&q={query}&size=5&hasimage=1"
-            response = requests.get(url, timeout=10)
+            url = f"{ArtIdentifier.HARVARD_URL}?apikey={api_key}&q={query}&size=5&hasimage=1"
+            response = await cliente_http().get(url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
                 if data.get('records'):
-                    art = data['records'][0]
-                    return {
-                        'titulo': art.get('title', 'Desconocido'),
-                        'artista': art.get('people', [{}])[0].get('name', 'Desconocido') if art.get('people') else 'Desconocido',
-                        'año': art.get('dated', 'Desconocido'),
-                        'cultura': art.get('culture', 'N/A'),
-                        'imagen': art.get('primaryimageurl', ''),
-                        'url_museo': art.get('url', ''),
-                        'fuente': 'Harvard Art Museums'
-                    }
+                    return ArtIdentifier._obra_harvard(data['records'][0])
+            else:
+                avisar_error(f"Error en Harvard Art Museums: HTTP {response.status_code}")
         except Exception as e:
+            avisar_error(f"Error en Harvard Art Museums: {str(e)}")
             return None
     
+    buscar_en_harvard = version_sincrona(buscar_en_harvard_async)
+    
+    # ---- Búsqueda paginada: cada museo es un generador que pide páginas solo cuando hacen falta ----
     @staticmethod
-    def identificar_pintura(query):
-        """Busca en múltiples APIs y combina resultados."""
-        resultados = []
+    async def obras_met_async(query):
+        """Obras del Met una a una, en orden de relevancia por lotes de `MET_WORKERS`.
+
+        La búsqueda del Met devuelve todos los IDs de golpe (no pagina); lo que se
+        pagina es la hidratación: cada lote se pide cuando el consumidor quiere más.
+        """
+        search_response = await cliente_http().get(f"{ArtIdentifier.MET_URL}/search?q={query}&hasImages=true", timeout=10)
+        if search_response.status_code != 200:
+            return
+        ids = search_response.json().get('objectIDs') or []
         
-        # Buscar en todas las APIs (ahora retornan listas)
-        met_results = ArtIdentifier.buscar_en_met_museum(query)
-        if met_results:
-            resultados.extend(met_results)
+        semaforo = asyncio.Semaphore(ArtIdentifier.MET_WORKERS)
+        for inicio in range(0, len(ids), ArtIdentifier.MET_WORKERS):
+            lote = [
+                asyncio.ensure_future(ArtIdentifier._obtener_objeto_met(object_id, semaforo))
+                for object_id in ids[inicio:inicio + ArtIdentifier.MET_WORKERS]
+            ]
+            try:
+                for siguiente in asyncio.as_completed(lote):
+                    try:
+                        resultado = await siguiente
+                    except Exception:
+                        continue
+                    if resultado:
+                        yield resultado
+            finally:
+                for tarea in lote:
+                    tarea.cancel()
+    
+    @staticmethod
+    async def obras_rijksmuseum_async(query, por_pagina=10):
+        """Obras del Rijksmuseum una a una, pidiendo la página siguiente (`p`/`ps`) al agotar la actual."""
+        pagina = 1
+        while True:
+            url = f"{ArtIdentifier.RIJKS_URL}?key=0fiuZFh4&q={query}&p={pagina}&ps={por_pagina}&imgonly=True"
+            response = await cliente_http().get(url, timeout=10)
+            if response.status_code != 200:
+                return
+            data = response.json()
+            obras = data.get('artObjects') or []
+            for art in obras:
+                if art.get('webImage'):
+                    yield ArtIdentifier._obra_rijks(art)
+            if len(obras) < por_pagina or pagina * por_pagina >= data.get('count', 0):
+                return
+            pagina += 1
+    
+    @staticmethod
+    async def obras_harvard_async(query, por_pagina=10):
+        """Obras de Harvard una a una, pidiendo la página siguiente (`page`/`size`) al agotar la actual."""
+        api_key = ArtIdentifier._clave_harvard()
+        if not api_key:
+            return
         
-        rijks_results = ArtIdentifier.buscar_en_rijksmuseum(query)
-        if rijks_results:
-            resultados.extend(rijks_results)
+        pagina = 1
+        while True:
+            url = f"{ArtIdentifier.HARVARD_URL}?apikey={api_key}&q={query}&size={por_pagina}&page={pagina}&hasimage=1"
+            response = await cliente_http().get(url, timeout=10)
+            if response.status_code != 200:
+                return
+            data = response.json()
+            for art in data.get('records') or []:
+                if art.get('primaryimageurl'):
+                    yield ArtIdentifier._obra_harvard(art)
+            if pagina >= data.get('info', {}).get('pages', 0):
+                return
+            pagina += 1
+    
+    @staticmethod
+    def nueva_busqueda(query, por_pagina=4, usar_indice=True):
+        """Cursor paginado sobre los tres museos (ver `BusquedaObras`)."""
+        return BusquedaObras(query, por_pagina=por_pagina, usar_indice=usar_indice)
+    
+    @staticmethod
+    @compartir_en_vuelo(lambda argumentos: dict(
+        argumentos, query=IndiceObras.normalizar(argumentos['query'])
+    ))
+    @trazar('museos')
+    async def identificar_pintura_async(query, timeout_por_museo=10, plazo_total=12, usar_indice=True):
+        """Busca primero en el índice local y, si no basta, en múltiples APIs a la vez.
+
+        El índice contesta si la misma consulta ya se resolvió por red hace poco, o
+        si tiene al menos `INDICE_MINIMO` obras vigentes que la cumplan. Todo lo que
+        llega de los museos se indexa; si la red falla se recurre a lo que haya en el
+        índice aunque esté vencido. Los duplicados entre museos se fusionan en una sola
+        ficha (ver `FusionObras`) y el resultado se ordena por puntuación.
+        """
+        indice = indice_obras()
+        if usar_indice:
+            conocidos = indice.resultados_de_consulta(query)
+            if conocidos:
+                return conocidos
+            locales = FusionObras.fusionar(indice.buscar(query, limite=ArtIdentifier.INDICE_LIMITE), query)
+            if len(locales) >= ArtIdentifier.INDICE_MINIMO:
+                return locales
+
+        respuestas = await consultar_en_paralelo(
+            {
+                'met': ArtIdentifier.buscar_en_met_museum_async(query),
+                'rijks': ArtIdentifier.buscar_en_rijksmuseum_async(query),
+                'harvard': ArtIdentifier.buscar_en_harvard_async(query),
+            },
+            timeout_por_tarea=timeout_por_museo,
+            plazo_total=plazo_total
+        )
         
-        harvard_result = ArtIdentifier.buscar_en_harvard(query)
-        if harvard_result:
-            resultados.append(harvard_result)
+        # Mantener siempre el mismo orden de museos en la salida
+        resultados = []
+        for nombre in ('met', 'rijks'):
+            if respuestas.get(nombre):
+                resultados.extend(respuestas[nombre])
         
-        return resultados
+        if respuestas.get('harvard'):
+            resultados.append(respuestas['harvard'])
+
+        if resultados:
+            # Indexar cada ficha tal como llegó y devolver los duplicados ya fusionados
+            indice.agregar(resultados)
+            resultados = FusionObras.fusionar(resultados, query)
+            indice.agregar(resultados, consulta=query)
+            return resultados
+
+        # Sin respuesta de los museos: mejor lo que haya en el índice, aunque esté vencido
+        return indice.resultados_de_consulta(query, incluir_expirados=True) or FusionObras.fusionar(
+            indice.buscar(query, limite=ArtIdentifier.INDICE_LIMITE, incluir_expirados=True), query
+        )
+    
+    identificar_pintura = version_sincrona(identificar_pintura_async)
+
+
+class BusquedaObras:
+    """Cursor de una búsqueda de pinturas: a los museos solo se les pide otra página cuando hace falta.
+
+    Se guarda en `st.session_state`, de modo que sobrevive a los reruns; entre página
+    y página los generadores de cada museo quedan suspendidos donde se quedaron. Las
+    obras repetidas entre museos se fusionan con la ficha ya mostrada.
+
+    Como `identificar_pintura`, primero mira el índice local: si basta, las páginas
+    salen de ahí; si no, lo poco que tenga se muestra de entrada y los museos lo
+    completan. Al cerrar cada página todo se reordena con `FusionObras.fusionar`, y
+    si los museos no devuelven nada se recurre al índice aunque esté vencido.
+
+    Cancelar un `anext` pendiente mata el generador, así que la espera de cada museo
+    es una tarea propia que sobrevive al plazo de la página (o a un rerun): la página
+    siguiente sigue esperando esa misma tarea en vez de dar el museo por agotado.
+    """
+
+    PLAZO_POR_PAGINA = 12
+
+    def __init__(self, query, por_pagina=4, usar_indice=True):
+        self.query = query
+        self.por_pagina = por_pagina
+        self.paginas = 0
+        self.resultados = []
+        self._firmas = []
+        self._flujos = {}
+        self._siguientes = {}
+        self._del_indice = None
+        self._locales = []
+        if usar_indice:
+            indice = indice_obras()
+            conocidos = indice.resultados_de_consulta(query)
+            locales = conocidos or FusionObras.fusionar(indice.buscar(query, limite=ArtIdentifier.INDICE_LIMITE), query)
+            if conocidos or len(locales) >= ArtIdentifier.INDICE_MINIMO:
+                self._del_indice = locales
+            else:
+                self._locales = locales
+        self.desde_indice = bool(self._del_indice)
+        if not self.desde_indice:
+            self._flujos = {
+                'met': ArtIdentifier.obras_met_async(query),
+                'rijks': ArtIdentifier.obras_rijksmuseum_async(query),
+                'harvard': ArtIdentifier.obras_harvard_async(query),
+            }
+
+    @property
+    def hay_mas(self):
+        return bool(self._del_indice) or bool(self._flujos)
+
+    def _agregar(self, obra):
+        """Añade la obra a los resultados; si ya estaba (de otro museo), la fusiona y devuelve False."""
+        firma = FusionObras.firma(obra)
+        for posicion, anterior in enumerate(self._firmas):
+            if FusionObras.misma_obra(anterior, firma):
+                self.resultados[posicion] = FusionObras.combinar([self.resultados[posicion], obra])
+                return False
+        self._firmas.append(firma)
+        self.resultados.append(obra)
+        return True
+
+    @staticmethod
+    async def _anext(flujo):
+        return await anext(flujo)
+
+    async def _tomar(self, nombre, cantidad):
+        """Hasta `cantidad` obras más de un museo; si se agota o falla, deja de pedirle."""
+        flujo = self._flujos[nombre]
+        for _ in range(cantidad):
+            siguiente = self._siguientes.get(nombre)
+            if siguiente is None:
+                siguiente = self._siguientes[nombre] = asyncio.ensure_future(self._anext(flujo))
+            try:
+                # Si vence el plazo, se cancela esta espera pero no la tarea de debajo
+                obra = await asyncio.shield(siguiente)
+            except asyncio.CancelledError:
+                if siguiente.cancelled():
+                    self._siguientes.pop(nombre, None)
+                raise
+            except Exception:
+                self._siguientes.pop(nombre, None)
+                self._flujos.pop(nombre, None)
+                return
+            self._siguientes.pop(nombre, None)
+            yield obra
+
+    async def siguiente_pagina_async(self):
+        """Generador con las obras nuevas de la siguiente página, en cuanto llega cada una."""
+        self.paginas += 1
+        if self.desde_indice:
+            pagina = self._del_indice[:self.por_pagina * 3]
+            del self._del_indice[:self.por_pagina * 3]
+            for obra in pagina:
+                if self._agregar(obra):
+                    yield obra
+            return
+
+        # Lo que ya había en el índice se ve sin esperar a los museos
+        locales, self._locales = self._locales, []
+        for obra in locales:
+            if self._agregar(obra):
+                yield obra
+
+        recibidas = []
+        tomas = [self._tomar(nombre, self.por_pagina) for nombre in list(self._flujos)]
+        async for obra in intercalar(tomas, plazo_total=self.PLAZO_POR_PAGINA):
+            recibidas.append(obra)
+            if self._agregar(obra):
+                yield obra
+
+        indice = indice_obras()
+        if not recibidas and not self.resultados:
+            # Sin respuesta de los museos: mejor lo que haya en el índice, aunque esté vencido
+            vencidas = indice.resultados_de_consulta(self.query, incluir_expirados=True) or FusionObras.fusionar(
+                indice.buscar(self.query, limite=ArtIdentifier.INDICE_LIMITE, incluir_expirados=True), self.query
+            )
+            self.desde_indice = bool(vencidas)
+            for obra in vencidas:
+                if self._agregar(obra):
+                    yield obra
+
+        self.resultados = FusionObras.fusionar(self.resultados, self.query)
+        self._firmas = [FusionObras.firma(obra) for obra in self.resultados]
+        if recibidas:
+            indice.agregar(recibidas)
+            indice.agregar(self.resultados, consulta=self.query)
+
+    def siguiente_pagina(self):
+        return iterar_sync(self.siguiente_pagina_async())
 
 
 # ==================== MÓDULO 3: RECOMENDACIONES DE PELÍCULAS ====================
@@ -308,139 +3172,458 @@ class MovieRecommender:
         10770: "Película de TV", 53: "Thriller", 10752: "Bélica", 37: "Western"
     }
     
+    # Otros nombres con los que se pide un género (ya normalizados)
+    ALIAS_GENEROS = {
+        'ficcion': 878, 'ciencia ficcion': 878, 'sci-fi': 878, 'scifi': 878,
+        'pelicula para tv': 10770, 'telefilm': 10770,
+        'guerra': 10752, 'belico': 10752, 'animada': 16, 'animacion infantil': 16,
+        'familiar': 10751, 'historica': 36, 'historico': 36, 'musical': 10402,
+        'romantica': 10749, 'romantico': 10749, 'suspense': 53, 'suspenso': 53,
+        'miedo': 27, 'horror': 27, 'policiaca': 80, 'policiaco': 80, 'oeste': 37,
+    }
+    
+    # Índice nombre normalizado -> id: el nombre completo de cada género y sus alias
+    GENEROS_POR_NOMBRE = {
+        **{IndiceObras.normalizar(nombre): id for id, nombre in GENEROS.items()},
+        **ALIAS_GENEROS,
+    }
+    
+    # Tabla precalculada con el top de cada género (se refresca en segundo plano)
+    TOP_POR_GENERO = 300
+    TABLA_TTL = 24 * 3600
+    REFRESCO_INTERVALO = 3600
+    # Géneros con un refresco en marcha y sus tareas (con referencia, para que no las
+    # recoja el recolector a medias); compartidos por los bucles de todas las sesiones
+    _refrescando = set()
+    _tareas_refresco = set()
+    _lock_refresco = threading.Lock()
+    
+    # Listados paginados de TMDb: 20 películas por página, como mucho 25 páginas por consulta
+    POR_PAGINA_TMDB = 20
+    MAX_PAGINAS = 25
+    
     @staticmethod
-    def recomendar_por_genero(genero, cantidad=5):
-        """Recomienda películas por género."""
-        try:
-            # Encontrar el ID del género
-            genero_id = None
-            for id, nombre in MovieRecommender.GENEROS.items():
-                if genero.lower() in nombre.lower():
-                    genero_id = id
-                    break
-            
-            if not genero_id:
-                return None
-            
-            url = f"{MovieRecommender.BASE_URL}/discover/movie"
-            params = {
-                'api_key': MovieRecommender.TMDB_API_KEY,
-                'with_genres': genero_id,
-                'sort_by': 'vote_average.desc',
-                'vote_count.gte': 1000,
-                'language': 'es-ES',
-                'page': 1
-            }
-            
-            response = requests.get(url, params=params, timeout=5)
+    def id_genero(genero):
+        """Id de TMDb del género, por nombre completo o por uno de sus alias (O(1))."""
+        return MovieRecommender.GENEROS_POR_NOMBRE.get(IndiceObras.normalizar(genero))
+    
+    @staticmethod
+    def _pelicula(movie):
+        return {
+            'id': movie.get('id'),
+            'titulo': movie.get('title', 'Desconocido'),
+            'año': movie.get('release_date', 'N/A')[:4] if movie.get('release_date') else 'N/A',
+            'sinopsis': movie.get('overview', 'No disponible'),
+            'valoracion': movie.get('vote_average', 0),
+            'poster': f"https://image.tmdb.org/t/p/w500{movie['poster_path']}" if movie.get('poster_path') else None
+        }
+    
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def _tabla_generos():
+        """Top de cada género en disco: id de género -> {'peliculas', 'actualizado'}."""
+        return CachePersistente('tmdb_top_generos', ttl=MovieRecommender.TABLA_TTL, max_entradas=100)
+    
+    @staticmethod
+    def _cumple(pelicula, filtros):
+        """Filtros opcionales: 'valoracion_minima', 'año_desde', 'año_hasta'."""
+        if not filtros:
+            return True
+        if filtros.get('valoracion_minima') and (pelicula['valoracion'] or 0) < filtros['valoracion_minima']:
+            return False
+        desde, hasta = filtros.get('año_desde'), filtros.get('año_hasta')
+        if desde or hasta:
+            if not pelicula['año'].isdigit():
+                return False
+            if (desde and int(pelicula['año']) < desde) or (hasta and int(pelicula['año']) > hasta):
+                return False
+        return True
+    
+    @staticmethod
+    async def peliculas_paginadas_async(ruta, params, cantidad, filtros=None, vistas=None, desde_pagina=1):
+        """Recorre las páginas de un listado de TMDb y entrega cada película nueva (por id) según llega.
+
+        La primera página dice cuántas hay; las siguientes se piden en paralelo, en tandas
+        de las que faltan para llegar a `cantidad` (si los filtros descartan películas,
+        la tanda siguiente es mayor). El ritmo lo marcan el semáforo por host y el
+        `LimitadorTasa` del cliente HTTP, así que no se pasa de los límites de TMDb. Las
+        páginas se entregan en orden para conservar el ranking.
+        """
+        url = f"{MovieRecommender.BASE_URL}{ruta}"
+        vistas = set() if vistas is None else vistas
+        entregadas = 0
+        
+        async def _pagina(numero):
+            response = await cliente_http().get(url, params={**params, 'page': numero}, timeout=5)
+            if response.status_code != 200:
+                raise RuntimeError(f"TMDb respondió {response.status_code}")
+            return response.json()
+        
+        def _nuevas(datos):
+            for movie in datos.get('results', []):
+                if movie.get('id') in vistas:
+                    continue
+                vistas.add(movie.get('id'))
+                pelicula = MovieRecommender._pelicula(movie)
+                if MovieRecommender._cumple(pelicula, filtros):
+                    yield pelicula
+        
+        datos = await _pagina(desde_pagina)
+        ultima = min(datos.get('total_pages', 1), MovieRecommender.MAX_PAGINAS)
+        siguiente = desde_pagina + 1
+        while True:
+            for pelicula in _nuevas(datos):
+                yield pelicula
+                entregadas += 1
+                if entregadas >= cantidad:
+                    return
             
-            if response.status_code == 200:
-                data = response.json()
-                peliculas = []
-                
-                for movie in data['results'][:cantidad]:
-                    peliculas.append({
-                        'titulo': movie.get('title', 'Desconocido'),
-                        'año': movie.get('release_date', 'N/A')[:4] if movie.get('release_date') else 'N/A',
-                        'sinopsis': movie.get('overview', 'No disponible'),
-                        'valoracion': movie.get('vote_average', 0),
-                        'poster': f"https://image.tmdb.org/t/p/w500{movie['poster_path']}" if movie.get('poster_path') else None
-                    })
-                
-                return peliculas
+            if siguiente > ultima:
+                return
+            faltan = -(-(cantidad - entregadas) // MovieRecommender.POR_PAGINA_TMDB)
+            tanda = [
+                asyncio.ensure_future(_pagina(numero))
+                for numero in range(siguiente, min(ultima, siguiente + faltan - 1) + 1)
+            ]
+            siguiente += len(tanda)
+            try:
+                for tarea in tanda[:-1]:
+                    for pelicula in _nuevas(await tarea):
+                        yield pelicula
+                        entregadas += 1
+                        if entregadas >= cantidad:
+                            return
+                datos = await tanda[-1]
+            finally:
+                for tarea in tanda:
+                    tarea.cancel()
+    
+    @staticmethod
+    def _params_discover(genero_id, filtros=None):
+        params = {
+            'api_key': MovieRecommender.TMDB_API_KEY,
+            'with_genres': genero_id,
+            'sort_by': 'vote_average.desc',
+            'vote_count.gte': 1000,
+            'language': 'es-ES'
+        }
+        # Los filtros que TMDb entiende se aplican en el servidor
+        filtros = filtros or {}
+        if filtros.get('valoracion_minima'):
+            params['vote_average.gte'] = filtros['valoracion_minima']
+        if filtros.get('año_desde'):
+            params['primary_release_date.gte'] = f"{filtros['año_desde']}-01-01"
+        if filtros.get('año_hasta'):
+            params['primary_release_date.lte'] = f"{filtros['año_hasta']}-12-31"
+        return params
+    
+    @staticmethod
+    @trazar('tmdb')
+    async def refrescar_genero_async(genero_id):
+        """Descarga el top `TOP_POR_GENERO` de un género y lo guarda en la tabla local."""
+        peliculas = [
+            pelicula async for pelicula in MovieRecommender.peliculas_paginadas_async(
+                '/discover/movie', MovieRecommender._params_discover(genero_id), MovieRecommender.TOP_POR_GENERO
+            )
+        ]
+        if not peliculas:
+            raise RuntimeError("TMDb no devolvió películas")
+        
+        entrada = {'peliculas': peliculas, 'actualizado': time.time()}
+        await MovieRecommender._tabla_generos().guardar_async(genero_id, entrada)
+        return entrada
+    
+    @staticmethod
+    def _refrescar_en_segundo_plano(genero_id):
+        """Lanza el refresco de un género en el bucle actual, salvo que ya haya uno en marcha."""
+        with MovieRecommender._lock_refresco:
+            if genero_id in MovieRecommender._refrescando:
+                return
+            MovieRecommender._refrescando.add(genero_id)
+            tarea = asyncio.ensure_future(MovieRecommender._refrescar(genero_id))
+            MovieRecommender._tareas_refresco.add(tarea)
+        # Al terminar (también si se cancela antes de empezar) se suelta el género
+        tarea.add_done_callback(lambda tarea: MovieRecommender._fin_refresco(genero_id, tarea))
+    
+    @staticmethod
+    async def _refrescar(genero_id):
+        try:
+            await MovieRecommender.refrescar_genero_async(genero_id)
+        except Exception:
+            pass
+    
+    @staticmethod
+    def _fin_refresco(genero_id, tarea):
+        with MovieRecommender._lock_refresco:
+            MovieRecommender._refrescando.discard(genero_id)
+            MovieRecommender._tareas_refresco.discard(tarea)
+    
+    @staticmethod
+    async def refrescar_tabla_generos_async(solo_vencidos=False):
+        """Refresca el top de todos los géneros (o solo los vencidos); devuelve cuántos se actualizaron."""
+        pendientes = [
+            genero_id for genero_id in MovieRecommender.GENEROS
+            if not solo_vencidos or (MovieRecommender.estado_genero(genero_id) or {'vencido': True})['vencido']
+        ]
+        respuestas = await asyncio.gather(
+            *(MovieRecommender.refrescar_genero_async(genero_id) for genero_id in pendientes),
+            return_exceptions=True
+        )
+        return sum(1 for respuesta in respuestas if not isinstance(respuesta, BaseException))
+    
+    refrescar_tabla_generos = version_sincrona(refrescar_tabla_generos_async)
+    
+    @staticmethod
+    def estado_genero(genero):
+        """Antigüedad de la tabla de un género (por nombre o id): {'actualizado', 'antiguedad', 'vencido'}, o None."""
+        genero_id = genero if genero in MovieRecommender.GENEROS else MovieRecommender.id_genero(genero)
+        entrada = MovieRecommender._tabla_generos().obtener(genero_id, incluir_expirados=True)
+        if entrada is None:
+            return None
+        antiguedad = time.time() - entrada['actualizado']
+        return {
+            'actualizado': entrada['actualizado'],
+            'antiguedad': antiguedad,
+            'vencido': antiguedad > MovieRecommender.TABLA_TTL
+        }
+    
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def iniciar_refresco_periodico():
+        """Hilo del proceso que cada `REFRESCO_INTERVALO` refresca los géneros vencidos."""
+        def _bucle():
+            while True:
+                if MovieRecommender.TMDB_API_KEY:
+                    try:
+                        ejecutar_sync(MovieRecommender.refrescar_tabla_generos_async(solo_vencidos=True))
+                    except Exception:
+                        pass
+                time.sleep(MovieRecommender.REFRESCO_INTERVALO)
+        
+        hilo = threading.Thread(target=_bucle, name="arty-generos", daemon=True)
+        hilo.start()
+        return hilo
+    
+    @staticmethod
+    async def recomendar_por_genero_stream_async(genero, cantidad=5, filtros=None):
+        """Películas recomendadas de un género, una a una según están disponibles.
+
+        Primero sale lo que haya en la tabla local precalculada (si falta o está
+        vencida se rellena en segundo plano); si no alcanza para `cantidad`, se
+        sigue por las páginas de TMDb que la tabla no cubre.
+        """
+        genero_id = MovieRecommender.id_genero(genero)
+        if not genero_id:
+            return
+        
+        entregadas = 0
+        vistas = set()
+        desde_pagina = 1
+        params = MovieRecommender._params_discover(genero_id, filtros)
+        entrada = await MovieRecommender._tabla_generos().obtener_async(genero_id, incluir_expirados=True)
+        if entrada is not None:
+            if time.time() - entrada['actualizado'] > MovieRecommender.TABLA_TTL:
+                MovieRecommender._refrescar_en_segundo_plano(genero_id)
+            for pelicula in entrada['peliculas']:
+                vistas.add(pelicula['id'])
+                if MovieRecommender._cumple(pelicula, filtros):
+                    yield pelicula
+                    entregadas += 1
+                    if entregadas >= cantidad:
+                        return
+            if len(entrada['peliculas']) < MovieRecommender.TOP_POR_GENERO:
+                # La tabla ya tiene todo lo que hay en este género
+                return
+            # Saltar las páginas que cubre la tabla solo vale para el mismo listado con el que se
+            # construyó; con filtros en el servidor, sus primeras páginas son justo las que faltan
+            if params == MovieRecommender._params_discover(genero_id):
+                desde_pagina = len(entrada['peliculas']) // MovieRecommender.POR_PAGINA_TMDB + 1
+        else:
+            # Género aún sin tabla: se sirve en vivo y la tabla se llena en segundo plano
+            MovieRecommender._refrescar_en_segundo_plano(genero_id)
+        
+        try:
+            async for pelicula in MovieRecommender.peliculas_paginadas_async(
+                '/discover/movie', params,
+                cantidad - entregadas, filtros=filtros, vistas=vistas, desde_pagina=desde_pagina
+            ):
+                yield pelicula
         except Exception as e:
-            st.error(f"Error al buscar películas: {str(e)}")
+            avisar_error(f"Error al buscar películas: {str(e)}")
+    
+    recomendar_por_genero_stream = version_iterable(recomendar_por_genero_stream_async)
+    
+    @staticmethod
+    @compartir_en_vuelo(lambda argumentos: dict(
+        argumentos,
+        genero=MovieRecommender.id_genero(argumentos['genero']) or IndiceObras.normalizar(argumentos['genero'])
+    ))
+    @trazar('tmdb')
+    async def recomendar_por_genero_async(genero, cantidad=5, filtros=None):
+        """Recomienda películas por género (lista completa; ver `recomendar_por_genero_stream_async`)."""
+        if not MovieRecommender.id_genero(genero):
             return None
+        return [
+            pelicula async for pelicula in MovieRecommender.recomendar_por_genero_stream_async(genero, cantidad, filtros)
+        ]
+    
+    recomendar_por_genero = version_sincrona(recomendar_por_genero_async)
     
     @staticmethod
-    def buscar_por_tematica(tematica, cantidad=5):
-        """Busca películas por temática específica."""
+    async def buscar_por_tematica_stream_async(tematica, cantidad=5, filtros=None):
+        """Películas sobre una temática, una a una, recorriendo varias páginas de la búsqueda."""
+        params = {
+            'api_key': MovieRecommender.TMDB_API_KEY,
+            'query': tematica,
+            'language': 'es-ES'
+        }
         try:
-            url = f"{MovieRecommender.BASE_URL}/search/movie"
-            params = {
-                'api_key': MovieRecommender.TMDB_API_KEY,
-                'query': tematica,
-                'language': 'es-ES',
-                'page': 1
-            }
-            
-            response = requests.get(url, params=params, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                peliculas = []
-                
-                for movie in data['results'][:cantidad]:
-                    peliculas.append({
-                        'titulo': movie.get('title', 'Desconocido'),
-                        'año': movie.get('release_date', 'N/A')[:4] if movie.get('release_date') else 'N/A',
-                        'sinopsis': movie.get('overview', 'No disponible'),
-                        'valoracion': movie.get('vote_average', 0),
-                        'poster': f"https://image.tmdb.org/t/p/w500{movie['poster_path']}" if movie.get('poster_path') else None
-                    })
-                
-                return peliculas
+            async for pelicula in MovieRecommender.peliculas_paginadas_async('/search/movie', params, cantidad, filtros=filtros):
+                yield pelicula
         except Exception as e:
-            st.error(f"Error al buscar por temática: {str(e)}")
-            return None
+            avisar_error(f"Error al buscar por temática: {str(e)}")
+    
+    buscar_por_tematica_stream = version_iterable(buscar_por_tematica_stream_async)
+    
+    @staticmethod
+    @trazar('tmdb')
+    async def buscar_por_tematica_async(tematica, cantidad=5, filtros=None):
+        """Busca películas por temática específica."""
+        return [
+            pelicula async for pelicula in MovieRecommender.buscar_por_tematica_stream_async(tematica, cantidad, filtros)
+        ]
+    
+    buscar_por_tematica = version_sincrona(buscar_por_tematica_async)
 
 
 # ==================== MÓDULO 4: INFORMACIÓN DE ARTISTAS ====================
 class ArtistInfo:
     """Información sobre artistas, pintores, escritores y directores."""
     
+    WIKIPEDIA_URL = "https://es.wikipedia.org/w/api.php"
+    # Parámetros comunes para traer extracto e imagen de las páginas en la misma consulta
+    WIKIPEDIA_PARAMS = {
+        'action': 'query',
+        'prop': 'extracts|pageimages',
+        'exintro': 1,
+        'explaintext': 1,
+        'piprop': 'original',
+        'redirects': 1,
+        'format': 'json'
+    }
+    # Máximo de extractos de introducción que la API devuelve por petición
+    WIKIPEDIA_LOTE = 20
+    
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def _titulos_wikipedia():
+        """Caché nombre buscado -> título de su página, para saltarse la búsqueda."""
+        return CachePersistente('wikipedia_titulos', ttl=30 * 24 * 3600, max_entradas=10000)
+    
+    @staticmethod
+    def _clave_nombre(nombre):
+        return ' '.join(nombre.lower().split())
+    
+    @staticmethod
+    def _pagina_a_resultado(page, nombre):
+        return {
+            'nombre': page.get('title', nombre),
+            'biografia': page.get('extract') or 'No disponible',
+            'imagen': page.get('original', {}).get('source', ''),
+            'fuente': 'Wikipedia'
+        }
+    
     @staticmethod
-    def buscar_en_wikipedia(nombre):
-        """Busca información del artista en Wikipedia."""
+    @compartir_en_vuelo(lambda argumentos: dict(
+        argumentos, nombre=ArtistInfo._clave_nombre(argumentos['nombre'])
+    ))
+    @trazar('wikipedia')
+    async def buscar_en_wikipedia_async(nombre):
+        """Busca información del artista en Wikipedia con una sola petición.
+        
+        La búsqueda y el extracto van juntos (generator=search); si el nombre ya se
+        resolvió antes, se pide directamente el título guardado.
+        """
         try:
-            # Buscar página
-            search_url = "https://es.wikipedia.org/w/api.php"
-            search_params = {
-                'action': 'query',
-                'list': 'search',
-                'srsearch': nombre,
-                'format': 'json',
-                'srlimit': 1
-            }
+            titulos = ArtistInfo._titulos_wikipedia()
+            clave = ArtistInfo._clave_nombre(nombre)
+            titulo = await titulos.obtener_async(clave)
             
-            search_response = requests.get(search_url, params=search_params, timeout=5)
-            search_data = search_response.json()
+            params = dict(ArtistInfo.WIKIPEDIA_PARAMS)
+            if titulo:
+                params['titles'] = titulo
+            else:
+                params.update({'generator': 'search', 'gsrsearch': nombre, 'gsrlimit': 1})
             
-            if not search_data['query']['search']:
+            response = await cliente_http().get(ArtistInfo.WIKIPEDIA_URL, params=params, timeout=5)
+            pages = response.json().get('query', {}).get('pages', {})
+            page = next((page for page in pages.values() if 'missing' not in page), None)
+            if page is None:
                 return None
             
-            page_title = search_data['query']['search'][0]['title']
-            
-            # Obtener extracto
-            extract_params = {
-                'action': 'query',
-                'prop': 'extracts|pageimages',
-                'exintro': True,
-                'explaintext': True,
-                'titles': page_title,
-                'format': 'json',
-                'piprop': 'original'
-            }
-            
-            extract_response = requests.get(search_url, params=extract_params, timeout=5)
-            extract_data = extract_response.json()
-            
-            pages = extract_data['query']['pages']
-            page_id = list(pages.keys())[0]
-            page = pages[page_id]
-            
-            return {
-                'nombre': page.get('title', nombre),
-                'biografia': page.get('extract', 'No disponible'),
-                'imagen': page.get('original', {}).get('source', ''),
-                'fuente': 'Wikipedia'
-            }
+            await titulos.guardar_async(clave, page['title'])
+            return ArtistInfo._pagina_a_resultado(page, nombre)
         except Exception as e:
-            st.error(f"Error en Wikipedia: {str(e)}")
+            avisar_error(f"Error en Wikipedia: {str(e)}")
             return None
     
+    buscar_en_wikipedia = version_sincrona(buscar_en_wikipedia_async)
+    
+    @staticmethod
+    @trazar('wikipedia')
+    async def buscar_en_wikipedia_lote_async(nombres):
+        """Resuelve muchos artistas de una vez (p.ej. para precalentar la caché cada noche).
+        
+        Pide hasta `WIKIPEDIA_LOTE` títulos por petición (titles=A|B|C) siguiendo
+        normalizaciones y redirecciones; los nombres que no son un título exacto se
+        buscan uno a uno. Devuelve un dict nombre -> resultado (o None).
+        """
+        titulos = ArtistInfo._titulos_wikipedia()
+        # Título a probar por nombre: el ya resuelto o el propio nombre
+        candidatos = await asyncio.to_thread(lambda: {
+            nombre: titulos.obtener(ArtistInfo._clave_nombre(nombre)) or nombre.strip() for nombre in nombres
+        })
+        resultados = {}
+        
+        unicos = list(dict.fromkeys(candidatos.values()))
+        for inicio in range(0, len(unicos), ArtistInfo.WIKIPEDIA_LOTE):
+            lote = unicos[inicio:inicio + ArtistInfo.WIKIPEDIA_LOTE]
+            params = dict(ArtistInfo.WIKIPEDIA_PARAMS, titles='|'.join(lote), exlimit='max')
+            try:
+                response = await cliente_http().get(ArtistInfo.WIKIPEDIA_URL, params=params, timeout=10)
+                query = response.json().get('query', {})
+            except Exception:
+                continue
+            
+            # Seguir "normalized" y "redirects" para saber a qué página acabó cada título
+            destino = {}
+            for cambio in query.get('normalized', []) + query.get('redirects', []):
+                destino[cambio['from']] = cambio['to']
+            paginas = {page['title']: page for page in query.get('pages', {}).values() if 'missing' not in page}
+            
+            for nombre, titulo in candidatos.items():
+                if titulo not in lote:
+                    continue
+                while titulo in destino and destino[titulo] != titulo:
+                    titulo = destino[titulo]
+                if titulo in paginas:
+                    await titulos.guardar_async(ArtistInfo._clave_nombre(nombre), titulo)
+                    resultados[nombre] = ArtistInfo._pagina_a_resultado(paginas[titulo], nombre)
+        
+        # Lo que no era un título exacto: búsqueda individual (en paralelo)
+        faltan = [nombre for nombre in nombres if nombre not in resultados]
+        encontrados = await asyncio.gather(*(ArtistInfo.buscar_en_wikipedia_async(nombre) for nombre in faltan))
+        resultados.update(zip(faltan, encontrados))
+        return resultados
+    
+    buscar_en_wikipedia_lote = version_sincrona(buscar_en_wikipedia_lote_async)
+    
     @staticmethod
-    def buscar_director_tmdb(nombre):
+    @compartir_en_vuelo(lambda argumentos: dict(
+        argumentos, nombre=ArtistInfo._clave_nombre(argumentos['nombre'])
+    ))
+    @trazar('tmdb')
+    async def buscar_director_tmdb_async(nombre):
         """Busca información de un director de cine en TMDb."""
         try:
             url = f"{MovieRecommender.BASE_URL}/search/person"
@@ -450,7 +3633,7 @@ class ArtistInfo:
                 'language': 'es-ES'
             }
             
-            response = requests.get(url, params=params, timeout=5)
+            response = await cliente_http().get(url, params=params, timeout=5)
             
             if response.status_code == 200:
                 data = response.json()
@@ -458,20 +3641,18 @@ class ArtistInfo:
                     person = data['results'][0]
                     person_id = person['id']
                     
-                    # Obtener detalles completos
+                    # Detalles y créditos en una sola petición (append_to_response)
                     detail_url = f"{MovieRecommender.BASE_URL}/person/{person_id}"
                     detail_params = {
                         'api_key': MovieRecommender.TMDB_API_KEY,
-                        'language': 'es-ES'
+                        'language': 'es-ES',
+                        'append_to_response': 'movie_credits'
                     }
                     
-                    detail_response = requests.get(detail_url, params=detail_params, timeout=5)
+                    detail_response = await cliente_http().get(detail_url, params=detail_params, timeout=5)
                     detail_data = detail_response.json()
-                    
-                    # Obtener películas dirigidas
-                    credits_url = f"{MovieRecommender.BASE_URL}/person/{person_id}/movie_credits"
-                    credits_response = requests.get(credits_url, params=detail_params, timeout=5)
-                    credits_data = credits_response.json()
+                    # Películas dirigidas
+                    credits_data = detail_data.get('movie_credits') or {}
                     
                     peliculas_dirigidas = []
                     for movie in credits_data.get('crew', []):
@@ -483,7 +3664,7 @@ class ArtistInfo:
                     
                     return {
                         'nombre': detail_data.get('name', nombre),
-                        'biografia': detail_data.get('biography', 'No disponible'),
+                        'biografia': detail_data.get('biography') or 'No disponible',
                         'nacimiento': detail_data.get('birthday', 'N/A'),
                         'lugar': detail_data.get('place_of_birth', 'N/A'),
                         'imagen': f"https://image.tmdb.org/t/p/w500{detail_data['profile_path']}" if detail_data.get('profile_path') else None,
@@ -491,255 +3672,915 @@ class ArtistInfo:
                         'fuente': 'TMDb'
                     }
         except Exception as e:
-            st.error(f"Error en TMDb: {str(e)}")
+            avisar_error(f"Error en TMDb: {str(e)}")
             return None
+    
+    buscar_director_tmdb = version_sincrona(buscar_director_tmdb_async)
+    
+    @staticmethod
+    @trazar('artistas')
+    async def buscar_director_async(nombre):
+        """Busca un director en TMDb y, a la vez, en Wikipedia.
+        
+        Wikipedia arranca en paralelo con TMDb, pero su resultado solo se espera si TMDb
+        no encuentra a la persona o no tiene biografía; si no hace falta, se cancela (la
+        petición solo sigue si otra sesión está esperando la misma búsqueda, ver
+        `VueloUnico`). Devuelve {'tmdb': ..., 'wikipedia': ...}.
+        """
+        tarea_wiki = asyncio.ensure_future(ArtistInfo.buscar_en_wikipedia_async(nombre))
+        try:
+            info_tmdb = await ArtistInfo.buscar_director_tmdb_async(nombre)
+        except BaseException:
+            tarea_wiki.cancel()
+            raise
+        
+        if info_tmdb and info_tmdb['biografia'] != 'No disponible':
+            tarea_wiki.cancel()
+            return {'tmdb': info_tmdb, 'wikipedia': None}
+        
+        return {'tmdb': info_tmdb, 'wikipedia': await tarea_wiki}
+    
+    buscar_director = version_sincrona(buscar_director_async)
+
+
+# ==================== MÓDULO 5: ECONOMÍA DE LA CULTURA ====================
+class TablaPIB:
+    """PIB por país y año (US$ corrientes, Banco Mundial) en columnas de NumPy.
+
+    `data/gdp_data.csv` trae una fila por país y una columna por año. Se lee una sola
+    vez a una matriz `valores` (filas = países/regiones, columnas = años, NaN donde
+    no hay dato) que se guarda en `CACHE_DIR/pib/` y, a partir de ahí, se mapea en
+    memoria: abrirla no cuesta nada y no se vuelve a parsear el CSV salvo que cambie.
+    Todas las consultas operan sobre la matriz completa, sin bucles por país.
+    """
+
+    ARCHIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gdp_data.csv')
+    # Se incrementa si cambia el formato de la caché binaria
+    VERSION = 1
+    # Filas del Banco Mundial que son agregados (regiones, grupos de ingreso, etc.) y no países
+    AGREGADOS = frozenset({
+        'AFE', 'AFW', 'ARB', 'CEB', 'CSS', 'EAP', 'EAR', 'EAS', 'ECA', 'ECS', 'EMU', 'EUU', 'FCS',
+        'HIC', 'HPC', 'IBD', 'IBT', 'IDA', 'IDB', 'IDX', 'INX', 'LAC', 'LCN', 'LDC', 'LIC', 'LMC',
+        'LMY', 'LTE', 'MEA', 'MIC', 'MNA', 'NAC', 'OED', 'OSS', 'PRE', 'PSS', 'PST', 'SAS', 'SSA',
+        'SSF', 'SST', 'TEA', 'TEC', 'TLA', 'TMN', 'TSA', 'TSS', 'UMC', 'WLD',
+    })
+    MUNDO = 'WLD'
+
+    def __init__(self, valores, codigos, nombres, años):
+        self.valores = valores
+        self.codigos = list(codigos)
+        self.nombres = dict(zip(codigos, nombres))
+        self.años = np.asarray(años)
+        self._filas = {codigo: fila for fila, codigo in enumerate(self.codigos)}
+        self.es_agregado = np.array([codigo in self.AGREGADOS for codigo in self.codigos])
+
+    def __contains__(self, codigo):
+        return codigo in self._filas
+
+    # ---- Carga ----
+    @staticmethod
+    def leer_csv(ruta=None):
+        """Parsea el CSV del Banco Mundial: (valores, códigos, nombres, años)."""
+        with open(ruta or TablaPIB.ARCHIVO, encoding='utf-8-sig', newline='') as archivo:
+            filas = csv.reader(archivo)
+            cabecera = next(filas)
+            # Las columnas de años empiezan en la quinta; la última suele venir vacía
+            columnas = [indice for indice, nombre in enumerate(cabecera) if nombre.strip().isdigit()]
+            codigos, nombres, valores = [], [], []
+            for fila in filas:
+                if len(fila) < len(cabecera) - 1:
+                    continue
+                nombres.append(fila[0])
+                codigos.append(fila[1])
+                valores.append([float(fila[indice]) if fila[indice] else np.nan for indice in columnas])
+        años = np.array([int(cabecera[indice]) for indice in columnas], dtype=np.int16)
+        return np.array(valores, dtype=np.float64), codigos, nombres, años
+
+    @staticmethod
+    def cargar(ruta=None, directorio=None):
+        """Tabla desde la caché binaria (mapeada en memoria); la crea si falta o el CSV cambió."""
+        ruta = ruta or TablaPIB.ARCHIVO
+        directorio = os.path.join(directorio or CACHE_DIR, 'pib')
+        ruta_valores = os.path.join(directorio, 'valores.npy')
+        ruta_meta = os.path.join(directorio, 'meta.json')
+        estado = os.stat(ruta)
+        firma = f"{TablaPIB.VERSION}:{estado.st_size}:{estado.st_mtime_ns}"
+
+        try:
+            with open(ruta_meta, encoding='utf-8') as archivo:
+                meta = json.load(archivo)
+            if meta['firma'] == firma:
+                valores = np.load(ruta_valores, mmap_mode='r')
+                return TablaPIB(valores, meta['codigos'], meta['nombres'], meta['años'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        valores, codigos, nombres, años = TablaPIB.leer_csv(ruta)
+        os.makedirs(directorio, exist_ok=True)
+        # Se escribe a temporales y se renombra: otro proceso nunca ve una caché a medias
+        sufijo = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(ruta_valores + sufijo, 'wb') as archivo:
+            np.save(archivo, valores)
+        os.replace(ruta_valores + sufijo, ruta_valores)
+        with open(ruta_meta + sufijo, 'w', encoding='utf-8') as archivo:
+            json.dump({'firma': firma, 'codigos': codigos, 'nombres': nombres, 'años': años.tolist()},
+                      archivo, ensure_ascii=False)
+        os.replace(ruta_meta + sufijo, ruta_meta)
+        return TablaPIB(np.load(ruta_valores, mmap_mode='r'), codigos, nombres, años)
+
+    # ---- Acceso ----
+    def nombre(self, codigo):
+        return self.nombres.get(codigo, codigo)
+
+    def paises(self):
+        """Códigos de los países (sin regiones ni grupos)."""
+        return [codigo for codigo, agregado in zip(self.codigos, self.es_agregado) if not agregado]
+
+    def regiones(self):
+        """Códigos de las regiones y grupos que el Banco Mundial ya trae sumados."""
+        return [codigo for codigo, agregado in zip(self.codigos, self.es_agregado) if agregado]
+
+    def filas(self, codigos):
+        """Índices de fila de unos códigos (KeyError si alguno no existe)."""
+        return np.array([self._filas[codigo] for codigo in codigos], dtype=np.intp)
+
+    def columna(self, año):
+        columna = int(año) - int(self.años[0])
+        if not 0 <= columna < len(self.años):
+            raise KeyError(año)
+        return columna
+
+    def _tramo(self, desde=None, hasta=None):
+        inicio = self.columna(desde) if desde is not None else 0
+        fin = self.columna(hasta) + 1 if hasta is not None else len(self.años)
+        return slice(inicio, fin)
+
+    def series(self, codigos, desde=None, hasta=None, rellenar=None):
+        """(años, matriz) con una fila por código; `rellenar` como en `TablaPIB.rellenar`."""
+        tramo = self._tramo(desde, hasta)
+        valores = self.valores[self.filas(codigos)]
+        if rellenar:
+            # Se rellena con la serie completa para aprovechar datos fuera del tramo
+            valores = self.rellenar(valores, rellenar)
+        return self.años[tramo], np.asarray(valores[:, tramo])
+
+    # ---- Consultas vectorizadas ----
+    @staticmethod
+    def rellenar(valores, metodo='interpolar'):
+        """Rellena los huecos de cada fila a lo largo de los años.
+
+        'anterior' repite el último dato conocido; 'interpolar' une linealmente los
+        datos a ambos lados del hueco. Antes del primer dato no se inventa nada.
+        """
+        valores = np.asarray(valores, dtype=np.float64)
+        matriz = np.atleast_2d(valores)
+        validos = ~np.isnan(matriz)
+        n = matriz.shape[1]
+        columnas = np.arange(n)
+        filas = np.arange(matriz.shape[0])[:, None]
+
+        previo = np.maximum.accumulate(np.where(validos, columnas, -1), axis=1)
+        anterior = np.where(previo >= 0, matriz[filas, np.maximum(previo, 0)], np.nan)
+        if metodo == 'anterior':
+            return anterior.reshape(valores.shape)
+        if metodo != 'interpolar':
+            raise ValueError(f"Método de relleno desconocido: {metodo}")
+
+        siguiente = np.minimum.accumulate(np.where(validos, columnas, n)[:, ::-1], axis=1)[:, ::-1]
+        posterior = np.where(siguiente < n, matriz[filas, np.minimum(siguiente, n - 1)], np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            interpolado = anterior + (posterior - anterior) * (columnas - previo) / (siguiente - previo)
+        return np.where(validos, matriz, interpolado).reshape(valores.shape)
+
+    def crecimiento(self, periodos=1, codigos=None, rellenar=None):
+        """(años, tasas): crecimiento anualizado respecto a `periodos` años antes (0.05 = 5 %)."""
+        valores = self.valores if codigos is None else self.valores[self.filas(codigos)]
+        if rellenar:
+            valores = self.rellenar(valores, rellenar)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tasas = (valores[:, periodos:] / valores[:, :-periodos]) ** (1 / periodos) - 1
+        tasas[~np.isfinite(tasas)] = np.nan
+        return self.años[periodos:], tasas
+
+    def cagr(self, codigos, desde, hasta):
+        """Crecimiento anual compuesto entre dos años (NaN si falta alguno de los extremos)."""
+        valores = self.valores[self.filas(codigos)]
+        inicio, fin = valores[:, self.columna(desde)], valores[:, self.columna(hasta)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (fin / inicio) ** (1 / max(int(hasta) - int(desde), 1)) - 1
+
+    def posiciones(self, solo_paises=True):
+        """Matriz de puestos (1 = mayor PIB) de cada fila en cada año; 0 donde no hay dato."""
+        valores = self.valores[~self.es_agregado] if solo_paises else np.asarray(self.valores)
+        huecos = np.isnan(valores)
+        orden = np.argsort(np.where(huecos, np.inf, -valores), axis=0, kind='stable')
+        puestos = np.empty_like(orden)
+        np.put_along_axis(
+            puestos, orden, np.broadcast_to(np.arange(1, len(valores) + 1)[:, None], orden.shape), axis=0
+        )
+        puestos[huecos] = 0
+        return puestos
+
+    def ranking(self, año, limite=10, metrica='pib', solo_paises=True):
+        """Los `limite` primeros de un año por PIB o por crecimiento respecto al año anterior."""
+        columna = self.columna(año)
+        if metrica == 'pib':
+            valores = np.asarray(self.valores[:, columna])
+        elif metrica == 'crecimiento':
+            if columna == 0:
+                return []
+            valores = self.crecimiento()[1][:, columna - 1]
+        else:
+            raise ValueError(f"Métrica desconocida: {metrica}")
+
+        candidatos = ~np.isnan(valores)
+        if solo_paises:
+            candidatos &= ~self.es_agregado
+        filas = np.flatnonzero(candidatos)
+        mejores = filas[np.argsort(-valores[filas], kind='stable')[:limite]]
+        return [
+            {'puesto': puesto, 'codigo': self.codigos[fila], 'nombre': self.nombres[self.codigos[fila]],
+             metrica: float(valores[fila])}
+            for puesto, fila in enumerate(mejores, start=1)
+        ]
+
+    def agregar(self, grupos, desde=None, hasta=None):
+        """Suma el PIB de grupos arbitrarios de países (dict nombre -> códigos).
+
+        Devuelve {'años': ..., 'grupos': {nombre: {'pib': ..., 'cobertura': ...}}}, donde
+        `cobertura` es la fracción de miembros con dato cada año (la suma solo cuenta
+        esos). Un año sin ningún miembro con dato queda en NaN.
+        """
+        tramo = self._tramo(desde, hasta)
+        valores = np.asarray(self.valores[:, tramo])
+        presentes = ~np.isnan(valores)
+        miembros = np.zeros((len(grupos), len(self.codigos)))
+        for indice, codigos in enumerate(grupos.values()):
+            miembros[indice, self.filas(codigos)] = 1
+
+        sumas = miembros @ np.where(presentes, valores, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cobertura = (miembros @ presentes) / miembros.sum(axis=1, keepdims=True)
+        sumas[~(cobertura > 0)] = np.nan
+        return {
+            'años': self.años[tramo],
+            'grupos': {
+                nombre: {'pib': sumas[indice], 'cobertura': cobertura[indice]}
+                for indice, nombre in enumerate(grupos)
+            },
+        }
+
+    def participacion(self, codigos, año):
+        """Fracción del PIB mundial de cada código en un año."""
+        columna = self.columna(año)
+        mundo = self.valores[self._filas[self.MUNDO], columna]
+        return np.asarray(self.valores[self.filas(codigos), columna]) / mundo
+
+    def cobertura(self, solo_paises=True):
+        """Fracción de países con dato en cada año."""
+        valores = self.valores[~self.es_agregado] if solo_paises else self.valores
+        return (~np.isnan(valores)).mean(axis=0)
+
+
+@st.cache_resource(show_spinner=False)
+def tabla_pib():
+    """Tabla del PIB compartida por todas las sesiones (mapeada desde la caché binaria)."""
+    return TablaPIB.cargar()
 
 
 # ==================== INTERFAZ STREAMLIT ====================
-def main():
-    st.title("🎨 Arty - Tu Asistente de Arte IA")
-    st.markdown("*Explora el mundo del arte: poesía, pintura, cine y cultura*")
+# Resultados de los proveedores que cada sesión guarda para sus reruns
+MEMO_SESION_TTL = 10 * 60
+MEMO_SESION_MAX = 32
+
+
+def modulo_interfaz(funcion):
+    """Convierte un módulo de la interfaz en `st.fragment`: sus widgets solo lo vuelven a ejecutar a él.
+
+    Cada ejecución se mide en la telemetría como ('interfaz', nombre del módulo).
+    """
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        with telemetria().medir('interfaz', funcion.__name__):
+            return funcion(*args, **kwargs)
+    return st.fragment(envoltura)
+
+
+def _memo_sesion():
+    if '_memo' not in st.session_state:
+        st.session_state._memo = CacheMemoria(ttl=MEMO_SESION_TTL, max_entradas=MEMO_SESION_MAX)
+    return st.session_state._memo
+
+
+def _clave_sesion(funcion, *args, **kwargs):
+    return json.dumps([funcion.__qualname__, args, kwargs], sort_keys=True, default=str, ensure_ascii=False)
+
+
+def en_sesion(funcion, *args, **kwargs):
+    """`funcion(*args, **kwargs)` una sola vez por sesión y argumentos; los reruns reutilizan el resultado.
+
+    Solo se memorizan las consultas que salieron bien: un resultado vacío o uno
+    obtenido mientras algún proveedor avisaba de un error se vuelve a pedir.
+    """
+    memo = _memo_sesion()
+    clave = _clave_sesion(funcion, *args, **kwargs)
+    guardado = memo.obtener(clave)
+    if guardado is not None:
+        return guardado
     
-    # Sidebar para selección de módulo
-    st.sidebar.title("🎯 Selecciona una función")
-    modulo = st.sidebar.radio(
-        "¿Qué quieres hacer?",
-        ["✍️ Ayuda con Poesía", "🖼️ Identificar Pinturas", "🎬 Recomendaciones de Películas", "👤 Info de Artistas/Directores"]
+    errores = errores_mostrados()
+    resultado = funcion(*args, **kwargs)
+    if errores_mostrados() == errores and not es_vacio(resultado):
+        memo.guardar(clave, resultado)
+    return resultado
+
+
+def olvidar_en_sesion(funcion, *args, **kwargs):
+    """Descarta lo memorizado para esos argumentos (la próxima vez se pide de nuevo)."""
+    _memo_sesion().descartar(_clave_sesion(funcion, *args, **kwargs))
+
+
+def peliculas_en_sesion(stream, consulta, cantidad, filtros=None):
+    """Películas de `stream(consulta, cantidad, filtros)`, memorizadas en la sesión.
+
+    Si ya se pidieron al menos `cantidad` (o se sabe que no hay más) se recorta lo
+    guardado sin volver a TMDb; si no, se piden otra vez y se entregan según llegan.
+    """
+    memo = _memo_sesion()
+    clave = _clave_sesion(stream, consulta, filtros)
+    guardado = memo.obtener(clave)
+    if guardado and (len(guardado['peliculas']) >= cantidad or guardado['completo']):
+        yield from guardado['peliculas'][:cantidad]
+        return
+    
+    peliculas = []
+    errores = errores_mostrados()
+    for pelicula in stream(consulta, cantidad, filtros):
+        peliculas.append(pelicula)
+        yield pelicula
+    # Si TMDb falló a mitad, la lista corta no significa que no haya más
+    if errores_mostrados() == errores and peliculas:
+        memo.guardar(clave, {'peliculas': peliculas, 'completo': len(peliculas) < cantidad})
+
+
+def mostrar_panel_depuracion():
+    """Resumen de las métricas del proceso en la barra lateral."""
+    datos = telemetria().instantanea()
+    
+    def ms(segundos):
+        return None if segundos is None else round(segundos * 1000)
+    
+    panel = st.sidebar.expander("🔧 Métricas de los proveedores", expanded=True)
+    
+    panel.caption(f"Desde hace {(time.time() - datos['desde']) / 60:.0f} min (todas las sesiones)")
+    panel.markdown("**Llamadas**")
+    panel.dataframe([
+        {
+            'operación': f"{fila['proveedor']}.{fila['operacion']}",
+            'n': fila['llamadas'],
+            'p50 ms': ms(fila['p50']),
+            'p95 ms': ms(fila['p95']),
+            **{resultado: fila['resultados'].get(resultado, 0) for resultado in ('vacio', 'error', 'timeout')},
+        }
+        for fila in datos['operaciones']
+    ], hide_index=True)
+    
+    panel.markdown("**HTTP**")
+    panel.dataframe([
+        {
+            'host': fila['host'],
+            'operación': fila['operacion'] or '—',
+            'n': fila['peticiones'],
+            'p95 ms': ms(fila['p95']),
+            'estados': ', '.join(f"{estado}×{cantidad}" for estado, cantidad in sorted(fila['estados'].items())),
+            'KB': round(fila['bytes'] / 1024),
+        }
+        for fila in datos['http']
+    ], hide_index=True)
+    panel.dataframe([
+        {'host': host, 'conexiones nuevas': cuenta['conexiones_nuevas'], 'reutilizadas': cuenta['reutilizadas'],
+         'reintentos': cuenta['reintentos']}
+        for host, cuenta in datos['conexiones'].items()
+    ], hide_index=True)
+    
+    panel.markdown("**Llamadas compartidas entre sesiones**")
+    panel.dataframe([
+        {'operación': operacion, 'llamadas': cuenta['llamadas'], 'colapsadas': cuenta['colapsadas']}
+        for operacion, cuenta in datos['vuelo_unico'].items()
+    ], hide_index=True)
+    
+    planificador = planificador_gemini() if GEMINI_API_KEY else None
+    if planificador:
+        estado = planificador.estado()
+        panel.markdown(f"**Gemini** · en cola: {estado['en_cola']} (máx. {estado['cola_maxima']})")
+        panel.dataframe([
+            {'modelo': nombre, 'espera s': espera, 'llamadas': estado['contadores'].get(nombre, 0),
+             'sin cuota': estado['contadores'].get(f"sin cuota: {nombre}", 0)}
+            for nombre, espera in estado['modelos'].items()
+        ], hide_index=True)
+    
+    panel.markdown("**Cachés**")
+    panel.dataframe([
+        {'caché': nombre, 'entradas': cache['entradas'], 'aciertos': cache['aciertos'], 'tasa': cache['tasa_aciertos']}
+        for nombre, cache in datos['caches'].items()
+    ], hide_index=True)
+    
+    perfil = perfil_arranque()
+    panel.markdown("**Arranque**")
+    panel.dataframe(
+        [{'etapa': etapa, 'ms': round(segundos * 1000, 1)} for etapa, segundos in perfil.etapas]
+        + [{'etapa': f"{modulo} (al primer uso)", 'ms': round(segundos * 1000, 1)} for modulo, segundos in perfil.diferidas.items()],
+        hide_index=True
     )
     
-    st.sidebar.markdown("---")
-    st.sidebar.info("💡 **Tip:** Este asistente usa IA y múltiples APIs de museos y bases de datos culturales.")
+    url_metricas = exportador_metricas()
+    if url_metricas:
+        panel.markdown(f"[Prometheus]({url_metricas}/metricas) · [JSON]({url_metricas}/metricas.json)")
+    panel.download_button(
+        "Descargar JSON", json.dumps(datos, ensure_ascii=False, indent=2),
+        file_name="arty_metricas.json", mime="application/json"
+    )
+
+
+# ==================== INTERFAZ: POESÍA ====================
+@modulo_interfaz
+def modulo_poesia():
+    """Ayuda para redactar poemas, contador de sílabas y revisión de métrica y rima."""
+    st.header("✍️ Asistente de Redacción Poética")
     
-    # ==================== MÓDULO 1: POESÍA ====================
-    if modulo == "✍️ Ayuda con Poesía":
-        st.header("✍️ Asistente de Redacción Poética")
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        st.subheader("Tu idea poética")
+        idea = st.text_area(
+            "Escribe tu idea, sentimiento o tema que quieres expresar:",
+            height=150,
+            placeholder="Ejemplo: Quiero escribir sobre la melancolía del otoño y las hojas cayendo..."
+        )
+    
+    with col2:
+        st.subheader("Estructura deseada")
+        estructura = st.selectbox(
+            "Elige la estructura poética:",
+            list(PoetryAssistant.ESTRUCTURAS.keys())
+        )
         
-        col1, col2 = st.columns([2, 1])
+        # Mostrar información de la estructura
+        info_estructura = PoetryAssistant.ESTRUCTURAS[estructura]
+        st.info(f"**{estructura}**\n\n{info_estructura['descripcion']}")
+    
+    respuesta_nueva = st.checkbox(
+        "🔄 Pedir una respuesta nueva",
+        help="Ignora las sugerencias guardadas para esta misma idea y estructura"
+    )
+    
+    if st.button("🎯 Ayudarme a redactar", type="primary"):
+        if not idea:
+            st.warning("⚠️ Por favor escribe tu idea primero")
+        else:
+            fragmentos = PoetryAssistant.ayudar_con_poesia_stream(idea, estructura, usar_cache=not respuesta_nueva)
+            mensaje = "✨ Analizando tu idea y preparando sugerencias..."
+            planificador = planificador_gemini()
+            if planificador:
+                prioridad = PoetryAssistant._prioridad(not respuesta_nueva, None)
+                espera = planificador.estimar_espera(prioridad)
+                if espera >= 1:
+                    mensaje = (
+                        f"⏳ Hay {planificador.en_cola(prioridad)} peticiones a Gemini antes que la tuya; "
+                        f"espera estimada: ~{espera:.0f} s"
+                    )
+            # El spinner solo dura hasta que llega el primer fragmento
+            with st.spinner(mensaje):
+                ayuda = next(fragmentos, "")
+            st.markdown("### 📝 Sugerencias para tu poema")
+            zona_ayuda = st.empty()
+            zona_ayuda.markdown(ayuda)
+            for fragmento in fragmentos:
+                ayuda += fragmento
+                zona_ayuda.markdown(ayuda + "▌")
+            zona_ayuda.markdown(ayuda)
+            st.session_state.poesia_ayuda = ayuda
+    elif st.session_state.get('poesia_ayuda'):
+        # Usar el contador o el revisor no debe borrar (ni volver a pedir) las sugerencias
+        st.markdown("### 📝 Sugerencias para tu poema")
+        st.markdown(st.session_state.poesia_ayuda)
+    
+    # Sección de contador de sílabas
+    st.markdown("---")
+    st.subheader("🔢 Contador de Sílabas")
+    verso_test = st.text_input("Escribe un verso para contar sus sílabas:")
+    if verso_test:
+        silabas = PoetryAssistant.contar_silabas(verso_test)
+        st.success(f"**{silabas} sílabas métricas** (con sinalefas y acento final)")
+    
+    # Validación del poema completo contra la estructura elegida
+    st.markdown("---")
+    st.subheader(f"📏 Revisa tu poema ({estructura})")
+    poema = st.text_area("Pega aquí tu poema, un verso por línea:", height=200)
+    if poema.strip():
+        validacion = PoetryAssistant.validar_poema(poema, estructura)
+        if not validacion['numero_versos_ok']:
+            st.warning(f"⚠️ Tiene {validacion['versos_encontrados']} versos; un(a) {estructura} lleva {validacion['versos_esperados']}")
+        for numero, linea in enumerate(validacion['detalle'], 1):
+            esperadas = f" / {' o '.join(map(str, linea['esperadas']))}" if linea['esperadas'] else ""
+            icono = "✅" if linea['ok'] and linea.get('rima_ok', True) else "❌"
+            rima = ""
+            if linea.get('letra'):
+                rima = f" · rima **{linea['letra']}**" + (f" ({linea['rima']})" if linea.get('rima') else "")
+            st.markdown(f"{icono} **{numero}.** {linea['verso']} — *{linea['silabas']}{esperadas} sílabas*{rima}")
+        if validacion['esquema_detectado']:
+            st.caption(f"Esquema esperado: {validacion['esquema']} · esquema de tu poema: {validacion['esquema_detectado']}")
+        if validacion['ok']:
+            st.success("🎉 ¡La métrica y la rima encajan con la estructura!")
+    
+    palabra_rima = st.text_input("🔁 Buscar rimas para la palabra:")
+    if palabra_rima.strip():
+        consonantes = PoetryAssistant.sugerir_rimas(palabra_rima, 'consonante')
+        asonantes = PoetryAssistant.sugerir_rimas(palabra_rima, 'asonante')
+        st.markdown(f"**Consonantes:** {', '.join(consonantes) if consonantes else '—'}")
+        st.markdown(f"**Asonantes:** {', '.join(asonantes) if asonantes else '—'}")
+
+
+# ==================== INTERFAZ: IDENTIFICAR PINTURAS ====================
+@modulo_interfaz
+def modulo_pinturas(miniatura):
+    """Búsqueda de obras en los museos, paginada."""
+    st.header("🖼️ Identificador de Pinturas")
+    st.markdown("Busca información sobre pinturas famosas por título, artista o descripción")
+    
+    busqueda = st.text_input(
+        "🔍 Buscar pintura:",
+        placeholder="Ejemplo: La noche estrellada, Mona Lisa, Guernica..."
+    )
+    en_vivo = st.checkbox("Consultar los museos en vivo", help="Ignora el índice local y vuelve a preguntar a los museos")
+
+    def mostrar_obra(resultado, expandida=False):
+        with st.expander(f"📌 {resultado['titulo']} - {resultado['fuente']}", expanded=expandida):
+            col1, col2 = st.columns([1, 2])
+            
+            with col1:
+                if resultado.get('imagen'):
+                    st.image(miniatura(resultado['imagen'], 300), width=300)
+                else:
+                    st.info("Sin imagen disponible")
+            
+            with col2:
+                st.markdown(f"**🎨 Título:** {resultado['titulo']}")
+                st.markdown(f"**👤 Artista:** {resultado['artista']}")
+                st.markdown(f"**📅 Año:** {resultado['año']}")
+                
+                if resultado.get('cultura') and resultado.get('cultura') != 'N/A':
+                    st.markdown(f"**🌍 Cultura:** {resultado['cultura']}")
+                if resultado.get('medio') and resultado.get('medio') != 'N/A':
+                    st.markdown(f"**🖌️ Medio:** {resultado['medio']}")
+                if resultado.get('dimensiones') and resultado.get('dimensiones') != 'N/A':
+                    st.markdown(f"**📏 Dimensiones:** {resultado['dimensiones']}")
+                if resultado.get('departamento') and resultado.get('departamento') != 'N/A':
+                    st.markdown(f"**🏛️ Departamento:** {resultado['departamento']}")
+                
+                if resultado.get('url_museo'):
+                    st.markdown(f"[🔗 Ver en museo]({resultado['url_museo']})")
+                
+                st.caption(f"Fuente: {', '.join(resultado.get('fuentes') or [resultado['fuente']])}")
+    
+    def cargar_mas():
+        st.session_state.pinturas_cargar = True
+    
+    if st.button("🔎 Buscar", type="primary"):
+        if busqueda:
+            # La búsqueda es un cursor: cada página se pide a los museos solo cuando hace falta
+            st.session_state.pinturas = ArtIdentifier.nueva_busqueda(busqueda, usar_indice=not en_vivo)
+            st.session_state.pinturas_cargar = True
+        else:
+            st.warning("⚠️ Por favor ingresa un término de búsqueda")
+    
+    cursor = st.session_state.get('pinturas')
+    if cursor:
+        resumen = st.empty()
+        zona = st.empty()
+        contenedor = zona.container()
+        with contenedor:
+            for resultado in cursor.resultados:
+                mostrar_obra(resultado, expandida=resultado is cursor.resultados[0])
         
-        with col1:
-            st.subheader("Tu idea poética")
-            idea = st.text_area(
-                "Escribe tu idea, sentimiento o tema que quieres expresar:",
-                height=150,
-                placeholder="Ejemplo: Quiero escribir sobre la melancolía del otoño y las hojas cayendo..."
-            )
+        if st.session_state.pop('pinturas_cargar', False):
+            with contenedor:
+                with st.spinner("🎨 Buscando en museos de todo el mundo..."):
+                    # Cada obra se pinta en cuanto llega, sin esperar al resto de la página
+                    for resultado in cursor.siguiente_pagina():
+                        mostrar_obra(resultado, expandida=resultado is cursor.resultados[0])
+            # Con la página completa se vuelven a pintar, ya ordenadas por puntuación
+            with zona.container():
+                for resultado in cursor.resultados:
+                    mostrar_obra(resultado, expandida=resultado is cursor.resultados[0])
         
-        with col2:
-            st.subheader("Estructura deseada")
-            estructura = st.selectbox(
-                "Elige la estructura poética:",
-                list(PoetryAssistant.ESTRUCTURAS.keys())
-            )
+        if cursor.resultados:
+            origen = " del índice local" if cursor.desde_indice else ""
+            resumen.success(f"✅ {len(cursor.resultados)} resultado(s){origen} para «{cursor.query}»")
+            if cursor.hay_mas:
+                st.button("⬇️ Cargar más resultados", on_click=cargar_mas)
+        else:
+            resumen.warning("❌ No se encontraron resultados. Intenta con otro término de búsqueda.")
+
+
+# ==================== INTERFAZ: RECOMENDACIONES DE PELÍCULAS ====================
+@modulo_interfaz
+def modulo_peliculas(miniatura):
+    """Recomendaciones de TMDb por género o por temática."""
+    st.header("🎬 Recomendador de Películas")
+    
+    tipo_busqueda = st.radio("Buscar por:", ["Género", "Temática específica"])
+    
+    # Mantiene al día la tabla local de géneros mientras el proceso esté vivo
+    MovieRecommender.iniciar_refresco_periodico()
+    
+    def mostrar_pelicula(pelicula):
+        with st.expander(f"🎬 {pelicula['titulo']} ({pelicula['año']}) - ⭐ {pelicula['valoracion']}/10"):
+            col1, col2 = st.columns([1, 3])
             
-            # Mostrar información de la estructura
-            info_estructura = PoetryAssistant.ESTRUCTURAS[estructura]
-            st.info(f"**{estructura}**\n\n{info_estructura['descripcion']}")
-        
-        if st.button("🎯 Ayudarme a redactar", type="primary"):
-            if not idea:
-                st.warning("⚠️ Por favor escribe tu idea primero")
-            else:
-                with st.spinner("✨ Analizando tu idea y preparando sugerencias..."):
-                    ayuda = PoetryAssistant.ayudar_con_poesia(idea, estructura)
-                    st.markdown("### 📝 Sugerencias para tu poema")
-                    st.markdown(ayuda)
-        
-        # Sección de contador de sílabas
-        st.markdown("---")
-        st.subheader("🔢 Contador de Sílabas")
-        verso_test = st.text_input("Escribe un verso para contar sus sílabas:")
-        if verso_test:
-            silabas = PoetryAssistant.contar_silabas(verso_test)
-            st.success(f"**{silabas} sílabas** (aproximado)")
-    
-    # ==================== MÓDULO 2: IDENTIFICAR PINTURAS ====================
-    elif modulo == "🖼️ Identificar Pinturas":
-        st.header("🖼️ Identificador de Pinturas")
-        st.markdown("Busca información sobre pinturas famosas por título, artista o descripción")
+            with col1:
+                if pelicula['poster']:
+                    st.image(miniatura(pelicula['poster'], 300), width=300)
+            
+            with col2:
+                st.markdown(f"**Año:** {pelicula['año']}")
+                st.markdown(f"**Valoración:** ⭐ {pelicula['valoracion']}/10")
+                st.markdown(f"**Sinopsis:** {pelicula['sinopsis']}")
+    
+    def mostrar_en_vivo(peliculas):
+        """Pinta cada película en cuanto llega y devuelve cuántas se mostraron."""
+        total = 0
+        for pelicula in peliculas:
+            mostrar_pelicula(pelicula)
+            total += 1
+        return total
+    
+    def pedir_filtros():
+        with st.expander("🎛️ Filtros"):
+            valoracion_minima = st.slider("Valoración mínima", 0.0, 10.0, 0.0, 0.5)
+            año_actual = datetime.now().year
+            año_desde, año_hasta = st.slider("Años de estreno", 1900, año_actual, (1900, año_actual))
+        filtros = {}
+        if valoracion_minima:
+            filtros['valoracion_minima'] = valoracion_minima
+        if año_desde > 1900:
+            filtros['año_desde'] = año_desde
+        if año_hasta < datetime.now().year:
+            filtros['año_hasta'] = año_hasta
+        return filtros or None
+    
+    if tipo_busqueda == "Género":
+        generos_disponibles = list(set(MovieRecommender.GENEROS.values()))
+        genero = st.selectbox("Selecciona un género:", sorted(generos_disponibles))
+        cantidad = st.slider("¿Cuántas películas quieres?", 1, 300, 10)
+        filtros = pedir_filtros()
         
-        busqueda = st.text_input(
-            "🔍 Buscar pintura:",
-            placeholder="Ejemplo: La noche estrellada, Mona Lisa, Guernica..."
-        )
+        if st.button("🎥 Recomendar", type="primary"):
+            st.session_state.peliculas_consulta = ('genero', genero, filtros)
+            olvidar_en_sesion(MovieRecommender.recomendar_por_genero_stream, genero, filtros)
         
-        if st.button("🔎 Buscar", type="primary"):
-            if busqueda:
-                with st.spinner("🎨 Buscando en museos de todo el mundo..."):
-                    resultados = ArtIdentifier.identificar_pintura(busqueda)
-                    
-                    if resultados:
-                        st.success(f"✅ Encontrados {len(resultados)} resultado(s)")
-                        
-                        for i, resultado in enumerate(resultados):
-                            with st.expander(f"📌 {resultado['titulo']} - {resultado['fuente']}", expanded=(i==0)):
-                                col1, col2 = st.columns([1, 2])
-                                
-                                with col1:
-                                    if resultado.get('imagen'):
-                                        # Usar markdown para mostrar imagen desde URL
-                                        st.markdown(f"[![{resultado['titulo']}]({resultado['imagen']})]({resultado.get('url_museo', resultado['imagen'])})", unsafe_allow_html=True)
-                                    else:
-                                        st.info("Sin imagen disponible")
-                                
-                                with col2:
-                                    st.markdown(f"**🎨 Título:** {resultado['titulo']}")
-                                    st.markdown(f"**👤 Artista:** {resultado['artista']}")
-                                    st.markdown(f"**📅 Año:** {resultado['año']}")
-                                    
-                                    if resultado.get('cultura') and resultado.get('cultura') != 'N/A':
-                                        st.markdown(f"**🌍 Cultura:** {resultado['cultura']}")
-                                    if resultado.get('medio') and resultado.get('medio') != 'N/A':
-                                        st.markdown(f"**🖌️ Medio:** {resultado['medio']}")
-                                    if resultado.get('dimensiones') and resultado.get('dimensiones') != 'N/A':
-                                        st.markdown(f"**📏 Dimensiones:** {resultado['dimensiones']}")
-                                    if resultado.get('departamento') and resultado.get('departamento') != 'N/A':
-                                        st.markdown(f"**🏛️ Departamento:** {resultado['departamento']}")
-                                    
-                                    if resultado.get('url_museo'):
-                                        st.markdown(f"[🔗 Ver en museo]({resultado['url_museo']})")
-                                    
-                                    st.caption(f"Fuente: {resultado['fuente']}")
+        # La última búsqueda sigue a la vista: mover la cantidad solo recorta o amplía la lista
+        consulta = st.session_state.get('peliculas_consulta')
+        if consulta and consulta[0] == 'genero':
+            _, genero_buscado, filtros_buscados = consulta
+            resumen = st.empty()
+            with st.spinner("🎬 Buscando las mejores películas..."):
+                total = mostrar_en_vivo(peliculas_en_sesion(
+                    MovieRecommender.recomendar_por_genero_stream, genero_buscado, cantidad, filtros_buscados
+                ))
+            
+            if total:
+                resumen.success(f"✅ {total} recomendaciones de {genero_buscado}")
+                estado = MovieRecommender.estado_genero(genero_buscado)
+                if estado:
+                    horas = estado['antiguedad'] / 3600
+                    hace = f"hace {horas:.0f} h" if horas >= 1 else f"hace {estado['antiguedad'] / 60:.0f} min"
+                    if estado['vencido']:
+                        st.caption(f"🕒 Ranking guardado {hace}; actualizándose en segundo plano")
                     else:
-                        st.warning("❌ No se encontraron resultados. Intenta con otro término de búsqueda.")
+                        st.caption(f"🕒 Ranking local actualizado {hace}")
             else:
-                st.warning("⚠️ Por favor ingresa un término de búsqueda")
+                resumen.error("❌ No se pudieron obtener recomendaciones")
     
-    # ==================== MÓDULO 3: RECOMENDACIONES DE PELÍCULAS ====================
-    elif modulo == "🎬 Recomendaciones de Películas":
-        st.header("🎬 Recomendador de Películas")
+    else:  # Temática específica
+        tematica = st.text_input(
+            "🔍 Buscar por temática:",
+            placeholder="Ejemplo: vampiros, segunda guerra mundial, viajes en el tiempo..."
+        )
+        cantidad = st.slider("¿Cuántas películas quieres?", 1, 300, 10)
+        filtros = pedir_filtros()
         
-        tipo_busqueda = st.radio("Buscar por:", ["Género", "Temática específica"])
+        if st.button("🎥 Buscar", type="primary"):
+            if tematica:
+                st.session_state.peliculas_consulta = ('tematica', tematica, filtros)
+                olvidar_en_sesion(MovieRecommender.buscar_por_tematica_stream, tematica, filtros)
+            else:
+                st.warning("⚠️ Por favor ingresa una temática")
         
-        if tipo_busqueda == "Género":
-            generos_disponibles = list(set(MovieRecommender.GENEROS.values()))
-            genero = st.selectbox("Selecciona un género:", sorted(generos_disponibles))
-            cantidad = st.slider("¿Cuántas películas quieres?", 1, 10, 5)
+        consulta = st.session_state.get('peliculas_consulta')
+        if consulta and consulta[0] == 'tematica':
+            _, tematica_buscada, filtros_buscados = consulta
+            resumen = st.empty()
+            with st.spinner("🎬 Buscando películas relacionadas..."):
+                total = mostrar_en_vivo(peliculas_en_sesion(
+                    MovieRecommender.buscar_por_tematica_stream, tematica_buscada, cantidad, filtros_buscados
+                ))
             
-            if st.button("🎥 Recomendar", type="primary"):
-                with st.spinner("🎬 Buscando las mejores películas..."):
-                    peliculas = MovieRecommender.recomendar_por_genero(genero, cantidad)
+            if total:
+                resumen.success(f"✅ {total} películas encontradas sobre '{tematica_buscada}'")
+            else:
+                resumen.error("❌ No se encontraron películas")
+
+
+# ==================== INTERFAZ: INFO DE ARTISTAS ====================
+@modulo_interfaz
+def modulo_artistas(miniatura):
+    """Biografías de directores (TMDb + Wikipedia) y de otros artistas (Wikipedia)."""
+    st.header("👤 Información de Artistas y Directores")
+    
+    tipo_artista = st.radio("Tipo de artista:", ["🎬 Director de Cine", "🎨 Pintor/Escritor (General)"])
+    
+    nombre = st.text_input(
+        "Nombre del artista:",
+        placeholder="Ejemplo: Frida Kahlo, Gabriel García Márquez, Steven Spielberg..."
+    )
+    
+    if st.button("🔍 Buscar Información", type="primary"):
+        if nombre:
+            st.session_state.artista_consulta = (tipo_artista, nombre)
+            buscar = ArtistInfo.buscar_director if tipo_artista == "🎬 Director de Cine" else ArtistInfo.buscar_en_wikipedia
+            olvidar_en_sesion(buscar, nombre)
+        else:
+            st.warning("⚠️ Por favor ingresa el nombre del artista")
+    
+    # La ficha sigue a la vista en los reruns y no se vuelve a pedir a TMDb ni a Wikipedia
+    consulta = st.session_state.get('artista_consulta')
+    if consulta:
+        tipo_buscado, nombre_buscado = consulta
+        with st.spinner(f"📚 Buscando información sobre {nombre_buscado}..."):
+            if tipo_buscado == "🎬 Director de Cine":
+                # TMDb y Wikipedia en paralelo; Wikipedia solo se usa si hace falta
+                info = en_sesion(ArtistInfo.buscar_director, nombre_buscado)
+                info_tmdb, info_wiki = info['tmdb'], info['wikipedia']
+                
+                if info_tmdb:
+                    st.success(f"✅ Información encontrada: {info_tmdb['nombre']}")
                     
-                    if peliculas:
-                        st.success(f"✅ {len(peliculas)} recomendaciones de {genero}")
-                        
-                        for pelicula in peliculas:
-                            with st.expander(f"🎬 {pelicula['titulo']} ({pelicula['año']}) - ⭐ {pelicula['valoracion']}/10"):
-                                col1, col2 = st.columns([1, 3])
-                                
-                                with col1:
-                                    if pelicula['poster']:
-                                        st.image(pelicula['poster'], width=300)
-                                
-                                with col2:
-                                    st.markdown(f"**Año:** {pelicula['año']}")
-                                    st.markdown(f"**Valoración:** ⭐ {pelicula['valoracion']}/10")
-                                    st.markdown(f"**Sinopsis:** {pelicula['sinopsis']}")
-                    else:
-                        st.error("❌ No se pudieron obtener recomendaciones")
-        
-        else:  # Temática específica
-            tematica = st.text_input(
-                "🔍 Buscar por temática:",
-                placeholder="Ejemplo: vampiros, segunda guerra mundial, viajes en el tiempo..."
-            )
-            cantidad = st.slider("¿Cuántas películas quieres?", 1, 10, 5)
+                    col1, col2 = st.columns([1, 2])
+                    
+                    with col1:
+                        if info_tmdb.get('imagen'):
+                            st.image(miniatura(info_tmdb['imagen'], 300), width=300)
+                    
+                    with col2:
+                        st.markdown(f"### {info_tmdb['nombre']}")
+                        st.markdown(f"**📅 Nacimiento:** {info_tmdb['nacimiento']}")
+                        st.markdown(f"**📍 Lugar:** {info_tmdb['lugar']}")
+                    
+                    st.markdown("### 📖 Biografía")
+                    st.write(info_tmdb['biografia'] if info_tmdb['biografia'] != 'No disponible' else (info_wiki or {}).get('biografia', 'No disponible'))
+                    
+                    if info_tmdb.get('peliculas'):
+                        st.markdown("### 🎬 Películas Dirigidas")
+                        for pelicula in info_tmdb['peliculas']:
+                            st.markdown(f"- **{pelicula['titulo']}** ({pelicula['año']})")
+                
+                elif info_wiki:
+                    st.success(f"✅ Información encontrada: {info_wiki['nombre']}")
+                    
+                    if info_wiki.get('imagen'):
+                        st.image(miniatura(info_wiki['imagen'], 300), width=300)
+                    
+                    st.markdown(f"### {info_wiki['nombre']}")
+                    st.markdown("### �� Biografía")
+                    st.write(info_wiki['biografia'])
+                
+                else:
+                    st.error("❌ No se encontró información")
             
-            if st.button("🎥 Buscar", type="primary"):
-                if tematica:
-                    with st.spinner("🎬 Buscando películas relacionadas..."):
-                        peliculas = MovieRecommender.buscar_por_tematica(tematica, cantidad)
-                        
-                        if peliculas:
-                            st.success(f"✅ {len(peliculas)} películas encontradas sobre '{tematica}'")
-                            
-                            for pelicula in peliculas:
-                                with st.expander(f"🎬 {pelicula['titulo']} ({pelicula['año']}) - ⭐ {pelicula['valoracion']}/10"):
-                                    col1, col2 = st.columns([1, 3])
-                                    
-                                    with col1:
-                                        if pelicula['poster']:
-                                            st.image(pelicula['poster'], width=300)
-                                    
-                                    with col2:
-                                        st.markdown(f"**Año:** {pelicula['año']}")
-                                        st.markdown(f"**Valoración:** ⭐ {pelicula['valoracion']}/10")
-                                        st.markdown(f"**Sinopsis:** {pelicula['sinopsis']}")
-                        else:
-                            st.error("❌ No se encontraron películas")
+            else:  # Pintor/Escritor General
+                info_wiki = en_sesion(ArtistInfo.buscar_en_wikipedia, nombre_buscado)
+                
+                if info_wiki:
+                    st.success(f"✅ Información encontrada: {info_wiki['nombre']}")
+                    
+                    if info_wiki.get('imagen'):
+                        st.image(miniatura(info_wiki['imagen'], 500), width=400)
+                    
+                    st.markdown(f"### {info_wiki['nombre']}")
+                    st.markdown("### 📖 Biografía")
+                    st.write(info_wiki['biografia'])
+                    st.caption(f"Fuente: {info_wiki['fuente']}")
                 else:
-                    st.warning("⚠️ Por favor ingresa una temática")
+                    st.error("❌ No se encontró información")
+
+
+# ==================== INTERFAZ: ECONOMÍA DE LA CULTURA ====================
+@modulo_interfaz
+def modulo_economia():
+    """PIB por país y ranking, desde la tabla local del Banco Mundial."""
+    st.header("📈 Economía de la Cultura")
+    st.markdown("El PIB de cada país (US$ corrientes, Banco Mundial) para poner en contexto su producción artística.")
     
-    # ==================== MÓDULO 4: INFO DE ARTISTAS ====================
-    elif modulo == "👤 Info de Artistas/Directores":
-        st.header("👤 Información de Artistas y Directores")
-        
-        tipo_artista = st.radio("Tipo de artista:", ["🎬 Director de Cine", "🎨 Pintor/Escritor (General)"])
-        
-        nombre = st.text_input(
-            "Nombre del artista:",
-            placeholder="Ejemplo: Frida Kahlo, Gabriel García Márquez, Steven Spielberg..."
+    tabla = tabla_pib()
+    primero, ultimo = int(tabla.años[0]), int(tabla.años[-1])
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        seleccion = st.multiselect(
+            "Países o regiones:",
+            tabla.codigos,
+            default=[codigo for codigo in ('ESP', 'MEX', 'ARG', 'COL') if codigo in tabla],
+            format_func=tabla.nombre
+        )
+    with col2:
+        desde, hasta = st.slider("Años:", primero, ultimo, (max(primero, 1990), ultimo))
+        interpolar = st.checkbox("Completar años sin dato", help="Interpola entre los años conocidos")
+    
+    if seleccion:
+        años, valores = tabla.series(seleccion, desde, hasta, rellenar='interpolar' if interpolar else None)
+        st.line_chart(
+            {'año': años, **{tabla.nombre(codigo): valores[fila] / 1e9 for fila, codigo in enumerate(seleccion)}},
+            x='año'
         )
+        st.caption("Miles de millones de US$ corrientes")
         
-        if st.button("🔍 Buscar Información", type="primary"):
-            if nombre:
-                with st.spinner(f"📚 Buscando información sobre {nombre}..."):
-                    if tipo_artista == "🎬 Director de Cine":
-                        # Buscar primero en TMDb
-                        info_tmdb = ArtistInfo.buscar_director_tmdb(nombre)
-                        info_wiki = ArtistInfo.buscar_en_wikipedia(nombre)
-                        
-                        if info_tmdb:
-                            st.success(f"✅ Información encontrada: {info_tmdb['nombre']}")
-                            
-                            col1, col2 = st.columns([1, 2])
-                            
-                            with col1:
-                                if info_tmdb.get('imagen'):
-                                    st.image(info_tmdb['imagen'], width=300)
-                            
-                            with col2:
-                                st.markdown(f"### {info_tmdb['nombre']}")
-                                st.markdown(f"**📅 Nacimiento:** {info_tmdb['nacimiento']}")
-                                st.markdown(f"**📍 Lugar:** {info_tmdb['lugar']}")
-                            
-                            st.markdown("### 📖 Biografía")
-                            st.write(info_tmdb['biografia'] if info_tmdb['biografia'] != 'No disponible' else info_wiki.get('biografia', 'No disponible'))
-                            
-                            if info_tmdb.get('peliculas'):
-                                st.markdown("### 🎬 Películas Dirigidas")
-                                for pelicula in info_tmdb['peliculas']:
-                                    st.markdown(f"- **{pelicula['titulo']}** ({pelicula['año']})")
-                        
-                        elif info_wiki:
-                            st.success(f"✅ Información encontrada: {info_wiki['nombre']}")
-                            
-                            if info_wiki.get('imagen'):
-                                st.image(info_wiki['imagen'], width=300)
-                            
-                            st.markdown(f"### {info_wiki['nombre']}")
-                            st.markdown("### �� Biografía")
-                            st.write(info_wiki['biografia'])
-                        
-                        else:
-                            st.error("❌ No se encontró información")
-                    
-                    else:  # Pintor/Escritor General
-                        info_wiki = ArtistInfo.buscar_en_wikipedia(nombre)
-                        
-                        if info_wiki:
-                            st.success(f"✅ Información encontrada: {info_wiki['nombre']}")
-                            
-                            if info_wiki.get('imagen'):
-                                st.image(info_wiki['imagen'], width=400)
-                            
-                            st.markdown(f"### {info_wiki['nombre']}")
-                            st.markdown("### 📖 Biografía")
-                            st.write(info_wiki['biografia'])
-                            st.caption(f"Fuente: {info_wiki['fuente']}")
-                        else:
-                            st.error("❌ No se encontró información")
-            else:
-                st.warning("⚠️ Por favor ingresa el nombre del artista")
+        crecimientos = tabla.cagr(seleccion, desde, hasta)
+        participaciones = tabla.participacion(seleccion, hasta)
+        columnas = st.columns(min(len(seleccion), 4))
+        for fila, codigo in enumerate(seleccion[:4]):
+            ultimo_valor = valores[fila, -1]
+            columnas[fila].metric(
+                tabla.nombre(codigo),
+                f"{ultimo_valor / 1e9:,.0f} mil M US$" if not np.isnan(ultimo_valor) else "sin dato",
+                f"{crecimientos[fila]:+.1%} anual" if not np.isnan(crecimientos[fila]) else None
+            )
+            if not np.isnan(participaciones[fila]):
+                columnas[fila].caption(f"{participaciones[fila]:.2%} del PIB mundial en {hasta}")
+        
+        paises = [codigo for codigo in seleccion if codigo not in TablaPIB.AGREGADOS]
+        if len(paises) > 1:
+            suma = tabla.agregar({'selección': paises}, hasta, hasta)['grupos']['selección']
+            st.info(
+                f"Los {len(paises)} países seleccionados suman {suma['pib'][0] / 1e9:,.0f} mil M US$ en {hasta}"
+                f" (con dato: {suma['cobertura'][0]:.0%})"
+            )
+    
+    st.markdown("---")
+    st.subheader("🏆 Ranking de países")
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        año_ranking = st.slider("Año del ranking:", primero + 1, ultimo, ultimo)
+    with col2:
+        metrica = st.radio("Ordenar por:", ["PIB", "Crecimiento"], horizontal=True)
+    
+    filas = tabla.ranking(año_ranking, limite=15, metrica='pib' if metrica == "PIB" else 'crecimiento')
+    st.dataframe([
+        {
+            'puesto': fila['puesto'],
+            'país': fila['nombre'],
+            **({'PIB (mil M US$)': round(fila['pib'] / 1e9, 1)} if 'pib' in fila
+               else {'crecimiento': f"{fila['crecimiento']:+.1%}"}),
+        }
+        for fila in filas
+    ], hide_index=True)
+    st.caption(f"Países con dato en {año_ranking}: {tabla.cobertura()[tabla.columna(año_ranking)]:.0%}")
+
+
+# ==================== PÁGINA PRINCIPAL ====================
+def main():
+    st.title("🎨 Arty - Tu Asistente de Arte IA")
+    st.markdown("*Explora el mundo del arte: poesía, pintura, cine y cultura*")
+    
+    # Las imágenes remotas se muestran como miniaturas (del proxy público o por st.image)
+    miniatura = proxy_imagenes().imagen
+    # Las métricas del proceso, en su propio puerto (para Prometheus) si ARTY_METRICAS=1
+    exportador_metricas()
+    
+    # Sidebar para selección de módulo
+    st.sidebar.title("🎯 Selecciona una función")
+    modulo = st.sidebar.radio(
+        "¿Qué quieres hacer?",
+        ["✍️ Ayuda con Poesía", "🖼️ Identificar Pinturas", "🎬 Recomendaciones de Películas", "👤 Info de Artistas/Directores",
+         "📈 Economía de la Cultura"]
+    )
+    
+    st.sidebar.markdown("---")
+    st.sidebar.info("💡 **Tip:** Este asistente usa IA y múltiples APIs de museos y bases de datos culturales.")
+    if st.sidebar.checkbox("🔧 Panel de depuración", value=os.getenv('ARTY_DEPURACION') == '1'):
+        mostrar_panel_depuracion()
+    
+    # Cada módulo es un fragmento: tocar sus controles no vuelve a ejecutar el resto de la página
+    if modulo == "✍️ Ayuda con Poesía":
+        modulo_poesia()
+    elif modulo == "🖼️ Identificar Pinturas":
+        modulo_pinturas(miniatura)
+    elif modulo == "🎬 Recomendaciones de Películas":
+        modulo_peliculas(miniatura)
+    elif modulo == "👤 Info de Artistas/Directores":
+        modulo_artistas(miniatura)
+    elif modulo == "📈 Economía de la Cultura":
+        modulo_economia()
     
     # Footer
     st.markdown("---")
@@ -747,4 +4588,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    perfil = perfil_arranque()
+    perfil.marcar('definiciones')
+    with telemetria().medir('interfaz', 'main'):
+        main()
+    if not perfil.completo:
+        perfil.marcar('primer render')
+        perfil.terminar()
+        if os.getenv('ARTY_PERFIL_ARRANQUE') == '1':
+            print(perfil.informe(), file=sys.stderr)